@@ -0,0 +1,127 @@
+"""Shared helpers for the benchmark scripts: timing summaries, model setup, result files."""
+import os
+import sys
+import json
+import math
+import time
+import platform
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import torch
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+
+
+# ----------------- Timing -----------------
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile on an already sorted sequence."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return float(sorted_values[rank])
+
+
+def summarize(latencies_ms: List[float], items: int, wall_seconds: float) -> Dict[str, float]:
+    ordered = sorted(latencies_ms)
+    return {
+        "calls": len(ordered),
+        "items": items,
+        "wall_s": round(wall_seconds, 4),
+        "items_per_s": round(items / wall_seconds, 2) if wall_seconds else 0.0,
+        "p50_ms": round(percentile(ordered, 50), 3),
+        "p90_ms": round(percentile(ordered, 90), 3),
+        "p99_ms": round(percentile(ordered, 99), 3),
+        "max_ms": round(ordered[-1], 3) if ordered else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+    }
+
+
+def measure(fn: Callable, inputs: Sequence[Any], items_per_call: int = 1, warmup: int = 2) -> Dict[str, float]:
+    """Call fn(x) for every input, timing each call."""
+    for x in inputs[:warmup]:
+        fn(x)
+    latencies = []
+    wall_start = time.perf_counter()
+    for x in inputs:
+        start = time.perf_counter()
+        fn(x)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return summarize(latencies, len(inputs) * items_per_call, time.perf_counter() - wall_start)
+
+
+# ----------------- Model -----------------
+def build_tiny_model(n_layer: int = 2, n_embd: int = 128, n_head: int = 2, seed: int = 0):
+    """
+    Randomly initialised GPT-2 with the real tokenizer from models/. Scores
+    are meaningless but the code path (tokenize, forward, loss) is the real
+    one, so it works without downloaded weights and keeps runs fast.
+    """
+    from transformers import AutoTokenizer, GPT2Config, GPT2LMHeadModel
+
+    torch.manual_seed(seed)
+    tokenizer = AutoTokenizer.from_pretrained(MODELS_DIR)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    config = GPT2Config(vocab_size=len(tokenizer), n_positions=1024, n_layer=n_layer, n_embd=n_embd, n_head=n_head)
+    model = GPT2LMHeadModel(config).eval()
+    return model, tokenizer, torch.device("cpu")
+
+
+def load_model(tiny: bool):
+    """(model, tokenizer, device, description); also installs it as the app's singleton."""
+    from src.ml_core.model_loader import get_model_singleton, set_model_singleton
+
+    if tiny:
+        model, tokenizer, device = build_tiny_model()
+        set_model_singleton(model, tokenizer, device)
+        description = f"tiny-random-gpt2 ({model.config.n_layer} layers, {model.config.n_embd} dim)"
+    else:
+        model, tokenizer, device = get_model_singleton()
+        description = f"{model.config.model_type} from MODELS_ROOT"
+    return model, tokenizer, device, description
+
+
+# ----------------- Results -----------------
+def environment() -> Dict[str, Any]:
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+    }
+
+
+def write_results(results: Dict[str, Any], out_path: Optional[str] = None, prefix: str = "bench") -> str:
+    if out_path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out_path = os.path.join(RESULTS_DIR, f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(out_path, "w") as f:
+        json.dump(results, f, indent=2)
+    return out_path
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any], metric: str = "p50_ms",
+                    tolerance: float = 0.10) -> List[Dict[str, Any]]:
+    """
+    Row per benchmark present in both runs with the relative change of
+    `metric`; rows worse than `tolerance` are marked as regressions.
+    """
+    rows = []
+    for name, stats in current.get("benchmarks", {}).items():
+        before = baseline.get("benchmarks", {}).get(name)
+        if not before or metric not in stats or metric not in before or not before[metric]:
+            continue
+        change = (stats[metric] - before[metric]) / before[metric]
+        higher_is_better = metric.endswith("_per_s")
+        regressed = (change < -tolerance) if higher_is_better else (change > tolerance)
+        rows.append({
+            "benchmark": name,
+            "baseline": before[metric],
+            "current": stats[metric],
+            "change_pct": round(change * 100, 1),
+            "regression": regressed,
+        })
+    return rows
@@ -0,0 +1,163 @@
+"""
+Reproducible synthetic corpus of Python submissions for the benchmarks.
+
+Everything is derived from one seed, so the same (n, seed) always yields the
+same code; corpus_digest() lets a results file prove which corpus it used.
+"""
+import re
+import random
+import hashlib
+from dataclasses import dataclass, asdict
+from typing import Dict, List
+
+from src.ml_core.plagiarism_detector import DEFAULT_PATTERNS
+
+
+SIZES = {"small": (1, 2), "medium": (3, 6), "large": (10, 18)}  # functions per submission
+
+_NAMES = ["data", "items", "values", "total", "count", "result", "acc", "node", "index", "buffer",
+          "left", "right", "window", "score", "limit", "queue", "seen", "best", "cur", "step"]
+_FUNCS = ["solve", "process", "compute", "merge", "walk", "scan", "update", "check", "build", "reduce"]
+_COMMENTS = ["# handle edge case", "# TODO: optimise", "# accumulate", "# early exit",
+             "# keep invariant", "# loop over input", "# update state", "# guard"]
+
+
+@dataclass
+class CorpusItem:
+    item_id: str
+    kind: str              # "synthetic" or "near_copy"
+    size: str              # small / medium / large
+    nesting: int
+    comment_density: float
+    code: str
+    source_pattern: str = ""
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data.pop("code")
+        data["chars"] = len(self.code)
+        return data
+
+
+# ----------------- Synthetic functions -----------------
+def _expr(rng: random.Random, names: List[str]) -> str:
+    a, b = rng.sample(names, 2)
+    return rng.choice([f"{a} + {b}", f"{a} * 2 - {b}", f"max({a}, {b})", f"{a} % ({b} or 1)", f"len(str({a}))"])
+
+
+def _block(rng: random.Random, names: List[str], depth: int, max_depth: int, indent: int, comments: float) -> List[str]:
+    pad = "    " * indent
+    lines = []
+    for _ in range(rng.randint(2, 4) if depth == 0 else rng.randint(1, 2)):
+        if rng.random() < comments:
+            lines.append(f"{pad}{rng.choice(_COMMENTS)}")
+        target = rng.choice(names)
+        roll = rng.random()
+        if depth < max_depth and roll < 0.35:
+            lines.append(f"{pad}for {rng.choice(['i', 'j', 'k'])} in range({rng.randint(2, 50)}):")
+            lines += _block(rng, names, depth + 1, max_depth, indent + 1, comments)
+        elif depth < max_depth and roll < 0.6:
+            lines.append(f"{pad}if {target} > {rng.randint(0, 100)}:")
+            lines += _block(rng, names, depth + 1, max_depth, indent + 1, comments)
+            if rng.random() < 0.5:
+                lines.append(f"{pad}else:")
+                lines += _block(rng, names, depth + 1, max_depth, indent + 1, comments)
+        elif depth < max_depth and roll < 0.7:
+            lines.append(f"{pad}while {target} > 0:")
+            lines.append(f"{pad}    {target} -= {rng.randint(1, 5)}")
+        else:
+            lines.append(f"{pad}{target} = {_expr(rng, names)}")
+    return lines
+
+
+def _function(rng: random.Random, index: int, max_depth: int, comments: float) -> str:
+    names = rng.sample(_NAMES, 5)
+    params = names[:2]
+    lines = [f"def {rng.choice(_FUNCS)}_{index}({', '.join(params)}):"]
+    if rng.random() < comments:
+        lines.append(f'    """{rng.choice(_FUNCS).title()} the input and return the result."""')
+    for name in names[2:]:
+        lines.append(f"    {name} = {rng.randint(0, 9)}")
+    lines += _block(rng, names, 0, max_depth, 1, comments)
+    lines.append(f"    return {rng.choice(names)}")
+    return "\n".join(lines)
+
+
+def synthetic_submission(rng: random.Random, size: str, nesting: int, comment_density: float) -> str:
+    lo, hi = SIZES[size]
+    functions = [_function(rng, i, nesting, comment_density) for i in range(rng.randint(lo, hi))]
+    return "\n\n\n".join(functions) + "\n"
+
+
+# ----------------- Near copies of known patterns -----------------
+def near_copy(rng: random.Random, pattern_code: str, comment_density: float) -> str:
+    """Rename identifiers, add comments and perturb whitespace, keeping the structure."""
+    identifiers = sorted(set(re.findall(r"\b[a-z_][a-z0-9_]*\b", pattern_code)) - {
+        "def", "return", "for", "in", "range", "len", "if", "elif", "else", "while", "and", "or", "not"
+    })
+    renames = {name: f"{name}_{rng.randint(1, 99)}" if rng.random() < 0.6 else name for name in identifiers}
+    code = re.sub(r"\b[a-z_][a-z0-9_]*\b", lambda m: renames.get(m.group(0), m.group(0)), pattern_code)
+
+    out = []
+    for line in code.strip("\n").split("\n"):
+        if line.strip() and rng.random() < comment_density:
+            indent = line[: len(line) - len(line.lstrip())]
+            out.append(f"{indent}{rng.choice(_COMMENTS)}")
+        if rng.random() < 0.2:
+            line = line.replace(" = ", "=").replace(", ", ",")
+        out.append(line)
+        if rng.random() < 0.1:
+            out.append("")
+    return "\n".join(out) + "\n"
+
+
+# ----------------- Corpus -----------------
+def generate_corpus(n: int = 200, seed: int = 1234, near_copy_ratio: float = 0.25) -> List[CorpusItem]:
+    rng = random.Random(seed)
+    items = []
+    for idx in range(n):
+        comment_density = rng.choice((0.0, 0.1, 0.3, 0.6))
+        if rng.random() < near_copy_ratio:
+            pattern = rng.choice(DEFAULT_PATTERNS)
+            code = near_copy(rng, pattern.code, comment_density)
+            items.append(CorpusItem(f"nc-{idx}", "near_copy", "small", 0, comment_density, code, pattern.name))
+        else:
+            size = rng.choice(tuple(SIZES))
+            nesting = rng.randint(1, 4)
+            code = synthetic_submission(rng, size, nesting, comment_density)
+            items.append(CorpusItem(f"syn-{idx}", "synthetic", size, nesting, comment_density, code))
+    return items
+
+
+def corpus_digest(items: List[CorpusItem]) -> str:
+    h = hashlib.sha256()
+    for item in items:
+        h.update(item.code.encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def corpus_stats(items: List[CorpusItem]) -> Dict:
+    chars = sorted(len(i.code) for i in items)
+    kinds: Dict[str, int] = {}
+    for item in items:
+        key = f"{item.kind}:{item.size}"
+        kinds[key] = kinds.get(key, 0) + 1
+    return {
+        "items": len(items),
+        "digest": corpus_digest(items),
+        "chars_p50": chars[len(chars) // 2] if chars else 0,
+        "chars_max": chars[-1] if chars else 0,
+        "by_kind": kinds,
+    }
+
+
+if __name__ == "__main__":
+    import ast
+    import json
+
+    corpus = generate_corpus()
+    for item in corpus:
+        ast.parse(item.code)  # every submission must be valid Python
+    print(json.dumps(corpus_stats(corpus), indent=2))
+    print(corpus[0].code)
+    print(next(i for i in corpus if i.kind == "near_copy").code)
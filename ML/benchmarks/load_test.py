@@ -0,0 +1,254 @@
+"""
+Load-test harness for the FastAPI service.
+
+    python -m benchmarks.load_test                       # default sweep
+    python -m benchmarks.load_test --concurrency 1 8 --sizes small --duration 5
+
+Starts `src.ml_api.main:app` under uvicorn in a child process with a tiny
+random-weight GPT-2 (no model download), then for every combination of
+endpoint x payload size x concurrency runs closed-loop async clients for
+--duration seconds. Each cell reports throughput, p50/p95/p99 latency,
+error rate and the server's CPU utilisation and peak RSS. Results go to
+benchmarks/results/load_<stamp>.json.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import threading
+import subprocess
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from benchmarks.common import percentile, environment, write_results
+from benchmarks.corpus import generate_corpus, SIZES
+
+ENDPOINTS = ("/analyze", "/analyze-batch")
+DEFAULT_CONCURRENCY = (1, 8, 32, 128)
+
+
+# ----------------- Server process -----------------
+def serve(port: int, workers_threads: Optional[int] = None):
+    """Child-process entry point: tiny model + uvicorn."""
+    import uvicorn
+    from benchmarks.common import build_tiny_model
+    from src.ml_core.model_loader import set_model_singleton
+
+    if workers_threads:
+        import torch
+        torch.set_num_threads(workers_threads)
+    set_model_singleton(*build_tiny_model())
+    from src.ml_api.main import app
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ServerProcess:
+    """Runs the service in a subprocess and samples its CPU time and RSS."""
+
+    def __init__(self, port: Optional[int] = None, torch_threads: Optional[int] = None):
+        self.port = port or _free_port()
+        self.torch_threads = torch_threads
+        self.proc: Optional[subprocess.Popen] = None
+        self._rss_peak = 0
+        self._sampling = False
+        self._sampler: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout: float = 120.0):
+        cmd = [sys.executable, "-m", "benchmarks.load_test", "--serve", "--port", str(self.port)]
+        if self.torch_threads:
+            cmd += ["--torch-threads", str(self.torch_threads)]
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.proc = subprocess.Popen(cmd, cwd=root)
+
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"Server exited with code {self.proc.returncode}")
+            try:
+                if httpx.get(f"{self.base_url}/health", timeout=1.0).json().get("model_loaded"):
+                    return self
+            except (httpx.HTTPError, ValueError):
+                pass
+            time.sleep(0.25)
+        self.stop()
+        raise RuntimeError("Server did not become healthy in time")
+
+    def stop(self):
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+    # ---- resource sampling ----
+    def _process(self):
+        import psutil
+        return psutil.Process(self.proc.pid)
+
+    def cpu_seconds(self) -> float:
+        times = self._process().cpu_times()
+        return times.user + times.system
+
+    def rss_bytes(self) -> int:
+        return self._process().memory_info().rss
+
+    def begin_sampling(self, interval: float = 0.2):
+        self._rss_peak = self.rss_bytes()
+        self._sampling = True
+
+        def _loop():
+            while self._sampling:
+                self._rss_peak = max(self._rss_peak, self.rss_bytes())
+                time.sleep(interval)
+
+        self._sampler = threading.Thread(target=_loop, daemon=True)
+        self._sampler.start()
+
+    def end_sampling(self) -> int:
+        self._sampling = False
+        if self._sampler:
+            self._sampler.join()
+        return self._rss_peak
+
+
+# ----------------- Load generation -----------------
+async def run_cell(
+    base_url: str,
+    endpoint: str,
+    payloads: List[Any],
+    concurrency: int,
+    duration: float,
+    items_per_request: int,
+) -> Dict[str, Any]:
+    """Closed loop: `concurrency` clients each send the next payload as soon as the previous answer arrives."""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    latencies: List[float] = []
+    errors = 0
+    status_counts: Dict[str, int] = {}
+    counter = 0
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=httpx.Timeout(120.0)) as client:
+        deadline = time.perf_counter() + duration
+
+        async def _client():
+            nonlocal errors, counter
+            while time.perf_counter() < deadline:
+                payload = payloads[counter % len(payloads)]
+                counter += 1
+                start = time.perf_counter()
+                try:
+                    response = await client.post(endpoint, json=payload)
+                    key = str(response.status_code)
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError as e:
+                    key = type(e).__name__
+                    errors += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+                status_counts[key] = status_counts.get(key, 0) + 1
+
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(_client() for _ in range(concurrency)))
+        wall = time.perf_counter() - wall_start
+
+    ordered = sorted(latencies)
+    requests = len(ordered)
+    return {
+        "requests": requests,
+        "wall_s": round(wall, 3),
+        "req_per_s": round(requests / wall, 2) if wall else 0.0,
+        "items_per_s": round(requests * items_per_request / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(ordered, 50), 2),
+        "p95_ms": round(percentile(ordered, 95), 2),
+        "p99_ms": round(percentile(ordered, 99), 2),
+        "max_ms": round(ordered[-1], 2) if ordered else 0.0,
+        "error_rate": round(errors / requests, 4) if requests else 0.0,
+        "status": status_counts,
+    }
+
+
+def build_payloads(size: str, endpoint: str, batch_size: int, n: int = 64, seed: int = 7) -> List[Any]:
+    corpus = [item for item in generate_corpus(n * 4, seed) if item.kind == "synthetic" and item.size == size][:n]
+    single = [{"code": item.code, "mode": "practice", "submission_id": item.item_id} for item in corpus]
+    if endpoint == "/analyze":
+        return single
+    return [single[i:i + batch_size] for i in range(0, len(single) - batch_size + 1, batch_size)] or [single]
+
+
+def sweep(args) -> Dict[str, Any]:
+    server = ServerProcess(port=args.port, torch_threads=args.torch_threads).start()
+    results: Dict[str, Any] = {
+        "environment": {**environment(), "model": "tiny-random-gpt2", "duration_s": args.duration},
+        "cells": [],
+    }
+    try:
+        for endpoint in args.endpoints:
+            for size in args.sizes:
+                payloads = build_payloads(size, endpoint, args.batch_size)
+                items = args.batch_size if endpoint == "/analyze-batch" else 1
+                for concurrency in args.concurrency:
+                    cpu_start, wall_start = server.cpu_seconds(), time.perf_counter()
+                    server.begin_sampling()
+                    cell = asyncio.run(run_cell(server.base_url, endpoint, payloads, concurrency, args.duration, items))
+                    rss_peak = server.end_sampling()
+                    wall = time.perf_counter() - wall_start
+                    cell.update({
+                        "endpoint": endpoint,
+                        "payload_size": size,
+                        "concurrency": concurrency,
+                        "server_cpu_pct": round((server.cpu_seconds() - cpu_start) / wall * 100, 1),
+                        "server_rss_peak_mb": round(rss_peak / 2**20, 1),
+                    })
+                    results["cells"].append(cell)
+                    print(
+                        f"{endpoint:<15} {size:<7} c={concurrency:<4} {cell['req_per_s']:>8} req/s "
+                        f"p50={cell['p50_ms']:>8}ms p99={cell['p99_ms']:>9}ms err={cell['error_rate']:<6} "
+                        f"cpu={cell['server_cpu_pct']}% rss={cell['server_rss_peak_mb']}MB",
+                        file=sys.stderr,
+                    )
+    finally:
+        server.stop()
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Load test for the analysis service")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--torch-threads", type=int)
+    parser.add_argument("--endpoints", nargs="*", default=list(ENDPOINTS), choices=ENDPOINTS)
+    parser.add_argument("--sizes", nargs="*", default=list(SIZES), choices=list(SIZES))
+    parser.add_argument("--concurrency", nargs="*", type=int, default=list(DEFAULT_CONCURRENCY))
+    parser.add_argument("--batch-size", type=int, default=8, help="submissions per /analyze-batch request")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per cell")
+    parser.add_argument("--out")
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve(args.port, args.torch_threads)
+        return 0
+
+    results = sweep(args)
+    path = write_results(results, args.out, prefix="load")
+    print(json.dumps(results["cells"], indent=2))
+    print(f"Results written to {path}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Peak memory and latency of the perplexity loss, full logits vs chunked LM head.
+
+    python -m benchmarks.loss_memory --tiny-model
+    python -m benchmarks.loss_memory --lengths 256 1024 --batch-sizes 1 8 --chunks 0 64 256
+    python -m benchmarks.loss_memory --tiny-model --wrapper buckets
+
+For every (batch, length) runs AICodeDetector._token_nll on random token ids
+with each loss_chunk_size (0 = full [batch, seq, vocab] logits) and reports
+the peak memory the call added and its latency, plus the largest per-token
+NLL difference against the full-logits result of the plain torch model.
+--wrapper runs the detector on BucketedCausalLM ("buckets", trace mode) or
+the ONNX export ("onnx") instead, which chunk the head through
+hidden_states() / lm_head. On CUDA the peak comes from
+torch.cuda.max_memory_allocated; on CPU from sampling the process RSS, which
+only sees growth past memory the allocator already holds, so each chunk
+setting runs in a fresh process and shapes run smallest first. When that
+process dies (the full logits OOM-killed at a large shape) the finished
+shapes are kept and the rest are marked failed. Results go to
+benchmarks/results/loss_memory_<stamp>.json.
+"""
+import sys
+import json
+import time
+import argparse
+import threading
+import multiprocessing as mp
+from queue import Empty
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.common import load_model, environment, write_results
+
+
+class _RssPeak:
+    """Highest RSS seen by a 1 ms sampling thread while the block runs."""
+
+    def __enter__(self):
+        import psutil
+
+        self._process = psutil.Process()
+        self.baseline = self.peak = self._process.memory_info().rss
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._process.memory_info().rss)
+            self._stop.wait(0.001)
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._process.memory_info().rss)
+
+    @property
+    def added_mb(self) -> float:
+        return round((self.peak - self.baseline) / 2**20, 1)
+
+
+def _wrap(model, tokenizer, wrapper: str, shapes: List[List[int]]):
+    if wrapper == "buckets":
+        from src.ml_core.bucketed_model import BucketedCausalLM, BucketConfig
+
+        config = BucketConfig(
+            seq_buckets=tuple(sorted({n for _, n in shapes})), batch_buckets=tuple(sorted({b for b, _ in shapes})),
+            compile_mode="trace",
+        )
+        return BucketedCausalLM(model, config, pad_token_id=tokenizer.pad_token_id)
+    if wrapper == "onnx":
+        from src.ml_core.onnx_backend import onnx_from_torch
+
+        return onnx_from_torch(model)
+    return model
+
+
+def _measure_chunk(
+    tiny: bool, chunk: int, shapes: List[List[int]], repeats: int, wrapper: str = "torch",
+    on_row: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    import torch
+    from src.ml_core.code_detector import AICodeDetector, AIDetectorConfig
+
+    model, tokenizer, device, _ = load_model(tiny)
+    wrapped = _wrap(model, tokenizer, wrapper, shapes)
+    detector = AICodeDetector(
+        config=AIDetectorConfig(loss_chunk_size=chunk), model=wrapped, tokenizer=tokenizer, device=device
+    )
+    reference = AICodeDetector(
+        config=AIDetectorConfig(loss_chunk_size=0), model=model, tokenizer=tokenizer, device=device
+    )
+
+    rows = {}
+    for batch, length in shapes:
+        generator = torch.Generator().manual_seed(batch * 100_003 + length)
+        input_ids = torch.randint(0, model.config.vocab_size, (batch, length), generator=generator).to(device)
+        inputs = {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)}
+
+        latencies = []
+        with torch.no_grad():
+            if device.type == "cuda":
+                torch.cuda.synchronize()
+                torch.cuda.reset_peak_memory_stats()
+                baseline = torch.cuda.memory_allocated()
+            with _RssPeak() as rss:
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    nll = detector._token_nll(inputs)
+                    if device.type == "cuda":
+                        torch.cuda.synchronize()
+                    latencies.append((time.perf_counter() - start) * 1000)
+            if device.type == "cuda":
+                peak_mb = round((torch.cuda.max_memory_allocated() - baseline) / 2**20, 1)
+            else:
+                peak_mb = rss.added_mb
+            # Reference one row at a time, so it fits wherever the measured setting does
+            expected = torch.cat([
+                reference._token_nll({key: value[i:i + 1] for key, value in inputs.items()}) for i in range(batch)
+            ])
+            max_diff = (nll - expected).abs().max().item()
+
+        name = f"{batch}x{length}"
+        rows[name] = {
+            "peak_added_mb": peak_mb,
+            "p50_ms": round(sorted(latencies)[len(latencies) // 2], 3),
+            "full_logits_mb": round(batch * length * model.config.vocab_size * 4 / 2**20, 1),
+            "max_nll_diff": max_diff,
+            "chunked": bool(chunk) and detector._split is not None,
+        }
+        if on_row is not None:
+            on_row(name, rows[name])
+    return rows
+
+
+def _child(queue, *args):
+    _measure_chunk(*args, on_row=lambda name, row: queue.put((name, row)))
+    queue.put(None)
+
+
+def run(args) -> Dict[str, Any]:
+    _, _, _, description = load_model(args.tiny_model)
+    shapes = sorted(([b, n] for b in args.batch_sizes for n in args.lengths), key=lambda shape: shape[0] * shape[1])
+    results: Dict[str, Any] = {
+        "environment": {**environment(), "model": description}, "wrapper": args.wrapper, "benchmarks": {},
+    }
+
+    context = mp.get_context("spawn")
+    for chunk in args.chunks:
+        queue = context.Queue()
+        process = context.Process(
+            target=_child, args=(queue, args.tiny_model, chunk, shapes, args.repeats, args.wrapper)
+        )
+        process.start()
+        rows: Dict[str, Any] = {}
+        done = False
+        while not done and (process.is_alive() or not queue.empty()):
+            try:
+                item = queue.get(timeout=1)
+            except Empty:
+                continue
+            if item is None:
+                done = True
+            else:
+                rows[item[0]] = item[1]
+        process.join()
+        if not done:
+            # Typically OOM-killed on the full logits; the shapes measured before that are kept
+            for batch, length in shapes:
+                rows.setdefault(f"{batch}x{length}", {"failed": f"exit code {process.exitcode}"})
+        results["benchmarks"][f"loss_chunk={chunk or 'full'}"] = rows
+        print(f"[chunk={chunk}] done", file=sys.stderr)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Perplexity loss peak memory, full vs chunked logits")
+    parser.add_argument("--tiny-model", action="store_true", help="random tiny GPT-2 instead of MODELS_ROOT weights")
+    parser.add_argument("--lengths", nargs="+", type=int, default=[256, 512, 1024])
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8])
+    parser.add_argument("--chunks", nargs="+", type=int, default=[0, 128], help="loss_chunk_size values (0 = full)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--wrapper", default="torch", choices=["torch", "buckets", "onnx"])
+    parser.add_argument("--out")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    path = write_results(results, args.out, prefix="loss_memory")
+    print(json.dumps(results["benchmarks"], indent=2))
+    print(f"Results written to {path}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
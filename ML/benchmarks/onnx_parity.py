@@ -0,0 +1,126 @@
+"""
+Parity check and benchmark for the ONNX Runtime backend.
+
+    python -m benchmarks.onnx_parity --tiny-model
+    python -m benchmarks.onnx_parity --threads 1 2 4 --n 100
+
+Builds the torch model and its ONNX export, runs the AI detector's perplexity
+over the same corpus on both and reports the largest loss / perplexity /
+padded-batch logit difference, how many risk levels changed, and
+per-backend latency (single item and batched). Exits non-zero when a
+perplexity differs by more than --rtol.
+Results go to benchmarks/results/onnx_<stamp>.json.
+"""
+import sys
+import json
+import argparse
+from typing import Any, Dict, List
+
+from benchmarks.common import measure, load_model, environment, write_results
+from benchmarks.corpus import generate_corpus, corpus_stats
+
+
+def parity(torch_model, onnx_model, tokenizer, codes: List[str], max_length: int, batch_size: int) -> Dict[str, Any]:
+    """
+    Raw model agreement: per-item loss (so perplexity = exp(loss) before the
+    detector clamps it) and logits over the real tokens of padded batches,
+    which is where a wrongly traced attention mask would show.
+    """
+    import math
+    import torch
+
+    encode = dict(return_tensors="pt", truncation=True, max_length=max_length)
+    loss_diffs, ppl_rel = [], []
+    for code in codes:
+        inputs = tokenizer(code, **encode)
+        with torch.no_grad():
+            expected = torch_model(**inputs, labels=inputs["input_ids"]).loss.item()
+        actual = onnx_model(**inputs, labels=inputs["input_ids"]).loss.item()
+        loss_diffs.append(abs(actual - expected))
+        ppl_rel.append(abs(math.exp(actual - expected) - 1.0))
+
+    logit_diffs = []
+    for start in range(0, len(codes), batch_size):
+        inputs = tokenizer(codes[start:start + batch_size], padding=True, **encode)
+        with torch.no_grad():
+            expected = torch_model(**inputs).logits
+        actual = onnx_model(**inputs).logits
+        real = inputs["attention_mask"].bool()
+        logit_diffs.append((actual[real] - expected[real]).abs().max().item())
+        del expected, actual
+
+    return {
+        "items": len(codes),
+        "max_loss_diff": max(loss_diffs),
+        "max_perplexity_rel_diff": max(ppl_rel),
+        "max_padded_logit_diff": max(logit_diffs),
+    }
+
+
+def run(args) -> Dict[str, Any]:
+    from src.ml_core.code_detector import AICodeDetector
+    from src.ml_core.onnx_backend import OnnxBackendConfig, onnx_from_torch
+
+    corpus = generate_corpus(args.n, args.seed)
+    codes = [item.code for item in corpus]
+    batches = [codes[i:i + args.batch_size] for i in range(0, len(codes), args.batch_size)]
+    model, tokenizer, device, description = load_model(args.tiny_model)
+
+    results: Dict[str, Any] = {
+        "environment": {**environment(), "model": description},
+        "corpus": {**corpus_stats(corpus), "seed": args.seed},
+        "benchmarks": {},
+    }
+    torch_detector = AICodeDetector(model=model, tokenizer=tokenizer, device=device)
+    results["benchmarks"]["torch.perplexity"] = measure(torch_detector._calculate_perplexity, codes)
+    results["benchmarks"][f"torch.perplexity_batch[{args.batch_size}]"] = measure(
+        torch_detector._calculate_perplexity_batch, batches, items_per_call=args.batch_size, warmup=1
+    )
+
+    for threads in args.threads:
+        backend_config = OnnxBackendConfig.from_env()
+        backend_config.intra_op_threads = threads
+        onnx_model = onnx_from_torch(model, backend_config)
+        onnx_detector = AICodeDetector(model=onnx_model, tokenizer=tokenizer, device=onnx_model.device)
+
+        if "parity" not in results:
+            results["parity"] = parity(
+                model, onnx_model, tokenizer, codes, torch_detector.config.max_tokens_for_perplexity, args.batch_size
+            )
+            results["parity"]["risk_level_changes"] = sum(
+                t.risk_level != o.risk_level
+                for t, o in zip(torch_detector.detect_batch(codes), onnx_detector.detect_batch(codes))
+            )
+        name = f"onnx[threads={threads or 'auto'}]"
+        results["benchmarks"][f"{name}.perplexity"] = measure(onnx_detector._calculate_perplexity, codes)
+        results["benchmarks"][f"{name}.perplexity_batch[{args.batch_size}]"] = measure(
+            onnx_detector._calculate_perplexity_batch, batches, items_per_call=args.batch_size, warmup=1
+        )
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="ONNX Runtime backend parity and latency")
+    parser.add_argument("--n", type=int, default=60, help="corpus size")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--tiny-model", action="store_true", help="random tiny GPT-2 instead of MODELS_ROOT weights")
+    parser.add_argument("--threads", nargs="*", type=int, default=[0], help="ONNX intra-op thread counts (0 = auto)")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--rtol", type=float, default=1e-3, help="allowed relative perplexity difference")
+    parser.add_argument("--out")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    path = write_results(results, args.out, prefix="onnx")
+    print(json.dumps({"parity": results["parity"], "benchmarks": results["benchmarks"]}, indent=2))
+    print(f"Results written to {path}", file=sys.stderr)
+
+    worst = results["parity"]["max_perplexity_rel_diff"]
+    if worst > args.rtol:
+        print(f"PARITY FAILURE: relative perplexity difference {worst:.2e} > {args.rtol:.0e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+Benchmark suite for the ML pipeline.
+
+    python -m benchmarks.run_benchmarks --tiny-model
+    python -m benchmarks.run_benchmarks --tiny-model --compare benchmarks/results/<baseline>.json
+
+Runs every suite against the same reproducible corpus (benchmarks.corpus)
+and writes one JSON file (environment, corpus digest, one entry per
+benchmark with latency percentiles and throughput) to benchmarks/results/.
+--compare prints the change against an earlier file and exits non-zero when
+any benchmark regressed by more than --tolerance.
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+from typing import Any, Dict, List
+
+from benchmarks.common import (
+    measure, summarize, load_model, environment, write_results, compare_results,
+)
+from benchmarks.corpus import generate_corpus, corpus_stats, CorpusItem
+
+SUITES = ("normalize", "ai", "plagiarism", "api")
+
+
+# ----------------- Suites -----------------
+def bench_normalize(corpus: List[CorpusItem]) -> Dict[str, Dict]:
+    from src.components.normalization import Normalizer
+
+    normalizer = Normalizer()
+    codes = [item.code for item in corpus]
+    return {
+        f"normalize.{level}": measure(lambda code, level=level: normalizer.normalize(code, level), codes)
+        for level in ("light", "medium", "aggressive")
+    }
+
+
+def bench_ai(corpus: List[CorpusItem], model, tokenizer, device, batch_size: int = 8) -> Dict[str, Dict]:
+    from src.ml_core.code_detector import AICodeDetector
+
+    detector = AICodeDetector(model=model, tokenizer=tokenizer, device=device)
+    codes = [item.code for item in corpus]
+    batches = [codes[i:i + batch_size] for i in range(0, len(codes), batch_size)]
+    return {
+        "ai.detect": measure(detector.detect, codes),
+        f"ai.detect_batch[{batch_size}]": measure(detector.detect_batch, batches, items_per_call=batch_size, warmup=1),
+    }
+
+
+def bench_plagiarism(corpus: List[CorpusItem]) -> Dict[str, Dict]:
+    from src.ml_core.plagiarism_detector import PlagiarismDetector
+
+    detector = PlagiarismDetector()
+    codes = [item.code for item in corpus]
+    pairs = list(zip(codes, codes[1:] + codes[:1]))
+    near_copies = [item for item in corpus if item.kind == "near_copy"]
+    results = {
+        "plagiarism.detect": measure(detector.detect, codes),
+        "plagiarism.compare_submissions": measure(lambda pair: detector.compare_submissions(*pair), pairs),
+    }
+    if near_copies:
+        hits = sum(1 for item in near_copies if detector.detect(item.code).is_plagiarized)
+        results["plagiarism.near_copy_recall"] = {"items": len(near_copies), "recall": round(hits / len(near_copies), 3)}
+    return results
+
+
+def bench_api(corpus: List[CorpusItem], concurrency: int = 1) -> Dict[str, Dict]:
+    """
+    Full /analyze through the ASGI app in-process (httpx.ASGITransport), with
+    the real lifespan, so routing, validation and serialization are included
+    but no sockets are.
+    """
+    import httpx
+    from src.ml_api.main import app
+
+    payloads = [{"code": item.code, "mode": "practice", "submission_id": item.item_id} for item in corpus]
+
+    async def _run():
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                for payload in payloads[:2]:
+                    await client.post("/analyze", json=payload)
+
+                semaphore = asyncio.Semaphore(concurrency)
+                latencies, errors = [], 0
+
+                async def _one(payload):
+                    nonlocal errors
+                    async with semaphore:
+                        start = time.perf_counter()
+                        response = await client.post("/analyze", json=payload)
+                        latencies.append((time.perf_counter() - start) * 1000)
+                        if response.status_code != 200:
+                            errors += 1
+
+                wall_start = time.perf_counter()
+                await asyncio.gather(*(_one(p) for p in payloads))
+                stats = summarize(latencies, len(payloads), time.perf_counter() - wall_start)
+                stats["errors"] = errors
+                return stats
+
+    return {f"api.analyze[c={concurrency}]": asyncio.run(_run())}
+
+
+# ----------------- Runner -----------------
+def run(args) -> Dict[str, Any]:
+    corpus = generate_corpus(args.n, args.seed)
+    suites = args.suites or list(SUITES)
+    results: Dict[str, Any] = {
+        "environment": environment(),
+        "corpus": {**corpus_stats(corpus), "seed": args.seed},
+        "benchmarks": {},
+    }
+
+    model = tokenizer = device = None
+    if {"ai", "api"} & set(suites):
+        model, tokenizer, device, description = load_model(args.tiny_model)
+        results["environment"]["model"] = description
+
+    for suite in suites:
+        start = time.perf_counter()
+        if suite == "normalize":
+            out = bench_normalize(corpus)
+        elif suite == "ai":
+            out = bench_ai(corpus, model, tokenizer, device, args.batch_size)
+        elif suite == "plagiarism":
+            out = bench_plagiarism(corpus)
+        elif suite == "api":
+            out = bench_api(corpus, args.concurrency)
+        else:
+            raise ValueError(f"Unknown suite: {suite}")
+        results["benchmarks"].update(out)
+        print(f"[{suite}] done in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="ML pipeline benchmarks")
+    parser.add_argument("--n", type=int, default=200, help="corpus size")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--suites", nargs="*", choices=SUITES)
+    parser.add_argument("--tiny-model", action="store_true", help="random tiny GPT-2 instead of MODELS_ROOT weights")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=1, help="in-flight /analyze requests")
+    parser.add_argument("--out", help="result file (default: benchmarks/results/bench_<stamp>.json)")
+    parser.add_argument("--compare", help="baseline result file to compare against")
+    parser.add_argument("--metric", default="p50_ms")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    path = write_results(results, args.out)
+    print(json.dumps(results["benchmarks"], indent=2))
+    print(f"Results written to {path}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("corpus", {}).get("digest") != results["corpus"]["digest"]:
+            print("warning: baseline was run on a different corpus", file=sys.stderr)
+        rows = compare_results(baseline, results, args.metric, args.tolerance)
+        for row in rows:
+            flag = "REGRESSION" if row["regression"] else ""
+            print(f"{row['benchmark']:<40} {row['baseline']:>10} -> {row['current']:>10} ({row['change_pct']:+.1f}%) {flag}")
+        if any(row["regression"] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
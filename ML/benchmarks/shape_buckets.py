@@ -0,0 +1,142 @@
+"""
+Latency per shape bucket, for choosing bucket boundaries.
+
+    python -m benchmarks.shape_buckets --tiny-model
+    python -m benchmarks.shape_buckets --tiny-model --seq-buckets 32 64 128 256 --compile none trace
+
+Tokenizes the synthetic corpus and reports how its lengths fall into the
+sequence buckets (items and padding share per bucket), then times the
+single-item perplexity path eagerly and through BucketedCausalLM for each
+compile mode: warmup cost per bucket, cold first-call latency, and warm
+p50/p99 grouped by the bucket each item landed in. Per mode it also reports
+parity with the eager model: the largest per-item loss difference and the
+largest logit difference over the real tokens of padded batches. Results go
+to benchmarks/results/buckets_<stamp>.json.
+"""
+import sys
+import json
+import time
+import argparse
+from collections import defaultdict
+from typing import Any, Dict, List
+
+from benchmarks.common import summarize, load_model, environment, write_results
+from benchmarks.corpus import generate_corpus, corpus_stats
+
+
+def length_profile(lengths: List[int], seq_buckets: List[int]) -> Dict[str, Dict[str, Any]]:
+    """Items per sequence bucket and the share of the padded positions that are padding."""
+    from bisect import bisect_left
+
+    rows: Dict[str, Dict[str, Any]] = {}
+    for length in lengths:
+        i = bisect_left(seq_buckets, length)
+        name = str(seq_buckets[i]) if i < len(seq_buckets) else "overflow"
+        row = rows.setdefault(name, {"items": 0, "tokens": 0, "padded": 0})
+        row["items"] += 1
+        row["tokens"] += length
+        row["padded"] += seq_buckets[i] if i < len(seq_buckets) else length
+    for row in rows.values():
+        row["padding_share"] = round(1 - row.pop("tokens") / row.pop("padded"), 3)
+    return rows
+
+
+def per_bucket(detector, codes: List[str], labels: List[str]) -> Dict[str, Dict[str, float]]:
+    """Time _calculate_perplexity per item and group the latencies by bucket label."""
+    grouped: Dict[str, List[float]] = defaultdict(list)
+    wall_start = time.perf_counter()
+    for code, label in zip(codes, labels):
+        start = time.perf_counter()
+        detector._calculate_perplexity(code)
+        grouped[label].append((time.perf_counter() - start) * 1000)
+    wall = time.perf_counter() - wall_start
+    stats = {label: summarize(values, len(values), sum(values) / 1000) for label, values in sorted(grouped.items())}
+    stats["all"] = summarize([v for values in grouped.values() for v in values], len(codes), wall)
+    return stats
+
+
+def parity(model, bucketed, tokenizer, codes: List[str], max_length: int, batch_size: int = 4) -> Dict[str, Any]:
+    """Eager vs bucketed: per-item loss, and logits over the real tokens of padded batches."""
+    import torch
+
+    encode = dict(return_tensors="pt", truncation=True, max_length=max_length)
+    loss_diffs, logit_diffs = [], []
+    with torch.no_grad():
+        for code in codes:
+            inputs = tokenizer(code, **encode).to(bucketed.device)
+            expected = model(**inputs, labels=inputs["input_ids"]).loss.item()
+            loss_diffs.append(abs(bucketed(**inputs, labels=inputs["input_ids"]).loss.item() - expected))
+        for start in range(0, len(codes), batch_size):
+            inputs = tokenizer(codes[start:start + batch_size], padding=True, **encode).to(bucketed.device)
+            real = inputs["attention_mask"].bool()
+            logit_diffs.append((bucketed(**inputs).logits[real] - model(**inputs).logits[real]).abs().max().item())
+    return {"items": len(codes), "max_loss_diff": max(loss_diffs), "max_padded_logit_diff": max(logit_diffs)}
+
+
+def run(args) -> Dict[str, Any]:
+    from src.ml_core.code_detector import AICodeDetector
+    from src.ml_core.bucketed_model import BucketedCausalLM, BucketConfig
+
+    corpus = generate_corpus(args.n, args.seed)
+    codes = [item.code for item in corpus]
+    model, tokenizer, device, description = load_model(args.tiny_model)
+    max_tokens = AICodeDetector(model=model, tokenizer=tokenizer, device=device).config.max_tokens_for_perplexity
+    lengths = [min(len(tokenizer(code)["input_ids"]), max_tokens) for code in codes]
+
+    seq_buckets = sorted(args.seq_buckets)
+    results: Dict[str, Any] = {
+        "environment": {**environment(), "model": description},
+        "corpus": {**corpus_stats(corpus), "seed": args.seed},
+        "seq_buckets": seq_buckets,
+        "length_profile": length_profile(lengths, seq_buckets),
+        "benchmarks": {},
+    }
+
+    # Eager: the label is the bucket the item would have used, to compare like with like
+    eager = AICodeDetector(model=model, tokenizer=tokenizer, device=device)
+    first_start = time.perf_counter()
+    eager._calculate_perplexity(codes[0])
+    results["benchmarks"]["eager.first_call_ms"] = round((time.perf_counter() - first_start) * 1000, 3)
+
+    for mode in args.compile:
+        bucketed = BucketedCausalLM(
+            model,
+            BucketConfig(seq_buckets=tuple(seq_buckets), batch_buckets=(1, 4), compile_mode=mode),
+            pad_token_id=tokenizer.pad_token_id,
+        )
+        labels = [f"1x{b[1]}" if (b := bucketed.bucket_for(1, n)) else "overflow" for n in lengths]
+        if mode == args.compile[0]:
+            results["benchmarks"]["eager"] = per_bucket(eager, codes, labels)
+
+        warmup_start = time.perf_counter()
+        results["benchmarks"][f"{mode}.warmup"] = bucketed.warmup()
+        results["benchmarks"][f"{mode}.warmup_total_s"] = round(time.perf_counter() - warmup_start, 2)
+
+        detector = AICodeDetector(model=bucketed, tokenizer=tokenizer, device=bucketed.device)
+        first_start = time.perf_counter()
+        detector._calculate_perplexity(codes[0])
+        results["benchmarks"][f"{mode}.first_call_ms"] = round((time.perf_counter() - first_start) * 1000, 3)
+        results["benchmarks"][mode] = per_bucket(detector, codes, labels)
+        results["benchmarks"][f"{mode}.parity"] = parity(model, bucketed, tokenizer, codes, max_tokens)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Per-bucket latency of the shape-bucketed forward pass")
+    parser.add_argument("--n", type=int, default=60, help="corpus size")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--tiny-model", action="store_true", help="random tiny GPT-2 instead of MODELS_ROOT weights")
+    parser.add_argument("--seq-buckets", nargs="+", type=int, default=[64, 128, 256, 512, 1024])
+    parser.add_argument("--compile", nargs="+", default=["none", "trace"], choices=["none", "trace", "compile"])
+    parser.add_argument("--out")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    path = write_results(results, args.out, prefix="buckets")
+    print(json.dumps({"length_profile": results["length_profile"], "benchmarks": results["benchmarks"]}, indent=2))
+    print(f"Results written to {path}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
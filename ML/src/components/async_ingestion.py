@@ -0,0 +1,221 @@
+import uuid
+import time
+import random
+import asyncio
+from typing import List, Dict, Optional, Tuple, Any
+
+import httpx
+
+from src.exception import CustomException, ErrorCode
+from src.logger import logging
+from src.components.data_ingestion import DataIngestion, IngestionConfig, Submission, Language
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class AsyncDataIngestion(DataIngestion):
+    """
+    asyncio variant of DataIngestion for bulk pulls from the Node backend.
+
+    One pooled httpx.AsyncClient (keep-alive, bounded connections) is shared
+    by all requests; fetch_many runs up to api_concurrency requests at once
+    and converts every response straight into a validated Submission using
+    the same rules as the sync path.
+    """
+
+    def __init__(self, config: Optional[IngestionConfig] = None, transport: Optional[httpx.AsyncBaseTransport] = None):
+        super().__init__(config)
+        self._transport = transport  # injectable for tests (e.g. httpx.MockTransport)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.config.api_timeout_read, connect=self.config.api_timeout_connect),
+                limits=httpx.Limits(
+                    max_connections=self.config.api_max_connections,
+                    max_keepalive_connections=self.config.api_max_keepalive,
+                ),
+                transport=self._transport,
+            )
+        return self._client
+
+    def _backoff_delay(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """
+        Exponential backoff with full jitter; honours Retry-After on 429/503,
+        capped at the longest backoff the retry budget allows so one backend
+        cannot stall a fetch_many slot indefinitely.
+        """
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.config.api_retry_backoff * (2 ** self.config.api_max_retries))
+        return random.uniform(0, self.config.api_retry_backoff * (2 ** attempt))
+
+    async def _get_with_retry(self, api_url: str, params: Optional[dict], headers: Optional[dict]) -> httpx.Response:
+        client = self._get_client()
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = await client.get(api_url, params=params, headers=headers)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.config.api_max_retries:
+                    response.raise_for_status()
+                    return response
+            except (httpx.TimeoutException, httpx.TransportError):
+                if attempt >= self.config.api_max_retries:
+                    raise
+            await asyncio.sleep(self._backoff_delay(attempt, response))
+            attempt += 1
+
+    async def fetch_code_from_api_async(
+        self,
+        api_url: str,
+        params: Optional[dict] = None,
+        headers: Optional[dict] = None,
+        user_id: Optional[str] = None,
+        submission_id: Optional[str] = None,
+        mode: Optional[str] = None,
+    ) -> Submission:
+
+        correlation_id = str(uuid.uuid4())
+        start_time = time.time()
+
+        try:
+            response = await self._get_with_retry(api_url, params, headers)
+
+            try:
+                data = response.json()
+            except ValueError:
+                data = {"code": response.text}
+
+            return self._payload_to_submission(
+                data,
+                correlation_id,
+                api_url=api_url,
+                user_id=user_id,
+                submission_id=submission_id,
+                mode=mode,
+                latency_ms=int((time.time() - start_time) * 1000),
+                status_code=response.status_code,
+            )
+
+        except httpx.TimeoutException as e:
+            logging.error(f"[{correlation_id}] API timeout: {e}")
+            raise CustomException(f"{api_url} timed out", code=ErrorCode.API_TIMEOUT)
+
+        except httpx.HTTPStatusError as e:
+            status = e.response.status_code
+            logging.error(f"[{correlation_id}] API HTTP error {status}: {e}")
+            raise CustomException(f"{status} - {str(e)}", code=ErrorCode.API_HTTP_ERROR)
+
+        except httpx.HTTPError as e:
+            logging.error(f"[{correlation_id}] API request failed: {e}")
+            raise CustomException(str(e), code=ErrorCode.API_REQUEST_ERROR)
+
+        except ValueError as e:
+            logging.error(f"[{correlation_id}] Validation error: {e}")
+            raise CustomException(str(e), code=ErrorCode.VALIDATION_ERROR)
+
+        except Exception as e:
+            logging.error(f"[{correlation_id}] Unexpected error: {e}")
+            raise CustomException(str(e), code=ErrorCode.API_UNKNOWN_ERROR)
+
+    async def fetch_many(
+        self,
+        url_template: str,
+        submission_ids: List[str],
+        headers: Optional[dict] = None,
+        mode: Optional[str] = None,
+        concurrency: Optional[int] = None,
+    ) -> Tuple[List[Submission], List[Dict[str, Any]]]:
+        """
+        Fetch many submissions concurrently.
+
+        url_template is formatted with submission_id, e.g.
+        "http://localhost:3000/api/submissions/{submission_id}".
+        Returns (submissions in input order, failures as
+        {"submission_id", "error"} dicts); one bad id never aborts the batch.
+        """
+        semaphore = asyncio.Semaphore(concurrency or self.config.api_concurrency)
+        start_time = time.time()
+
+        async def _one(sid: str):
+            async with semaphore:
+                return await self.fetch_code_from_api_async(
+                    url_template.format(submission_id=sid),
+                    headers=headers,
+                    submission_id=sid,
+                    mode=mode,
+                )
+
+        results = await asyncio.gather(*(_one(sid) for sid in submission_ids), return_exceptions=True)
+
+        submissions, failures = [], []
+        for sid, result in zip(submission_ids, results):
+            if isinstance(result, BaseException):
+                failures.append({"submission_id": sid, "error": str(result)})
+            else:
+                submissions.append(result)
+
+        logging.info(
+            "Async bulk fetch complete",
+            extra={
+                "requested": len(submission_ids),
+                "fetched": len(submissions),
+                "failed": len(failures),
+                "latency_ms": int((time.time() - start_time) * 1000),
+            }
+        )
+        return submissions, failures
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+
+if __name__ == "__main__":
+    '''Example usage: pull a handful of submissions from a local stub server.'''
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+
+        def do_GET(self):
+            sid = self.path.rsplit("/", 1)[-1]
+            body = json.dumps({"code": f"def solve_{sid}(x):\r\n    return x * 2\r\n", "user_id": "stub"}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/api/submissions/{{submission_id}}"
+
+    async def main():
+        async with AsyncDataIngestion(IngestionConfig(language=Language.python)) as ingestor:
+            ids = [str(i) for i in range(500)]
+            start = time.perf_counter()
+            submissions, failures = await ingestor.fetch_many(url, ids, mode="practice")
+            elapsed = time.perf_counter() - start
+            print(f"Fetched {len(submissions)} submissions ({len(failures)} failed) in {elapsed:.2f}s "
+                  f"-> {len(submissions) / elapsed:.0f} req/s")
+            print(f"Sample: {submissions[0].submission_id}: {submissions[0].code!r}")
+
+    asyncio.run(main())
+    server.shutdown()
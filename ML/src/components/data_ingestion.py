@@ -4,14 +4,16 @@ import uuid
 import time
 from dataclasses import dataclass, field, asdict 
 from datetime import datetime
-from typing import List,Dict,Union,Optional
+from typing import List,Dict,Union,Optional,Iterator,Any,Callable,Tuple,Sequence
+from collections import Counter
 from enum import Enum
 
-from src.exception import CustomException
+from src.exception import CustomException, ErrorCode
 from src.logger import logging
 
 import requests
-from pymongo import MongoClient # type: ignore
+from pymongo import MongoClient, ASCENDING # type: ignore
+from bson import ObjectId # type: ignore
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
@@ -46,13 +48,13 @@ class Submission:
 
 
     def __post_init__(self):
-        if not self.code or self.code.strip():
+        if not self.code or not self.code.strip():
             raise ValueError("code cannot be empty")
         if len(self.code) >50000:
             raise ValueError(f"Code too large : {len(self.code)}")
-        if self.language.lower() not in Language:
+        if str(getattr(self.language, "value", self.language)).lower() not in LANGUAGES:
             raise ValueError(f"Unsupported language! : {self.language}")
-        if self.mode not in MODE:
+        if self.mode not in MODES:
             raise ValueError(f"Invalid mode!: {self.mode}")
 
     def to_dict(self):
@@ -69,10 +71,19 @@ class IngestionConfig:
     api_max_retries: int = 3
     api_retry_backoff: float = 0.3
 
+    # async bulk fetches (AsyncDataIngestion)
+    api_max_connections: int = 32      # pooled connections to the backend
+    api_max_keepalive: int = 16        # idle keep-alive connections kept open
+    api_concurrency: int = 16          # in-flight requests per fetch_many call
+
     mongo_timeout: int = 10
     mongo_max_pool_size: int = 10
     mongo_batch_size: int = 10
 
+    # streaming (iter_submissions)
+    stream_batch_size: int = 32        # submissions per yielded batch
+    mongo_cursor_batch_size: int = 1000  # documents per server round trip
+
     max_code_size: int = 50000  # characters
     modes = MODE
 
@@ -81,11 +92,99 @@ class IngestionConfig:
         return cls(
             api_timeout_connect=int(os.getenv("API_TIMEOUT_CONNECT",5)),
             api_timeout_read=int(os.getenv("API_TIMEOUT_READ",30)),
+            api_max_connections=int(os.getenv("API_MAX_CONNECTIONS",32)),
+            api_concurrency=int(os.getenv("API_CONCURRENCY",16)),
             max_code_size=int(os.getenv("MAX_CODE_SIZE",50000)),
             language=Language.python
         )
     
 
+@dataclass
+class MongoCheckpoint:
+    """
+    Resume point for iter_submissions.
+
+    Holds the sort key of the last document the consumer has finished with,
+    so a restarted job continues right after it.
+    """
+
+    field_name: str = "_id"   # "_id" or "timestamp"
+    last_id: Any = None
+    last_timestamp: Any = None
+    processed: int = 0
+    skipped: int = 0
+
+    def to_dict(self) -> Dict:
+        "JSON friendly form (ObjectId stored as hex string)."
+        data = asdict(self)
+        data["last_id_is_oid"] = isinstance(self.last_id, ObjectId)
+        if data["last_id_is_oid"]:
+            data["last_id"] = str(self.last_id)
+        data["last_timestamp_is_datetime"] = isinstance(self.last_timestamp, datetime)
+        if data["last_timestamp_is_datetime"]:
+            data["last_timestamp"] = self.last_timestamp.isoformat()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "MongoCheckpoint":
+        data = dict(data)
+        if data.pop("last_id_is_oid", False):
+            data["last_id"] = ObjectId(data["last_id"])
+        # A str would never match BSON Date fields in resume_filter
+        if data.pop("last_timestamp_is_datetime", False):
+            data["last_timestamp"] = datetime.fromisoformat(data["last_timestamp"])
+        return cls(**data)
+
+    def resume_filter(self) -> Dict:
+        if self.last_id is None:
+            return {}
+        if self.field_name == "timestamp":
+            # timestamps are not unique: break ties on _id
+            return {"$or": [
+                {"timestamp": {"$gt": self.last_timestamp}},
+                {"timestamp": self.last_timestamp, "_id": {"$gt": self.last_id}},
+            ]}
+        return {"_id": {"$gt": self.last_id}}
+
+    def sort_spec(self) -> List:
+        if self.field_name == "timestamp":
+            return [("timestamp", ASCENDING), ("_id", ASCENDING)]
+        return [("_id", ASCENDING)]
+
+
+SUBMISSION_PROJECTION = {
+    "code":1,
+    "user_id":1,
+    "submission_id":1,
+    "language":1,
+    "mode":1,
+    "timestamp":1,
+}
+
+
+@dataclass
+class ValidationReport:
+    """Outcome of one DataIngestion.validate_batch call."""
+
+    total: int = 0
+    accepted: int = 0
+    rejected: List[Dict] = field(default_factory=list)   # {"index","submission_id","reason","detail"}
+    truncated: List[int] = field(default_factory=list)   # indices cut down to max_code_size
+    latency_ms: int = 0
+
+    def reject(self, index: int, submission_id: Optional[str], reason: str, detail: str = ""):
+        self.rejected.append({"index": index, "submission_id": submission_id, "reason": reason, "detail": detail})
+
+    def reasons(self) -> Dict[str, int]:
+        return dict(Counter(r["reason"] for r in self.rejected))
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data["rejected_count"] = len(self.rejected)
+        data["reasons"] = self.reasons()
+        return data
+
+
 class DataIngestion:
     """
     Handles fetching code snippets from different sources:
@@ -94,9 +193,9 @@ class DataIngestion:
     - Local Files (Optional)
     """
 
-    def __init__(self,config:Optional[IngestionConfig]=None):
+    def __init__(self,config:Optional[IngestionConfig]=None,mongo_client:Optional[MongoClient]=None):
         self.config=config or IngestionConfig.from_env()
-        self._mongo_client=None # only connect when databse is needed.
+        self._mongo_client=mongo_client # only connect when databse is needed (or injected, e.g. mongomock).
 
         self.session=requests.Session()
         retry_strategy=Retry(
@@ -111,7 +210,7 @@ class DataIngestion:
         self.session.mount("https://",adapter)
 
 
-    def fetch_code_from_api(self, api_url: str, params: Optional[dict] = None, headers: Optional[dict] = None,user_id:str=None,submission_id:str=None,mode:str=MODE) -> Submission:
+    def fetch_code_from_api(self, api_url: str, params: Optional[dict] = None, headers: Optional[dict] = None,user_id:str=None,submission_id:str=None,mode:Optional[str]=None) -> Submission:
 
         correlation_id=str(uuid.uuid4())
         start_time=time.time()
@@ -138,33 +237,21 @@ class DataIngestion:
             response.raise_for_status() # check http status
             
             try:
-                return response.json()
-            except Exception:
+                data=response.json()
+            except ValueError:
                 data={"code":response.text}
 
-            if isinstance(data,dict):
-                code=data.get("code") or data.get("content") or data.get("submission")    
-                if not code:
-                    raise CustomException("API_INVALID_RESPONSE: No code field found in API response.",sys)
-            else:
-                code =str(data)
-
-            code=self._validate_normalize_code(code,correlation_id)
-
-            submission=Submission(
-                code=code,
-                user_id=user_id or data.get("user_id", "unknown"),
-                submission_id=submission_id or data.get("submission_id", str(uuid.uuid4())),
-                source="api",
-                language=data.get(Language),
+            submission=self._payload_to_submission(
+                data,
+                correlation_id,
+                api_url=api_url,
+                user_id=user_id,
+                submission_id=submission_id,
                 mode=mode,
-                correlation_id=correlation_id,
-                metadata={
-                    "api_url": api_url,
-                    "latency_ms": int((time.time() - start_time) * 1000),
-                    "status_code": response.status_code
-                }
+                latency_ms=int((time.time() - start_time) * 1000),
+                status_code=response.status_code
             )
+            code=submission.code
 
             logging.info(
                 f"[{correlation_id}] API fetch successful",
@@ -180,24 +267,24 @@ class DataIngestion:
         
         except requests.exceptions.Timeout as e:
             logging.error(f"[{correlation_id}] API timeout: {e}")
-            raise CustomException(f"API_TIMEOUT: {api_url} timed out", sys)
+            raise CustomException(f"{api_url} timed out", code=ErrorCode.API_TIMEOUT)
             
         except requests.exceptions.HTTPError as e:
             status = e.response.status_code if e.response else "unknown"
             logging.error(f"[{correlation_id}] API HTTP error {status}: {e}")
-            raise CustomException(f"API_HTTP_ERROR: {status} - {str(e)}", sys)
+            raise CustomException(f"{status} - {str(e)}", code=ErrorCode.API_HTTP_ERROR)
             
         except requests.exceptions.RequestException as e:
             logging.error(f"[{correlation_id}] API request failed: {e}")
-            raise CustomException(f"API_REQUEST_ERROR: {str(e)}", sys)
+            raise CustomException(str(e), code=ErrorCode.API_REQUEST_ERROR)
             
         except ValueError as e:
             logging.error(f"[{correlation_id}] Validation error: {e}")
-            raise CustomException(f"VALIDATION_ERROR: {str(e)}", sys)
+            raise CustomException(str(e), code=ErrorCode.VALIDATION_ERROR)
             
         except Exception as e:
             logging.error(f"[{correlation_id}] Unexpected error: {e}")
-            raise CustomException(f"API_UNKNOWN_ERROR: {str(e)}", sys)
+            raise CustomException(str(e), code=ErrorCode.API_UNKNOWN_ERROR)
         
 
     def fetch_code_from_mongo(self, db_url: str, db_name: str, collection_name: str, query: dict,mode:str=MODE) -> List[Submission]:
@@ -217,61 +304,16 @@ class DataIngestion:
                 }
             )
 
-            if not self._mongo_client:
-                self._mongo_client=MongoClient(
-                    db_url,
-                    serverSelectionTimeoutMS=self.config.mongo_timeout,
-                    maxPoolSize=self.config.mongo_max_pool_size
-                )
-
-            db = self._mongo_client[db_name]
-            collection = db[collection_name]
+            collection = self._get_mongo_collection(db_url, db_name, collection_name)
 
             cursor=collection.find(
                 query,
-                {
-                    "code":1,
-                    "user_id":1,
-                    "submission_id":1,
-                    "language":1,
-                    "mode":1,
-                    "timestamp":1,
-                    "_id":0
-                }
+                {**SUBMISSION_PROJECTION, "_id":0}
             ).limit(self.config.mongo_batch_size)
 
-            submissions=[]
-            for doc in cursor:
-                try:
-                    code=doc.get("code")
-                    if not code:
-                        logging.warning(f"{correlation_id} skipping the file because no code is there.")
-                        continue
-
-                    code=self._validate_and_normalize_code(
-                        code,
-                        correlation_id
-                    )
-
-                    submission=Submission(
-                        code=code,
-                        user_id=doc.get("user_id", "unknown"),
-                        submission_id=doc.get("submission_id", str(uuid.uuid4())),
-                        source="mongo",
-                        language=doc.get(Language),
-                        mode=doc.get("mode", mode),
-                        timestamp=doc.get("timestamp", datetime.utcnow().isoformat()),
-                        correlation_id=correlation_id,
-                        metadata={
-                            "db_name": db_name,
-                            "collection": collection_name
-                        }
-                    )  
-                    submissions.append(submission) 
-
-                except ValueError as e:
-                    logging.warning(f"[{correlation_id}] Invalid submission skipped: {e}")
-                    continue
+            submissions,report=self._docs_to_submissions(list(cursor), mode, correlation_id, db_name, collection_name)
+            if report.rejected:
+                logging.warning(f"[{correlation_id}] Invalid submissions skipped: {report.reasons()}")
             
             latency_ms = int((time.time() - start_time) * 1000)
             logging.info(
@@ -287,8 +329,319 @@ class DataIngestion:
         
         except Exception as e:
             logging.error(f"MongoDB fetch failed: {e}")
-            raise CustomException(f"MongoDB fetch failed: {e}")
+            raise CustomException(f"MongoDB fetch failed: {e}", code=ErrorCode.MONGO_ERROR)
+
+
+    def iter_submissions(
+        self,
+        db_url: str,
+        db_name: str,
+        collection_name: str,
+        query: Optional[dict] = None,
+        mode: str = MODE.practice.value,
+        batch_size: Optional[int] = None,
+        checkpoint: Optional[MongoCheckpoint] = None,
+        on_checkpoint: Optional[Callable[[MongoCheckpoint], None]] = None,
+    ) -> Iterator[List[Submission]]:
+        """
+        Stream a whole collection as batches of Submission objects.
+
+        Every batch_size documents are validated together with validate_batch,
+        so a yielded batch holds at most batch_size submissions (fewer when
+        some documents are rejected). The cursor is sorted on the checkpoint field and read with a server-side
+        projection, so memory stays at one cursor batch plus one yielded batch no
+        matter how large the collection is. The checkpoint is advanced (and
+        on_checkpoint called) only when the consumer asks for the next batch,
+        i.e. after it is done with the previous one; pass the same checkpoint
+        back in to resume.
+        """
+        correlation_id = str(uuid.uuid4())
+        batch_size = batch_size or self.config.stream_batch_size
+        checkpoint = checkpoint or MongoCheckpoint()
+        start_time = time.time()
+
+        try:
+            collection = self._get_mongo_collection(db_url, db_name, collection_name)
+
+            filters = [f for f in (query, checkpoint.resume_filter()) if f]
+            mongo_filter = {"$and": filters} if len(filters) > 1 else (filters[0] if filters else {})
+
+            logging.info(
+                f"[{correlation_id}] MongoDB stream started",
+                extra={
+                    "correlation_id": correlation_id,
+                    "db_name": db_name,
+                    "collection": collection_name,
+                    "batch_size": batch_size,
+                    "resume_from": str(checkpoint.last_id),
+                }
+            )
+
+            cursor = collection.find(
+                mongo_filter,
+                {**SUBMISSION_PROJECTION, "_id": 1},
+                sort=checkpoint.sort_spec(),
+                batch_size=max(batch_size, self.config.mongo_cursor_batch_size),
+            )
+        except Exception as e:
+            logging.error(f"[{correlation_id}] MongoDB stream failed: {e}")
+            raise CustomException(f"MongoDB stream failed: {e}", code=ErrorCode.MONGO_ERROR)
 
+        docs: List[dict] = []
+
+        def _advance(batch: List[Submission], report: ValidationReport):
+            checkpoint.last_id = docs[-1].get("_id")
+            checkpoint.last_timestamp = docs[-1].get("timestamp")
+            checkpoint.processed += len(batch)
+            checkpoint.skipped += len(report.rejected)
+            if on_checkpoint:
+                on_checkpoint(checkpoint)
+
+        try:
+            for doc in cursor:
+                docs.append(doc)
+                if len(docs) < batch_size:
+                    continue
+
+                batch, report = self._docs_to_submissions(docs, mode, correlation_id, db_name, collection_name)
+                if batch:
+                    yield batch
+                _advance(batch, report)
+                docs = []
+
+            if docs:
+                batch, report = self._docs_to_submissions(docs, mode, correlation_id, db_name, collection_name)
+                if batch:
+                    yield batch
+                _advance(batch, report)
+        except Exception as e:
+            logging.error(f"[{correlation_id}] MongoDB stream interrupted at {checkpoint.last_id}: {e}")
+            raise CustomException(f"MongoDB stream failed: {e}", code=ErrorCode.MONGO_ERROR)
+        finally:
+            cursor.close()
+
+        logging.info(
+            f"[{correlation_id}] MongoDB stream finished",
+            extra={
+                "correlation_id": correlation_id,
+                "processed": checkpoint.processed,
+                "skipped": checkpoint.skipped,
+                "latency_ms": int((time.time() - start_time) * 1000),
+            }
+        )
+
+    def validate_batch(
+        self,
+        codes: Sequence[Any],
+        languages: Optional[Sequence[Any]] = None,
+        modes: Optional[Sequence[Any]] = None,
+        user_ids: Optional[Sequence[Optional[str]]] = None,
+        submission_ids: Optional[Sequence[Optional[str]]] = None,
+        timestamps: Optional[Sequence[Optional[str]]] = None,
+        metadata: Optional[Sequence[Optional[Dict]]] = None,
+        source: str = "bulk",
+        correlation_id: Optional[str] = None,
+    ) -> Tuple[List[Submission], ValidationReport]:
+        """
+        Validate and sanitize many submissions at once.
+
+        Takes parallel columns (one entry per submission; a missing column or a
+        None entry falls back to the config language, "practice" mode, etc.)
+        and returns the accepted Submission objects in input order plus a
+        ValidationReport naming every rejected index and why. Line endings and
+        NUL bytes are cleaned by _clean_batch in one pass over the batch, and
+        each distinct language / mode value is resolved only once.
+        """
+        correlation_id=correlation_id or str(uuid.uuid4())
+        start_time=time.time()
+        total=len(codes)
+        report=ValidationReport(total=total)
+
+        columns={"languages": languages, "modes": modes, "user_ids": user_ids,
+                 "submission_ids": submission_ids, "timestamps": timestamps, "metadata": metadata}
+        for name, column in columns.items():
+            if column is not None and len(column) != total:
+                raise ValueError(f"{name} has {len(column)} entries, expected {total}")
+
+        def _sid(i):
+            return submission_ids[i] if submission_ids is not None else None
+
+        live=[]
+        for i, code in enumerate(codes):
+            if not isinstance(code, str):
+                report.reject(i, _sid(i), "not_a_string", type(code).__name__)
+            elif not code:
+                report.reject(i, _sid(i), "empty")
+            else:
+                live.append(i)
+
+        cleaned=self._clean_batch([codes[i] for i in live])
+
+        language_ok: Dict[Any, Optional[str]] = {}
+        mode_ok: Dict[Any, Optional[str]] = {}
+
+        def _lookup(cache, value, allowed):
+            if value not in cache:
+                key=str(getattr(value, "value", value)).lower()
+                cache[value]=key if key in allowed else None
+            return cache[value]
+
+        accepted=[]
+        for i, code in zip(live, cleaned):
+            sid=_sid(i)
+            if code is None:
+                report.reject(i, sid, "invalid_utf8")
+                continue
+
+            code=code.strip()
+            if not code:
+                report.reject(i, sid, "empty", "only whitespace / NUL bytes")
+                continue
+            if len(code) > self.config.max_code_size:
+                code=code[:self.config.max_code_size]
+                report.truncated.append(i)
+
+            raw_language=languages[i] if languages is not None and languages[i] is not None else self.config.language
+            language=_lookup(language_ok, raw_language, LANGUAGES)
+            if language is None:
+                report.reject(i, sid, "unsupported_language", str(raw_language))
+                continue
+
+            raw_mode=modes[i] if modes is not None and modes[i] is not None else MODE.practice.value
+            mode=_lookup(mode_ok, raw_mode, MODES)
+            if mode is None:
+                report.reject(i, sid, "invalid_mode", str(raw_mode))
+                continue
+
+            extra={}
+            if timestamps is not None and timestamps[i] is not None:
+                extra["timestamp"]=timestamps[i]
+            try:
+                accepted.append(Submission(
+                    code=code,
+                    user_id=(user_ids[i] if user_ids is not None else None) or "unknown",
+                    submission_id=sid or str(uuid.uuid4()),
+                    source=source,
+                    language=language,
+                    mode=mode,
+                    correlation_id=correlation_id,
+                    metadata=dict(metadata[i] or {}) if metadata is not None else {},
+                    **extra
+                ))
+            except ValueError as e:
+                report.reject(i, sid, "invalid_submission", str(e))
+
+        report.rejected.sort(key=lambda r: r["index"])
+        report.accepted=len(accepted)
+        report.latency_ms=int((time.time() - start_time) * 1000)
+        if report.truncated:
+            logging.warning(
+                f"[{correlation_id}] {len(report.truncated)} submissions truncated to {self.config.max_code_size}"
+            )
+        logging.info(
+            f"[{correlation_id}] Bulk validation complete",
+            extra={
+                "correlation_id": correlation_id,
+                "total": total,
+                "accepted": report.accepted,
+                "rejected": len(report.rejected),
+                "latency_ms": report.latency_ms,
+            }
+        )
+        return accepted, report
+
+    @staticmethod
+    def _clean_batch(codes: List[str]) -> List[Optional[str]]:
+        """
+        CRLF/CR -> LF and NUL removal for a whole batch. Each replace only
+        runs when the substring is present, and the UTF-8 check is skipped for
+        pure-ASCII code (str.isascii is O(1)), so already-clean submissions
+        cost one scan each. Entries that are not valid UTF-8 (lone
+        surrogates) come back as None.
+        """
+        cleaned=[]
+        for code in codes:
+            if '\r' in code:
+                code=code.replace('\r\n','\n').replace('\r','\n')
+            if '\x00' in code:
+                code=code.replace('\x00','')
+            if not code.isascii():
+                try:
+                    code.encode('utf-8')
+                except UnicodeError:
+                    code=None
+            cleaned.append(code)
+        return cleaned
+
+    def _payload_to_submission(
+        self,
+        data: Any,
+        correlation_id: str,
+        api_url: str,
+        user_id: Optional[str] = None,
+        submission_id: Optional[str] = None,
+        mode: Optional[str] = None,
+        latency_ms: int = 0,
+        status_code: Optional[int] = None,
+    ) -> Submission:
+        """Turn a decoded API response body into a validated Submission."""
+        if isinstance(data,dict):
+            code=data.get("code") or data.get("content") or data.get("submission")
+            if not code:
+                raise ValueError("API_INVALID_RESPONSE: No code field found in API response.")
+        else:
+            code=str(data)
+            data={}
+
+        code=self._validate_and_normalize_code(code,correlation_id)
+
+        return Submission(
+            code=code,
+            user_id=user_id or data.get("user_id", "unknown"),
+            submission_id=submission_id or data.get("submission_id") or str(uuid.uuid4()),
+            source="api",
+            language=data.get("language") or self.config.language,
+            mode=mode or data.get("mode") or MODE.practice.value,
+            correlation_id=correlation_id,
+            metadata={
+                "api_url": api_url,
+                "latency_ms": latency_ms,
+                "status_code": status_code
+            }
+        )
+
+    def _get_mongo_collection(self, db_url: str, db_name: str, collection_name: str):
+        if not self._mongo_client:
+            self._mongo_client=MongoClient(
+                db_url,
+                serverSelectionTimeoutMS=self.config.mongo_timeout,
+                maxPoolSize=self.config.mongo_max_pool_size
+            )
+        return self._mongo_client[db_name][collection_name]
+
+    def _docs_to_submissions(
+        self, docs: List[dict], mode: str, correlation_id: str, db_name: str, collection_name: str
+    ) -> Tuple[List[Submission], ValidationReport]:
+        timestamps, metadata = [], []
+        for doc in docs:
+            timestamp=doc.get("timestamp")
+            timestamps.append(timestamp.isoformat() if isinstance(timestamp, datetime) else timestamp)
+            meta={"db_name": db_name, "collection": collection_name}
+            if "_id" in doc:
+                meta["_id"]=doc["_id"]  # raw id, used to write results back
+            metadata.append(meta)
+
+        return self.validate_batch(
+            codes=[doc.get("code") for doc in docs],
+            languages=[doc.get("language") for doc in docs],
+            modes=[doc.get("mode") or mode for doc in docs],
+            user_ids=[doc.get("user_id", "unknown") for doc in docs],
+            submission_ids=[doc.get("submission_id") or str(doc.get("_id") or uuid.uuid4()) for doc in docs],
+            timestamps=timestamps,
+            metadata=metadata,
+            source="mongo",
+            correlation_id=correlation_id,
+        )
 
     def _validate_and_normalize_code(self,code:str,correlation_id:str)->str:
 
@@ -299,13 +652,8 @@ class DataIngestion:
 
         if not code:
             raise ValueError("Code is empty after removing white space.")
-        
-        if not isinstance(self.language, Language):
-            raise ValueError(f"Invalid language: {self.language}. Must be one of {[lang.value for lang in Language]}")
 
-        # mode validation
-        if self.mode not in MODE:
-            raise ValueError(f"Invalid mode: {self.mode}. Must be one of {MODE}")
+        # language / mode are validated by Submission.__post_init__
 
         if len(code) > self.config.max_code_size:
             logging.warning(
@@ -349,6 +697,13 @@ if __name__=="__main__":
 
     with DataIngestion(config) as ingestor:
 
+        accepted,report=ingestor.validate_batch(
+            codes=["print('hi')\r\n", "   ", None, "int main(){}\x00", "fn main() {}"],
+            languages=["python", "python", "python", "cpp", "rust"],
+            modes=["battle", None, None, "contest", "practice"],
+        )
+        print(f"Bulk validation: {len(accepted)} accepted, report: {report.to_dict()}")
+
         try:
             submission=ingestor.fetch_code_from_api(
                 api_url="http://localhost:3000/api/submissions/123",
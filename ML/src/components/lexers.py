@@ -0,0 +1,472 @@
+"""
+Single-pass lexers for every language we accept.
+
+C-family languages (cpp, java, javascript) use one compiled master pattern
+matched token by token from the current position; Python uses the stdlib
+`tokenize` module. Either way comments, string literals, identifiers and
+whitespace are recognised in one linear scan: a `//` or `#` inside a string
+stays in the string, a quote inside a comment stays in the comment, and no
+parse is ever attempted. normalize_all() returns the light / medium /
+aggressive texts and the canonical token id sequence from that one scan.
+"""
+import io
+import re
+import keyword
+import tokenize
+import zlib
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+# ----------------- Language tables -----------------
+_CPP_KEYWORDS = frozenset("""
+    alignas alignof and and_eq asm auto bitand bitor bool break case catch char char8_t char16_t char32_t
+    class compl concept const consteval constexpr constinit const_cast continue co_await co_return co_yield
+    decltype default delete do double dynamic_cast else enum explicit export extern false float for friend
+    goto if inline int long mutable namespace new noexcept not not_eq nullptr operator or or_eq private
+    protected public register reinterpret_cast requires return short signed sizeof static static_assert
+    static_cast struct switch template this thread_local throw true try typedef typeid typename union
+    unsigned using virtual void volatile wchar_t while xor xor_eq override final
+""".split())
+_CPP_BUILTINS = frozenset("""
+    std main cin cout cerr endl printf scanf puts getchar malloc calloc free memset memcpy strlen
+    string vector map set unordered_map unordered_set multiset multimap pair tuple deque queue stack
+    priority_queue list array bitset size_t int64_t uint64_t int32_t uint32_t NULL
+    sort swap max min abs reverse fill accumulate begin end size push_back pop_back emplace_back
+    push pop front back top insert erase find count empty clear first second make_pair
+""".split())
+
+_JAVA_KEYWORDS = frozenset("""
+    abstract assert boolean break byte case catch char class const continue default do double else enum
+    extends final finally float for goto if implements import instanceof int interface long native new
+    package private protected public return short static strictfp super switch synchronized this throw
+    throws transient try void volatile while var record yield true false null
+""".split())
+_JAVA_BUILTINS = frozenset("""
+    main args String System out err in println print printf Math Integer Long Double Boolean Character
+    Object List ArrayList LinkedList Map HashMap TreeMap Set HashSet TreeSet Deque ArrayDeque Queue
+    PriorityQueue Arrays Collections Scanner StringBuilder Exception RuntimeException Override
+    length size get put add remove contains isEmpty charAt substring equals hashCode toString
+    nextInt nextLine valueOf parseInt max min abs sort
+""".split())
+
+_JS_KEYWORDS = frozenset("""
+    async await break case catch class const continue debugger default delete do else export extends
+    finally for function if import in instanceof let new of return static super switch this throw try
+    typeof var void while with yield true false null undefined NaN Infinity
+""".split())
+_JS_BUILTINS = frozenset("""
+    console log error warn Math Array Object String Number Boolean JSON Map Set Promise Symbol Date
+    RegExp Error parseInt parseFloat isNaN require module exports process window document
+    length push pop shift unshift slice splice map filter reduce forEach join split includes indexOf
+    keys values entries then max min floor ceil abs sort from
+""".split())
+
+# Prefixes after which an identifier is a member / qualified name and is kept
+# as is (the Python renamer likewise leaves attribute names alone).
+_MEMBER_ACCESS = frozenset((".", "->", "::", "?."))
+_TYPE_DECL = frozenset(("class", "struct", "interface", "enum", "union", "record"))
+
+# Tokens after which a "/" starts a regex literal rather than a division (JS).
+_REGEX_PREFIX_KEYWORDS = frozenset(("return", "typeof", "case", "do", "else", "in", "of", "new",
+                                    "delete", "void", "throw", "yield", "await"))
+
+_COMMON_TOKENS = [
+    ("newline", r"\r\n|\r|\n"),
+    ("ws", r"[ \t\f\v]+"),
+    ("comment", r"//[^\r\n]*|/\*[\s\S]*?(?:\*/|\Z)"),
+]
+_TAIL_TOKENS = [
+    ("call", r"[A-Za-z_$][\w$]*(?=[ \t]*\()"),
+    ("ident", r"[A-Za-z_$][\w$]*"),
+    ("number", r"\.?\d(?:[\w.']|[eEpP][+-])*"),
+    ("op", r"->|::|\?\.|[^\s\w]"),
+]
+_DQ_STRING = r'"(?:[^"\\\r\n]|\\[\s\S])*"?'
+_SQ_STRING = r"'(?:[^'\\\r\n]|\\[\s\S])*'?"
+
+_LANGUAGE_TOKENS = {
+    "cpp": [
+        # raw strings first: R"delim( ... )delim" may contain anything
+        ("string", r'(?:u8|[uUL])?R"(?P<delim>[^()\\\s"]{0,16})\([\s\S]*?(?:\)(?P=delim)"|\Z)'
+                   r'|(?:u8|[uUL])?' + _DQ_STRING + r"|(?:u8|[uUL])?" + _SQ_STRING),
+        # directives are kept verbatim (include paths, macro bodies), up to a trailing comment
+        ("preproc", r"#(?:\\\r?\n|[^\r\n/]|/(?![/*]))*"),
+    ],
+    "java": [
+        ("string", r'"""[\s\S]*?(?:"""|\Z)|' + _DQ_STRING + "|" + _SQ_STRING),
+        ("annotation", r"@[A-Za-z_][\w.]*"),
+    ],
+    "javascript": [
+        ("string", r"`(?:[^`\\]|\\[\s\S])*`?|" + _DQ_STRING + "|" + _SQ_STRING),
+    ],
+}
+_ANY_WS = re.compile(r"\s+")
+_TRAILING_WS = re.compile(r"[ \t\f\v]+(?=\n|\Z)")
+_BLANK_RUNS = re.compile(r"\n{3,}")
+_JS_REGEX = re.compile(r"/(?![*/])(?:[^/\\\[\r\n]|\\.|\[(?:[^\]\\\r\n]|\\.)*\])+/[a-z]*")
+
+
+@dataclass(frozen=True)
+class LexerSpec:
+    language: str
+    keywords: FrozenSet[str]
+    builtins: FrozenSet[str]
+    regex_literals: bool = False
+    pattern: "re.Pattern" = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        parts = _COMMON_TOKENS + _LANGUAGE_TOKENS[self.language] + _TAIL_TOKENS
+        master = "|".join(f"(?P<{name}>{regex})" for name, regex in parts)
+        object.__setattr__(self, "pattern", re.compile(master))
+
+
+SPECS: Dict[str, LexerSpec] = {
+    "cpp": LexerSpec("cpp", _CPP_KEYWORDS, _CPP_BUILTINS),
+    "java": LexerSpec("java", _JAVA_KEYWORDS, _JAVA_BUILTINS),
+    "javascript": LexerSpec("javascript", _JS_KEYWORDS, _JS_BUILTINS, regex_literals=True),
+}
+
+
+# ----------------- Output -----------------
+@dataclass(frozen=True)
+class NormalizedCode:
+    """All normalization levels of one submission plus its canonical token ids."""
+    light: str
+    medium: str
+    aggressive: str
+    token_ids: Tuple[int, ...]
+
+    def level(self, level: str) -> str:
+        return getattr(self, level)
+
+
+@lru_cache(maxsize=65536)
+def token_id(text: str) -> int:
+    """
+    Stable id of a canonical token. crc32 rather than hash() so ids agree
+    across processes and restarts (hash() is salted per interpreter).
+    """
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def _finish(light: str) -> str:
+    """Strip trailing whitespace and collapse runs of blank lines to one."""
+    return _BLANK_RUNS.sub("\n\n", _TRAILING_WS.sub("", light)).strip()
+
+
+def _aggressive(medium: str) -> str:
+    return _ANY_WS.sub("", medium).lower()
+
+
+# ----------------- C-family lexer -----------------
+class CFamilyLexer:
+    """
+    Tokenizer + normalizer for one language.
+
+    Light output has comments removed, trailing whitespace stripped and runs
+    of blank lines collapsed to one; medium additionally canonicalises
+    identifiers to v0/f0/C0 in order of first appearance, leaving keywords,
+    the language's common library names and member names after
+    `.`/`->`/`::` untouched. String literals are copied through unchanged.
+    """
+
+    def __init__(self, spec: LexerSpec, extra_builtins: Optional[FrozenSet[str]] = None):
+        self.spec = spec
+        self.reserved = spec.keywords | spec.builtins | (extra_builtins or frozenset())
+
+    def tokens(self, code: str) -> Iterator[Tuple[str, str]]:
+        """Yield (kind, text) pairs covering the whole input."""
+        if not self.spec.regex_literals:
+            for m in self.spec.pattern.finditer(code):
+                yield m.lastgroup, m.group()
+            return
+
+        # JS: "/" is a regex literal or a division depending on the previous
+        # token, so the scan has to be able to take over at that position.
+        match = self.spec.pattern.match
+        pos, end = 0, len(code)
+        prev_kind, prev = "", ""
+        while pos < end:
+            m = match(code, pos)
+            kind, text = m.lastgroup, m.group(m.lastgroup)
+            if kind == "op" and text == "/" and self._regex_allowed(prev_kind, prev):
+                rm = _JS_REGEX.match(code, pos)
+                if rm:
+                    kind, text = "regex", rm.group(0)
+            pos += len(text)
+            if kind not in ("ws", "newline", "comment"):
+                prev_kind, prev = kind, text
+            yield kind, text
+
+    @staticmethod
+    def _regex_allowed(prev_kind: str, prev: str) -> bool:
+        if not prev_kind:
+            return True
+        if prev_kind == "op":
+            return prev not in (")", "]", "}")
+        return prev_kind == "ident" and prev in _REGEX_PREFIX_KEYWORDS
+
+    def normalize(self, code: str, rename: bool = False) -> str:
+        """Light (or, with rename, medium) text only."""
+        out: List[str] = []
+        append = out.append
+        for kind, text in self._canonical(code, rename):
+            append(text if kind != "comment" else ("\n" if "\n" in text or "\r" in text else " "))
+        return _finish("".join(out))
+
+    def normalize_all(self, code: str) -> NormalizedCode:
+        light: List[str] = []
+        medium: List[str] = []
+        ids: List[int] = []
+        for kind, original, text in self._canonical(code, True, keep_original=True):
+            if kind == "comment":
+                gap = "\n" if "\n" in original or "\r" in original else " "
+                light.append(gap)
+                medium.append(gap)
+                continue
+            light.append(original)
+            medium.append(text)
+            if kind == "string" or kind == "regex":
+                ids.append(token_id("<str>"))
+            elif kind == "number":
+                ids.append(token_id("<num>"))
+            elif kind != "ws" and kind != "newline":
+                ids.append(token_id(text))
+        medium_text = _finish("".join(medium))
+        return NormalizedCode(_finish("".join(light)), medium_text, _aggressive(medium_text), tuple(ids))
+
+    def _canonical(self, code: str, rename: bool, keep_original: bool = False):
+        """Tokens with newlines as "\\n" and, when rename, identifiers canonicalised."""
+        reserved = self.reserved
+        names: Dict[str, str] = {}
+        counters = {"v": 0, "f": 0, "C": 0}
+        prev = ""
+
+        for kind, text in self.tokens(code):
+            original = text
+            if kind == "newline":
+                text = original = "\n"
+            elif kind != "ws" and kind != "comment":
+                if rename and (kind == "ident" or kind == "call") and text not in reserved and prev not in _MEMBER_ACCESS:
+                    new = names.get(text)
+                    if new is None:
+                        prefix = "C" if prev in _TYPE_DECL else ("f" if kind == "call" else "v")
+                        new = f"{prefix}{counters[prefix]}"
+                        counters[prefix] += 1
+                        names[text] = new
+                    text = new
+                prev = text
+            yield (kind, original, text) if keep_original else (kind, text)
+
+
+# ----------------- Python lexer -----------------
+_PY_KEYWORDS = frozenset(keyword.kwlist)
+_NO_SPACE_BEFORE = frozenset((")", "]", "}", ",", ":", ".", ";"))
+_NO_SPACE_AFTER = frozenset(("(", "[", "{", ".", "~", "@"))
+_STATEMENT_START = (tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT, tokenize.ENCODING, None)
+_FSTRING_START = getattr(tokenize, "FSTRING_START", -1)  # 3.12+
+_FSTRING_END = getattr(tokenize, "FSTRING_END", -1)
+_FSTRING_MIDDLE = getattr(tokenize, "FSTRING_MIDDLE", -1)
+
+
+# Strings and comments are all the light level has to recognise, so it uses
+# this C-speed scan instead of tokenize (~2 ms per typical submission).
+_PY_LIGHT = re.compile(
+    r"(?P<string>'''[\s\S]*?(?:'''|\Z)|\"\"\"[\s\S]*?(?:\"\"\"|\Z)"
+    r"|'(?:[^'\\\n]|\\[\s\S])*'?|\"(?:[^\"\\\n]|\\[\s\S])*\"?)"
+    r"|(?P<comment>#[^\n]*)"
+    r"|(?P<other>[^'\"#]+)"
+)
+_PY_STATEMENT_PREFIX = re.compile(r"(?<=\n)[ \t]*[rRuUbBfF]{0,2}\Z")
+_PY_STATEMENT_END = re.compile(r"[ \t]*(?:#[^\n]*)?(?:\n|\Z)")
+
+
+class PythonLexer:
+    """
+    Normalizer for Python.
+
+    light: the source minus comments and docstrings (string literals that
+    are a statement of their own), with trailing whitespace stripped and
+    blank-line runs collapsed; every other character, including `#` and
+    triple quotes inside strings, is kept as written.
+    medium: one canonical line per logical line (bracket continuations
+    joined), indented four spaces per level, tokens spaced by a fixed rule
+    and identifiers renamed to v0/f0/C0 like the old ast renamer (keywords,
+    builtins and attribute names are kept).
+    aggressive: medium without whitespace, lower-cased.
+
+    medium, aggressive and the token ids come from one `tokenize` pass.
+    That raises tokenize.TokenError / SyntaxError on input it cannot scan
+    (e.g. an unterminated bracket); Normalizer falls back to the regex path
+    for those.
+    """
+
+    def __init__(self, builtins: FrozenSet[str]):
+        self.reserved = _PY_KEYWORDS | builtins
+
+    def normalize(self, code: str, rename: bool = False) -> str:
+        return self.normalize_all(code).medium if rename else self.light(code)
+
+    @staticmethod
+    def light(code: str) -> str:
+        if "\r" in code:
+            code = code.replace("\r\n", "\n").replace("\r", "\n")
+        out: List[str] = []
+        depth = 0
+        for m in _PY_LIGHT.finditer(code):
+            kind, text = m.lastgroup, m.group()
+            if kind == "other":
+                depth += text.count("(") + text.count("[") + text.count("{")
+                depth -= text.count(")") + text.count("]") + text.count("}")
+                out.append(text)
+            elif kind == "string":
+                # a statement of its own: nothing but indentation (and a prefix)
+                # before it on a line that is not a continuation, nothing after it
+                before = out[-1] if out else ""
+                if len(out) <= 1:
+                    before = "\n" + before  # start of file counts as a line start
+                prefix = _PY_STATEMENT_PREFIX.search(before)
+                if (
+                    depth <= 0 and prefix is not None
+                    and not before[:prefix.start()].rstrip(" \t\n").endswith("\\")
+                    and _PY_STATEMENT_END.match(code, m.end())
+                ):
+                    if out:
+                        out[-1] = before[1 if len(out) == 1 else 0:prefix.start()]
+                else:
+                    out.append(text)
+        return _finish("".join(out))
+
+    def normalize_all(self, code: str) -> NormalizedCode:
+        light = self.light(code)
+        tokens = tokenize.generate_tokens(io.StringIO(code).readline)
+
+        reserved = self.reserved
+        names: Dict[str, str] = {}
+        counters = {"v": 0, "f": 0, "C": 0}
+        medium_lines: List[str] = []
+        current: List[str] = []
+        ids: List[int] = []
+        depth = 0
+        fstring_depth = 0
+        pending_string = None             # string token that may turn out to be a docstring
+        prev_type: Optional[int] = None   # last significant token type
+        prev = ""                         # last canonical token text
+
+        for tok in tokens:
+            tok_type = tok.type
+            if tok_type == tokenize.COMMENT or tok_type == tokenize.NL:
+                continue
+            if pending_string is not None:
+                # a string statement followed directly by NEWLINE is dropped
+                if tok_type == tokenize.NEWLINE or tok_type == tokenize.ENDMARKER:
+                    pending_string = None
+                    continue
+                string_tok, pending_string = pending_string, None
+                prev_type, prev = self._emit(string_tok, current, ids, prev_type, prev, names, counters, fstring_depth)
+            if tok_type == tokenize.STRING and prev_type in _STATEMENT_START:
+                pending_string = tok
+                continue
+
+            if tok_type == tokenize.NEWLINE:
+                if current:
+                    medium_lines.append("    " * depth + "".join(current))
+                    current = []
+                    ids.append(token_id("<nl>"))
+                prev_type, prev = tok_type, ""
+                continue
+            if tok_type == tokenize.INDENT:
+                depth += 1
+                ids.append(token_id("<indent>"))
+                prev_type = tok_type
+                continue
+            if tok_type == tokenize.DEDENT:
+                depth -= 1
+                ids.append(token_id("<dedent>"))
+                prev_type = tok_type
+                continue
+            if tok_type == tokenize.ENDMARKER or tok_type == tokenize.ENCODING:
+                continue
+
+            prev_type, prev = self._emit(tok, current, ids, prev_type, prev, names, counters, fstring_depth)
+            if tok_type == _FSTRING_START:
+                fstring_depth += 1
+            elif tok_type == _FSTRING_END:
+                fstring_depth -= 1
+
+        if current:
+            medium_lines.append("    " * depth + "".join(current))
+        medium = "\n".join(medium_lines)
+        return NormalizedCode(light, medium, _aggressive(medium), tuple(ids))
+
+    def _emit(self, tok, current: List[str], ids: List[int], prev_type, prev: str,
+              names: Dict[str, str], counters: Dict[str, int], fstring_depth: int):
+        """Append one token's canonical text to the current line; returns the new (prev_type, prev)."""
+        tok_type, text = tok.type, tok.string
+        if tok_type == tokenize.NAME and text not in self.reserved and prev != ".":
+            new = names.get(text)
+            if new is None:
+                prefix = "f" if prev == "def" else ("C" if prev == "class" else "v")
+                new = f"{prefix}{counters[prefix]}"
+                counters[prefix] += 1
+                names[text] = new
+            text = new
+
+        if tok_type == tokenize.STRING or tok_type == _FSTRING_MIDDLE:
+            ids.append(token_id("<str>"))
+        elif tok_type == tokenize.NUMBER:
+            ids.append(token_id("<num>"))
+        else:
+            ids.append(token_id(text))
+
+        if current and not fstring_depth and self._space_between(prev, text, prev_type, tok_type):
+            current.append(" ")
+        current.append(text)
+        return tok_type, text
+
+    @staticmethod
+    def _space_between(prev: str, text: str, prev_type: Optional[int], tok_type: int) -> bool:
+        if text in _NO_SPACE_BEFORE or prev in _NO_SPACE_AFTER:
+            return False
+        if text in ("(", "[") and (
+            (prev_type == tokenize.NAME and prev not in _PY_KEYWORDS)
+            or prev_type == tokenize.STRING or prev in (")", "]")
+        ):
+            return False
+        return True
+
+
+_LEXERS: Dict[str, CFamilyLexer] = {}
+
+
+def get_lexer(language: str) -> Optional[CFamilyLexer]:
+    """Lexer for `language`, or None when the language is handled elsewhere (python) or unknown."""
+    language = getattr(language, "value", language)
+    lexer = _LEXERS.get(language)
+    if lexer is None and language in SPECS:
+        lexer = _LEXERS.setdefault(language, CFamilyLexer(SPECS[language]))
+    return lexer
+
+
+if __name__ == "__main__":
+    import time
+
+    samples = {
+        "cpp": '#include <vector> // header\nint add(int a, int b) {\n  /* sum */ std::string s = "// not a comment";\n'
+               '  auto r = R"x(raw "quoted" )x";\n  return a + b;\n}\n',
+        "java": '@Override\npublic int total(int[] xs) {\n    int acc = 0; // running\n'
+                '    for (int x : xs) acc += x;\n    String t = """\n  block /* kept */\n  """;\n    return acc;\n}\n',
+        "javascript": "function f(items) {\n  const re = /a\\/b[/]c/g; // regex\n  let total = items.length / 2;\n"
+                      "  return `tpl ${total} // kept`;\n}\n",
+    }
+    for language, code in samples.items():
+        lexer = get_lexer(language)
+        print(f"=== {language} light ===\n{lexer.normalize(code)}")
+        print(f"=== {language} medium ===\n{lexer.normalize(code, rename=True)}\n")
+
+    big = samples["cpp"] * 2000
+    start = time.perf_counter()
+    get_lexer("cpp").normalize(big, rename=True)
+    elapsed = time.perf_counter() - start
+    print(f"cpp medium: {len(big)} chars in {elapsed * 1000:.1f} ms ({len(big) / elapsed / 1e6:.2f} MB/s)")
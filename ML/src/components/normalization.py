@@ -1,21 +1,131 @@
+import os
 import sys
 import re
-import ast
 import time
-from typing import Optional, Literal
+import hashlib
+import threading
+import tokenize
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Literal, Tuple, Union
 
-from src.logger import logging
-from src.exception import CustomException
+from src.logger import logging, get_logger
+from src.exception import CustomException, ErrorCode
+from src.metrics import timed
+from src.tracing import traced
+from src.components.lexers import CFamilyLexer, PythonLexer, NormalizedCode, SPECS, token_id
+
+# Per-request lines go through the module logger so their level can be set
+# separately (LOG_LEVELS / set_log_level).
+logger = get_logger(__name__)
 
 NormalizationLevel = Literal["light", "medium", "aggressive"]
+PYTHON = "python"
+
+DEFAULT_CACHE_BYTES = int(os.getenv("NORMALIZER_CACHE_BYTES", 64 * 1024 * 1024))
+
+
+# ----------------- Cache -----------------
+class NormalizationCache:
+    """
+    Byte-bounded LRU of normalization results.
+
+    Keys are (content digest, level, language, builtins fingerprint); values
+    are either the light text or a NormalizedCode (which serves medium,
+    aggressive and token ids). The cache is split into shards by key, each
+    with its own lock and byte budget, so concurrent hits on different
+    submissions do not contend on one lock and a lookup never scans the
+    whole cache.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES, shards: int = 16):
+        self.max_bytes = max_bytes
+        self._shard_bytes = max(1, max_bytes // shards)
+        self._shards = [OrderedDict() for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._sizes = [0] * shards
+        # per shard: [hits, misses, evictions], written under the shard lock
+        self._stats = [[0, 0, 0] for _ in range(shards)]
+
+    @staticmethod
+    def entry_size(value: Union[str, NormalizedCode]) -> int:
+        """Approximate bytes held by a cached value (text length + object overhead)."""
+        if isinstance(value, str):
+            return len(value) + 64
+        return len(value.light) + len(value.medium) + len(value.aggressive) + 8 * len(value.token_ids) + 256
+
+    def _index(self, key: Tuple) -> int:
+        return hash(key) % len(self._shards)
+
+    def get(self, key: Tuple):
+        i = self._index(key)
+        with self._locks[i]:
+            shard = self._shards[i]
+            entry = shard.get(key)
+            if entry is None:
+                self._stats[i][1] += 1
+                return None
+            shard.move_to_end(key)
+            self._stats[i][0] += 1
+            return entry[0]
+
+    def put(self, key: Tuple, value: Union[str, NormalizedCode]):
+        size = self.entry_size(value)
+        if size > self._shard_bytes:
+            return  # would evict a whole shard for one entry
+        i = self._index(key)
+        with self._locks[i]:
+            shard = self._shards[i]
+            old = shard.pop(key, None)
+            if old is not None:
+                self._sizes[i] -= old[1]
+            shard[key] = (value, size)
+            self._sizes[i] += size
+            while self._sizes[i] > self._shard_bytes:
+                _, (_, evicted) = shard.popitem(last=False)
+                self._sizes[i] -= evicted
+                self._stats[i][2] += 1
+
+    def clear(self):
+        for i, lock in enumerate(self._locks):
+            with lock:
+                self._shards[i].clear()
+                self._sizes[i] = 0
+
+    def reset_stats(self):
+        for i, lock in enumerate(self._locks):
+            with lock:
+                self._stats[i] = [0, 0, 0]
+
+    def stats(self) -> dict:
+        hits = sum(s[0] for s in self._stats)
+        misses = sum(s[1] for s in self._stats)
+        return {
+            "cache_hits": hits,
+            "cache_misses": misses,
+            "cache_hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "cache_evictions": sum(s[2] for s in self._stats),
+            "cache_entries": sum(len(shard) for shard in self._shards),
+            "cache_bytes": sum(self._sizes),
+            "cache_max_bytes": self.max_bytes,
+        }
+
+
+def content_digest(code: str) -> bytes:
+    return hashlib.blake2b(code.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
 
 class Normalizer:
     
     def __init__(
-        self,max_code_size: Optional[int] = None,custom_builtins: Optional[set] = None,enable_cache: bool = True):
+        self,max_code_size: Optional[int] = None,custom_builtins: Optional[set] = None,enable_cache: bool = True,
+        cache: Optional[NormalizationCache] = None):
 
         self.max_code_size = max_code_size
+        # As passed in; self.builtins below is the merged Python set
+        self.custom_builtins = frozenset(custom_builtins or ())
         self.enable_cache = enable_cache
+        # may be shared between normalizers; the builtins fingerprint keeps their entries apart
+        self.cache = (cache or NormalizationCache()) if enable_cache else None
         
         # Default built-ins
         self.builtins = {
@@ -26,131 +136,101 @@ class Normalizer:
             'True', 'False', 'None'
         }
         
-        if custom_builtins:
-            self.builtins.update(custom_builtins)
+        self.builtins.update(self.custom_builtins)
+
+        # One single-pass lexer per language (tokenize for Python)
+        self._lexers = {
+            language: CFamilyLexer(spec, self.custom_builtins)
+            for language, spec in SPECS.items()
+        }
+        self._lexers[PYTHON] = PythonLexer(frozenset(self.builtins))
+        # Every name set that changes the output: Python builtins and each C-family reserved set
+        names = [(PYTHON, self.builtins)] + [(language, self._lexers[language].reserved) for language in sorted(SPECS)]
+        self._builtins_fingerprint = hashlib.blake2b(
+            "\1".join(f"{language}:" + "\0".join(sorted(reserved)) for language, reserved in names).encode(),
+            digest_size=8,
+        ).hexdigest()
         
         self.total_normalizations = 0
         self.total_latency_ms = 0
     
     
-    @staticmethod
-    def _remove_comments_and_docstrings(code: str) -> str:
-        """Remove comments and docstrings from Python code."""
-        try:
-            code = re.sub(r'#.*$', '', code, flags=re.MULTILINE)
-            
-            code = re.sub(r'"""[\s\S]*?"""', '', code)
-            code = re.sub(r"'''[\s\S]*?'''", '', code)
-            
-            return code
-        except Exception as e:
-            logging.warning(f"Failed to remove comments/docstrings: {e}")
-            return code
+    @property
+    def settings(self) -> Dict[str, Any]:
+        """Constructor arguments that shape the output, to build an equivalent normalizer in another process."""
+        return {"max_code_size": self.max_code_size, "custom_builtins": set(self.custom_builtins)}
+
+    @property
+    def fingerprint(self) -> str:
+        """Identifies the normalization output; precomputed forms are only valid under the same one."""
+        return self._builtins_fingerprint
     
-    @staticmethod
-    def _normalize_whitespace(code: str) -> str:
-        """Normalize whitespace and line endings."""
+    def _lexer(self, language: str):
+        language = getattr(language, "value", language)
+        lexer = self._lexers.get(language)
+        if lexer is None:
+            raise ValueError(f"Unsupported language: {language}")
+        return lexer
+
+    def _forms(self, code: str, language: str) -> NormalizedCode:
+        lexer = self._lexer(language)
         try:
-            # Normalize line endings
-            code = code.replace('\r\n', '\n').replace('\r', '\n')
-            lines = [line.rstrip() for line in code.split('\n')]
-            
-            # Collapse multiple blank lines
-            normalized_lines = []
-            prev_blank = False
-            for line in lines:
-                if line.strip():
-                    normalized_lines.append(line)
-                    prev_blank = False
-                elif not prev_blank:
-                    normalized_lines.append('')
-                    prev_blank = True
-            
-            return '\n'.join(normalized_lines).strip()
-        except Exception as e:
-            logging.warning(f"Failed to normalize whitespace: {e}")
-            return code
+            return lexer.normalize_all(code)
+        except (tokenize.TokenError, SyntaxError) as e:
+            logging.warning(f"Tokenize failed, using light text for every level: {e}")
+            light = PythonLexer.light(code)
+            aggressive = re.sub(r'\s+', '', light).lower()
+            ids = tuple(token_id(t) for t in re.findall(r'\w+|[^\s\w]', light))
+            return NormalizedCode(light, light, aggressive, ids)
 
-    
-    def normalize_light(self, code: str) -> str:
+    def _cache_key(self, code: str, level: str, language: str) -> Tuple:
+        return (content_digest(code), level, getattr(language, "value", language), self._builtins_fingerprint)
+
+    def _cached_light(self, code: str, language: str) -> str:
+        key = self._cache_key(code, "light", language)
+        light = self.cache.get(key)
+        if light is None:
+            light = self.normalize_light(code, language)
+            self.cache.put(key, light)
+        return light
+
+    def _cached_forms(self, code: str, language: str) -> NormalizedCode:
+        key = self._cache_key(code, "all", language)
+        forms = self.cache.get(key)
+        if forms is None:
+            forms = self._forms(code, language)
+            self.cache.put(key, forms)
+        return forms
+
+    @traced("normalize.light")
+    def normalize_light(self, code: str, language: str = PYTHON) -> str:
+        lexer = self._lexer(language)
         try:
-            code = self._remove_comments_and_docstrings(code)
-            code = self._normalize_whitespace(code)
-            return code
+            return lexer.normalize(code)
         except Exception as e:
             logging.error(f"Light normalization failed: {e}")
-            raise CustomException(f"LIGHT_NORMALIZATION_ERROR: {str(e)}", sys)
+            raise CustomException(str(e), code=ErrorCode.LIGHT_NORMALIZATION_ERROR)
     
-    def normalize_medium(self, code: str) -> str:
+    @traced("normalize.medium")
+    def normalize_medium(self, code: str, language: str = PYTHON) -> str:
 
-        # Start with light normalization
-        code = self.normalize_light(code)
-        
+        lexer = self._lexer(language)
         try:
-            tree = ast.parse(code)
-            
-            # AST transformer using instance builtins
-            class IdentifierRenamer(ast.NodeTransformer):
-                def __init__(self, builtins: set):
-                    self.builtins = builtins
-                    self.var_map = {}
-                    self.var_counter = 0
-                    self.func_counter = 0
-                    self.class_counter = 0
-                
-                def _get_new_name(self, old_name: str, prefix: str) -> str:
-                    if old_name in self.builtins:
-                        return old_name
-                    
-                    if old_name not in self.var_map:
-                        if prefix == 'v':
-                            self.var_map[old_name] = f'v{self.var_counter}'
-                            self.var_counter += 1
-                        elif prefix == 'f':
-                            self.var_map[old_name] = f'f{self.func_counter}'
-                            self.func_counter += 1
-                        elif prefix == 'C':
-                            self.var_map[old_name] = f'C{self.class_counter}'
-                            self.class_counter += 1
-                    
-                    return self.var_map[old_name]
-                
-                def visit_Name(self, node):
-                    if isinstance(node.ctx, (ast.Store, ast.Load)):
-                        node.id = self._get_new_name(node.id, 'v')
-                    return node
-                
-                def visit_FunctionDef(self, node):
-                    node.name = self._get_new_name(node.name, 'f')
-                    self.generic_visit(node)
-                    return node
-                
-                def visit_ClassDef(self, node):
-                    node.name = self._get_new_name(node.name, 'C')
-                    self.generic_visit(node)
-                    return node
-                
-                def visit_arg(self, node):
-                    node.arg = self._get_new_name(node.arg, 'v')
-                    return node
-            
-            renamer = IdentifierRenamer(self.builtins)
-            tree = renamer.visit(tree)
-            code = ast.unparse(tree)
-            
-            return code
+            # comments, whitespace and renaming in the same pass; no parse/unparse
+            return lexer.normalize(code, rename=True)
         
-        except SyntaxError as e:
+        except (tokenize.TokenError, SyntaxError) as e:
             logging.warning(f"Syntax error during medium normalization: {e}")
-            return code  # Return light normalization
+            return self.normalize_light(code, language)  # Return light normalization
         
         except Exception as e:
             logging.warning(f"Medium normalization failed: {e}")
-            return code
+            return self.normalize_light(code, language)
     
-    def normalize_aggressive(self, code: str) -> str:
+    @traced("normalize.aggressive")
+    def normalize_aggressive(self, code: str, language: str = PYTHON) -> str:
 
-        code = self.normalize_medium(code)
+        code = self.normalize_medium(code, language)
         
         try:
             code = re.sub(r'\s+', '', code)
@@ -158,10 +238,11 @@ class Normalizer:
             return code
         except Exception as e:
             logging.error(f"Aggressive normalization failed: {e}")
-            raise CustomException(f"AGGRESSIVE_NORMALIZATION_ERROR: {str(e)}", sys)
+            raise CustomException(str(e), code=ErrorCode.AGGRESSIVE_NORMALIZATION_ERROR)
     
     
-    def normalize(self, code: str, level: NormalizationLevel = "light") -> str:
+    @timed("normalize")
+    def normalize(self, code: str, level: NormalizationLevel = "light", language: str = PYTHON) -> str:
         start_time = time.time()
         original_size = len(code)
         
@@ -182,16 +263,22 @@ class Normalizer:
                 code = code[:self.max_code_size]
             
             # Route to normalization level
-            if level == "light":
-                normalized = self.normalize_light(code)
-            elif level == "medium":
-                normalized = self.normalize_medium(code)
-            elif level == "aggressive":
-                normalized = self.normalize_aggressive(code)
-            else:
+            if level not in ("light", "medium", "aggressive"):
                 raise ValueError(
                     f"Invalid level: {level}. Must be 'light', 'medium', or 'aggressive'"
                 )
+            if self.cache is not None:
+                # medium / aggressive come from one cached normalize_all result
+                normalized = (
+                    self._cached_light(code, language) if level == "light"
+                    else getattr(self._cached_forms(code, language), level)
+                )
+            elif level == "light":
+                normalized = self.normalize_light(code, language)
+            elif level == "medium":
+                normalized = self.normalize_medium(code, language)
+            else:
+                normalized = self.normalize_aggressive(code, language)
             
             # Track metrics
             latency_ms = int((time.time() - start_time) * 1000)
@@ -205,10 +292,11 @@ class Normalizer:
             )
             
             # Log
-            logging.info(
-                f"Normalized successfully",
+            logger.debug(
+                "Normalized successfully",
                 extra={
                     "level": level,
+                    "language": getattr(language, "value", language),
                     "original_size": original_size,
                     "normalized_size": normalized_size,
                     "reduction_pct": reduction_pct,
@@ -220,22 +308,78 @@ class Normalizer:
         
         except ValueError as e:
             logging.error(f"Validation error: {e}")
-            raise CustomException(f"NORMALIZATION_VALIDATION_ERROR: {str(e)}", sys)
+            raise CustomException(str(e), code=ErrorCode.NORMALIZATION_VALIDATION_ERROR)
         
         except Exception as e:
             logging.error(f"Normalization error: {e}")
-            raise CustomException(f"NORMALIZATION_ERROR: {str(e)}", sys)
+            raise CustomException(str(e), code=ErrorCode.NORMALIZATION_ERROR)
+    
+    
+    @timed("normalize_all")
+    def normalize_all(self, code: str, language: str = PYTHON, use_cache: bool = True) -> NormalizedCode:
+        """
+        Light, medium and aggressive text plus the canonical token ids from a
+        single scan; what fingerprinting and similarity use instead of three
+        normalize() calls. use_cache=False keeps one-off inputs (bulk pattern
+        loads) from evicting submissions.
+        """
+        start_time = time.time()
+        
+        try:
+            if not code or not isinstance(code, str):
+                raise ValueError("Code must be a non-empty string")
+            
+            if not code.strip():
+                logging.warning("Empty code provided")
+                return NormalizedCode("", "", "", ())
+            
+            if self.max_code_size and len(code) > self.max_code_size:
+                logging.warning(
+                    f"Code exceeds max size ({len(code)} > {self.max_code_size}). Truncating."
+                )
+                code = code[:self.max_code_size]
+            
+            forms = (
+                self._cached_forms(code, language)
+                if self.cache is not None and use_cache else self._forms(code, language)
+            )
+            
+            latency_ms = int((time.time() - start_time) * 1000)
+            self.total_normalizations += 1
+            self.total_latency_ms += latency_ms
+            
+            logger.debug(
+                "Normalized successfully",
+                extra={
+                    "level": "all",
+                    "language": getattr(language, "value", language),
+                    "original_size": len(code),
+                    "tokens": len(forms.token_ids),
+                    "latency_ms": latency_ms
+                }
+            )
+            
+            return forms
+        
+        except ValueError as e:
+            logging.error(f"Validation error: {e}")
+            raise CustomException(str(e), code=ErrorCode.NORMALIZATION_VALIDATION_ERROR)
+        
+        except Exception as e:
+            logging.error(f"Normalization error: {e}")
+            raise CustomException(str(e), code=ErrorCode.NORMALIZATION_ERROR)
     
     
     def normalize_batch(
         self,
         codes: list[str],
-        level: NormalizationLevel = "light"
+        level: NormalizationLevel = "light",
+        language: str = PYTHON
     ) -> list[str]:
         normalized = []
         for idx, code in enumerate(codes):
             try:
-                norm_code = self.normalize(code, level)
+                norm_code = self.normalize(code, level, language)
                 normalized.append(norm_code)
             except Exception as e:
                 logging.warning(f"Failed at index {idx}: {e}")
@@ -250,16 +394,21 @@ class Normalizer:
             if self.total_normalizations > 0 else 0
         )
         
-        return {
+        metrics = {
             "total_normalizations": self.total_normalizations,
             "total_latency_ms": self.total_latency_ms,
             "avg_latency_ms": avg_latency
         }
+        if self.cache is not None:
+            metrics.update(self.cache.stats())
+        return metrics
     
     def reset_metrics(self):
         """Reset metrics counters."""
         self.total_normalizations = 0
         self.total_latency_ms = 0
+        if self.cache is not None:
+            self.cache.reset_stats()
 
 
 if __name__ == "__main__":
@@ -283,5 +432,30 @@ def fibonacci(n):
     print("\n=== AGGRESSIVE ===")
     print(normalizer.normalize(test_code, "aggressive"))
     
+    cpp_code = """
+#include <iostream>
+// Calculate fibonacci
+int fibonacci(int n) {
+    if (n <= 1) return n;  /* base case */
+    return fibonacci(n - 1) + fibonacci(n - 2);
+}
+"""
+    for level in ("light", "medium", "aggressive"):
+        print(f"\n=== CPP {level.upper()} ===")
+        print(normalizer.normalize(cpp_code, level, language="cpp"))
+
+    forms = normalizer.normalize_all(test_code)
+    print(f"\n=== TOKEN IDS ({len(forms.token_ids)}) ===")
+    print(forms.token_ids[:12])
+
+    print("\n=== CACHE ===")
+    corpus = [test_code.replace("fibonacci", f"fib_{i % 50}") for i in range(1000)]
+    for label, n in (("cached", normalizer), ("uncached", Normalizer(enable_cache=False))):
+        start = time.perf_counter()
+        for code in corpus:
+            for level in ("light", "medium", "aggressive"):
+                n.normalize(code, level)
+        print(f"{label}: {(time.perf_counter() - start) / len(corpus) * 1000:.3f} ms per submission (3 levels)")
+
     print("\n=== METRICS ===")
     print(normalizer.get_metrics())
@@ -1,9 +1,61 @@
 import sys
+import types
 import traceback
-from typing import Optional
+from enum import Enum
+from typing import Optional, Dict, Any
 from src.logger import logging
 
 
+class ErrorCode(str, Enum):
+    """Typed error codes; the value is the prefix shown in str(exception)."""
+
+    # input problems (client errors)
+    VALIDATION_ERROR = "VALIDATION_ERROR"
+    NORMALIZATION_VALIDATION_ERROR = "NORMALIZATION_VALIDATION_ERROR"
+    AI_DETECTION_VALIDATION_ERROR = "AI_DETECTION_VALIDATION_ERROR"
+    PLAGIARISM_DETECTION_VALIDATION_ERROR = "PLAGIARISM_DETECTION_VALIDATION_ERROR"
+
+    # processing
+    NORMALIZATION_ERROR = "NORMALIZATION_ERROR"
+    LIGHT_NORMALIZATION_ERROR = "LIGHT_NORMALIZATION_ERROR"
+    AGGRESSIVE_NORMALIZATION_ERROR = "AGGRESSIVE_NORMALIZATION_ERROR"
+    AI_DETECTION_ERROR = "AI_DETECTION_ERROR"
+    PLAGIARISM_DETECTION_ERROR = "PLAGIARISM_DETECTION_ERROR"
+    COMPARISON_ERROR = "COMPARISON_ERROR"
+
+    # ingestion
+    API_TIMEOUT = "API_TIMEOUT"
+    API_HTTP_ERROR = "API_HTTP_ERROR"
+    API_REQUEST_ERROR = "API_REQUEST_ERROR"
+    API_UNKNOWN_ERROR = "API_UNKNOWN_ERROR"
+    MONGO_ERROR = "MONGO_ERROR"
+
+    # model loading
+    MODEL_VALIDATION_ERROR = "MODEL_VALIDATION_ERROR"
+    MODEL_LOAD_ERROR = "MODEL_LOAD_ERROR"
+    MODEL_LOADING_PIPELINE_ERROR = "MODEL_LOADING_PIPELINE_ERROR"
+    TOKENIZER_LOAD_ERROR = "TOKENIZER_LOAD_ERROR"
+
+    # pipelines
+    PIPELINE_ERROR = "PIPELINE_ERROR"
+    REANALYSIS_ERROR = "REANALYSIS_ERROR"
+
+    UNKNOWN_ERROR = "UNKNOWN_ERROR"
+
+    @property
+    def is_client_error(self) -> bool:
+        return self in _CLIENT_ERRORS
+
+
+_CODES_BY_PREFIX = {code.value: code for code in ErrorCode}
+_CLIENT_ERRORS = frozenset({
+    ErrorCode.VALIDATION_ERROR,
+    ErrorCode.NORMALIZATION_VALIDATION_ERROR,
+    ErrorCode.AI_DETECTION_VALIDATION_ERROR,
+    ErrorCode.PLAGIARISM_DETECTION_VALIDATION_ERROR,
+})
+
+
 def format_error_message(error: BaseException) -> str:
     exc_type, exc_value, exc_tb = sys.exc_info()
 
@@ -24,20 +76,115 @@ class CustomException(Exception):
     """
     Custom exception that captures a formatted error message and
     optionally stores the original exception and traceback.
+
+    Construction is cheap: the active exception and its traceback object are
+    stored as-is and only turned into text when `traceback` or `to_dict()` is
+    used. Pass `code=ErrorCode.X` for a typed code; legacy
+    "PREFIX: message" strings are still mapped to their code, and the old
+    `CustomException(msg, sys)` calling form is accepted.
     """
-    def __init__(self, error: BaseException | str, original_exception: Optional[BaseException] = None):
+    def __init__(
+        self,
+        error: BaseException | str,
+        original_exception: Optional[BaseException] = None,
+        code: Optional[ErrorCode] = None,
+    ):
+        if isinstance(original_exception, types.ModuleType):
+            original_exception = None  # legacy CustomException(msg, sys)
+
+        exc_info = sys.exc_info()
+
         # If a string is passed, use it directly; if an exception is passed, format it
-        if isinstance(error, BaseException):
-            message = format_error_message(error)
+        if isinstance(error, CustomException):
+            detail = error.detail
+            code = code or error.code
+            orig = error
+        elif isinstance(error, BaseException):
+            detail = format_error_message(error)
             orig = error
         else:
-            message = str(error)
-            orig = original_exception
+            detail = str(error)
+            orig = original_exception if original_exception is not None else exc_info[1]
 
-        super().__init__(message)
-        self.error_message = message
+        if code is None:
+            prefix, sep, rest = detail.partition(": ")
+            code = _CODES_BY_PREFIX.get(prefix) if sep else None
+            if code is not None:
+                detail = rest
+
+        self.code: ErrorCode = code or ErrorCode.UNKNOWN_ERROR
+        self.detail = detail
+        self.error_message = f"{code.value}: {detail}" if code else detail
         self.original_exception = orig
-        self.traceback = traceback.format_exc()
+        self._exc_info = exc_info if exc_info[0] is not None else None
+        self._formatted_traceback: Optional[str] = None
+        super().__init__(self.error_message)
+
+    @property
+    def traceback(self) -> str:
+        """Formatted traceback of the exception being handled at construction (computed once, on demand)."""
+        if self._formatted_traceback is None:
+            if self._exc_info is None:
+                self._formatted_traceback = "NoneType: None\n"
+            else:
+                self._formatted_traceback = "".join(traceback.format_exception(*self._exc_info))
+        return self._formatted_traceback
+
+    @property
+    def is_client_error(self) -> bool:
+        return self.code.is_client_error
+
+    def to_dict(self, include_traceback: bool = False) -> Dict[str, Any]:
+        data = {"code": self.code.value, "message": self.detail}
+        if include_traceback:
+            data["traceback"] = self.traceback
+        return data
 
     def __str__(self) -> str:
         return self.error_message
+
+
+# ----------------- Benchmark -----------------
+def benchmark_malformed_input(iterations: int = 20_000) -> Dict[str, float]:
+    """
+    Cost of the malformed-input path: a ValueError caught and wrapped in
+    CustomException, as normalize()/detect() do for bad submissions.
+    Compares lazy capture with formatting the traceback straight away (what
+    the previous __init__ always did).
+    """
+    import time
+
+    def _validate(code):
+        if not code or not code.strip():
+            raise ValueError("Code must be a non-empty string")
+
+    def _wrap(format_now: bool):
+        try:
+            _validate("   ")
+        except ValueError as e:
+            exc = CustomException(f"Validation error: {e}", code=ErrorCode.NORMALIZATION_VALIDATION_ERROR)
+            if format_now:
+                exc.traceback
+            return exc
+
+    results = {}
+    for name, format_now in (("lazy_capture", False), ("eager_format", True)):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            _wrap(format_now)
+        results[f"{name}_us"] = round((time.perf_counter() - start) / iterations * 1e6, 2)
+    results["speedup"] = round(results["eager_format_us"] / results["lazy_capture_us"], 1)
+    return results
+
+
+if __name__ == "__main__":
+    import json
+
+    try:
+        int("not a number")
+    except ValueError as e:
+        err = CustomException(f"VALIDATION_ERROR: {e}", sys)
+        print(err, err.code, err.is_client_error)
+        print(json.dumps(err.to_dict(include_traceback=True), indent=2))
+
+    print(json.dumps(benchmark_malformed_input(), indent=2))
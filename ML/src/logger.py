@@ -1,5 +1,9 @@
 import logging, os
-from datetime import datetime
+import json
+import queue
+import atexit
+import logging.handlers
+from datetime import datetime, timezone
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))          # directory of src/logger.py
 PROJECT_ROOT = os.path.abspath(os.path.join(BASE_DIR, ".."))   # adjust if needed
@@ -10,13 +14,187 @@ os.makedirs(LOG_DIR, exist_ok=True)
 LOG_FILE = f"{RUN_STAMP}.log"
 LOG_FILE_PATH = os.path.join(LOG_DIR, LOG_FILE)
 
-logging.basicConfig(
-    filename=LOG_FILE_PATH,
-    format="[{asctime}] - {levelname} - {name} - {message}",
-    style="{",
-    level=logging.INFO,
-)
+TEXT_FORMAT = "[{asctime}] - {levelname} - {name} - {message}"
+
+# Attributes every LogRecord has; anything else on a record came from `extra=`
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including the fields passed via `extra=`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[f"extra_{key}" if key in entry else key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that hands the record over untouched.
+
+    The stock prepare() formats the message on the calling thread; here the
+    listener thread does all formatting, so a request thread only pays for
+    building the LogRecord and a queue put. Records never leave the process,
+    so args and exc_info do not need to be pickle-safe.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def _build_file_handler(path: str, fmt: str) -> logging.Handler:
+    handler = logging.FileHandler(path)
+    if fmt == "text":
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT, style="{"))
+    else:
+        handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def _parse_levels(spec: str) -> dict:
+    """"src.components.normalization=DEBUG,src.ml_core=WARNING" -> {name: level}"""
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+_listener = None
+
+
+def setup_logging(
+    level: str = os.getenv("LOG_LEVEL", "INFO"),
+    fmt: str = os.getenv("LOG_FORMAT", "json"),
+    logger_levels: str = os.getenv("LOG_LEVELS", ""),
+    path: str = LOG_FILE_PATH,
+):
+    """
+    Route every logger through a queue to a background file writer.
+
+    Handlers on the root logger are replaced by one QueueHandler; a
+    QueueListener thread formats (JSON by default, LOG_FORMAT=text for the
+    old layout) and writes the file. Per-logger levels come from LOG_LEVELS
+    or set_log_level, e.g. LOG_LEVELS="src.components.normalization=DEBUG".
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_DeferredQueueHandler(log_queue))
+    root.setLevel(level.upper())
+
+    for name, logger_level in _parse_levels(logger_levels).items():
+        logging.getLogger(name).setLevel(logger_level)
+
+    _listener = logging.handlers.QueueListener(log_queue, _build_file_handler(path, fmt), respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
+
+
+def set_log_level(name: str, level: str):
+    """Change one logger's level at runtime (e.g. turn a hot path up to DEBUG)."""
+    logging.getLogger(name).setLevel(level.upper())
+
+
+def _restart_in_child():
+    # A forked worker (e.g. the re-analysis process pool) inherits the queue
+    # but not the listener thread; give it its own writer.
+    global _listener
+    _listener = None
+    setup_logging()
+
+
+setup_logging()
+atexit.register(shutdown_logging)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_in_child)
+
+
+# ----------------- Benchmark -----------------
+def benchmark_logging(requests: int = 5_000, normalize_calls: int = 7):
+    """
+    Caller-thread logging cost per simulated /analyze request: one INFO line
+    with `extra` per normalize() call plus two detection lines.
+
+    - sync_text: the previous setup (FileHandler on the request thread)
+    - queue_json: QueueHandler -> listener thread, JSON with extra fields
+    - queue_json_hot_debug: as above, normalize lines logged at DEBUG while
+      the logger stays at INFO (the recommended production setting)
+    """
+    import time
+    import tempfile
+
+    extra = {"level": "light", "original_size": 812, "normalized_size": 640, "reduction_pct": 21.2, "latency_ms": 0}
+    detection = {"is_ai": False, "confidence": 0.31, "risk_level": "LOW", "processing_time_ms": 41}
+    results = {}
+
+    def _run(name, logger, hot_level):
+        start = time.perf_counter()
+        for _ in range(requests):
+            for _ in range(normalize_calls):
+                logger.log(hot_level, "Normalized successfully", extra=extra)
+            logger.info("AI detection complete", extra=detection)
+            logger.info("Plagiarism detection complete", extra=detection)
+        elapsed = time.perf_counter() - start
+        results[name] = {"us_per_request": round(elapsed / requests * 1e6, 2)}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, queued, fmt, hot_level in (
+            ("sync_text", False, "text", logging.INFO),
+            ("queue_json", True, "json", logging.INFO),
+            ("queue_json_hot_debug", True, "json", logging.DEBUG),
+        ):
+            logger = logging.getLogger(f"benchmark.{name}")
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            file_handler = _build_file_handler(os.path.join(tmp, f"{name}.log"), fmt)
+            listener = None
+            if queued:
+                log_queue = queue.SimpleQueue()
+                logger.addHandler(_DeferredQueueHandler(log_queue))
+                listener = logging.handlers.QueueListener(log_queue, file_handler)
+                listener.start()
+            else:
+                logger.addHandler(file_handler)
+
+            _run(name, logger, hot_level)
+
+            if listener:
+                listener.stop()
+            file_handler.close()
+            logger.handlers.clear()
+    return results
 
 
 if __name__=="__main__":
-    logging.info("Logging has started")
\ No newline at end of file
+    logging.info("Logging has started", extra={"log_file": LOG_FILE_PATH})
+    print(json.dumps(benchmark_logging(), indent=2))
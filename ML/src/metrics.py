@@ -0,0 +1,317 @@
+import time
+import threading
+import functools
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.tracing import span
+
+# Latency buckets in seconds: 0.5 ms .. 10 s
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+# ----------------- Per-thread shards -----------------
+class _Sharded:
+    """
+    Base for metrics that are only ever written by the thread that owns the
+    shard. observe()/inc() touch thread-local state, so the hot path takes no
+    lock (a lock is taken once per thread, to register its shard); readers
+    sum all shards when the metric is scraped.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List = []
+        self._register_lock = threading.Lock()
+
+    def _new_shard(self):
+        raise NotImplementedError
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._new_shard()
+            self._local.shard = shard
+            with self._register_lock:
+                self._shards.append(shard)
+        return shard
+
+
+class Counter(_Sharded):
+    def _new_shard(self):
+        return [0.0]
+
+    def inc(self, amount: float = 1.0):
+        self._shard()[0] += amount
+
+    @property
+    def value(self) -> float:
+        return sum(shard[0] for shard in list(self._shards))
+
+
+class Gauge(_Sharded):
+    """inc()/dec() may come from different threads; the value is the sum of all shards."""
+
+    def _new_shard(self):
+        return [0.0]
+
+    def inc(self, amount: float = 1.0):
+        self._shard()[0] += amount
+
+    def dec(self, amount: float = 1.0):
+        self._shard()[0] -= amount
+
+    @property
+    def value(self) -> float:
+        return sum(shard[0] for shard in list(self._shards))
+
+
+class Histogram(_Sharded):
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__()
+
+    def _new_shard(self):
+        # [count per bucket..., +Inf bucket, sum, count]
+        return [0] * (len(self.buckets) + 1) + [0.0, 0]
+
+    def observe(self, value: float):
+        shard = self._shard()
+        shard[bisect_left(self.buckets, value)] += 1
+        shard[-2] += value
+        shard[-1] += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        """(cumulative bucket counts incl. +Inf, sum, count)"""
+        n = len(self.buckets) + 1
+        totals = [0] * (n + 2)
+        for shard in list(self._shards):
+            for i, v in enumerate(shard):
+                totals[i] += v
+        cumulative, running = [], 0
+        for count in totals[:n]:
+            running += count
+            cumulative.append(running)
+        return cumulative, totals[-2], totals[-1]
+
+
+# ----------------- Families & registry -----------------
+class MetricFamily:
+    """A named metric with optional labels; one child metric per label combination."""
+
+    def __init__(self, name: str, kind: str, help_text: str, labelnames: Iterable[str] = (), **kwargs):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._kwargs = kwargs
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values) -> object:
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    if len(key) != len(self.labelnames):
+                        raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+                    cls = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}[self.kind]
+                    child = cls(**self._kwargs)
+                    self._children[key] = child
+        return child
+
+    # unlabeled shortcuts
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _label_str(self, key: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+        return "{" + body + "}"
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(self._children.items()):
+            if self.kind == "histogram":
+                cumulative, total, count = child.snapshot()
+                for bound, value in zip(list(child.buckets) + ["+Inf"], cumulative):
+                    lines.append(f"{self.name}_bucket{self._label_str(key, ('le', str(bound)))} {value}")
+                lines.append(f"{self.name}_sum{self._label_str(key)} {total}")
+                lines.append(f"{self.name}_count{self._label_str(key)} {count}")
+            else:
+                lines.append(f"{self.name}{self._label_str(key)} {child.value}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """
+    Holds metric families and renders them in the Prometheus text format.
+
+    Collectors are callables returning {metric_name: value} (or
+    {metric_name: {label_value: value}} with the label name given at
+    registration); they are read at scrape time, which is how totals that
+    components already keep (get_metrics) are exposed without touching their
+    hot paths.
+    """
+
+    def __init__(self):
+        self._families: Dict[str, MetricFamily] = {}
+        self._collectors: List[Tuple[str, Callable[[], Dict], Optional[str]]] = []
+        self._lock = threading.Lock()
+
+    def _family(self, name, kind, help_text, labelnames, **kwargs) -> MetricFamily:
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = MetricFamily(name, kind, help_text, labelnames, **kwargs)
+                self._families[name] = family
+            return family
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> MetricFamily:
+        return self._family(name, "counter", help_text, labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> MetricFamily:
+        return self._family(name, "gauge", help_text, labelnames)
+
+    def histogram(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> MetricFamily:
+        return self._family(name, "histogram", help_text, labelnames, buckets=buckets)
+
+    def register_collector(self, prefix: str, fn: Callable[[], Dict], label: Optional[str] = None):
+        self._collectors.append((prefix, fn, label))
+
+    def clear_collectors(self):
+        self._collectors.clear()
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for family in list(self._families.values()):
+            lines.extend(family.render())
+
+        for prefix, fn, label in list(self._collectors):
+            try:
+                values = fn()
+            except Exception as e:
+                lines.append(f"# collector {prefix} failed: {_escape(str(e))}")
+                continue
+            for key, value in values.items():
+                name = f"{prefix}_{key}"
+                if isinstance(value, dict):
+                    lines.append(f"# TYPE {name} gauge")
+                    for label_value, v in value.items():
+                        if isinstance(v, (int, float)):
+                            lines.append(f'{name}{{{label or "key"}="{_escape(str(label_value))}"}} {float(v)}')
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"# TYPE {name} gauge")
+                    lines.append(f"{name} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_LATENCY = REGISTRY.histogram(
+    "analysis_stage_latency_seconds", "Latency of each analysis stage", labelnames=("stage",)
+)
+REQUESTS = REGISTRY.counter(
+    "analysis_requests_total", "Analyzed submissions by mode and decision", labelnames=("mode", "verdict")
+)
+REQUEST_ERRORS = REGISTRY.counter(
+    "analysis_request_errors_total", "Failed analysis requests by error code", labelnames=("code",)
+)
+BATCH_SIZE = REGISTRY.histogram(
+    "analysis_batch_size", "Submissions per batch", labelnames=("source",), buckets=BATCH_SIZE_BUCKETS
+)
+IN_FLIGHT = REGISTRY.gauge(
+    "analysis_requests_in_flight", "Analysis requests being processed or waiting for a worker thread"
+)
+
+
+def timed(stage: str):
+    """
+    Decorator: record the wrapped call's latency under
+    analysis_stage_latency_seconds{stage=...}, and as a span of the current
+    trace when one is active.
+    """
+    histogram = STAGE_LATENCY.labels(stage)
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                with span(stage):
+                    return fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+# ----------------- Benchmark -----------------
+def benchmark_observe(threads: int = 8, observations: int = 200_000) -> Dict[str, float]:
+    """Histogram.observe throughput with several writer threads (sharded) vs one shared locked list."""
+    import random
+
+    values = [random.random() * 0.2 for _ in range(1000)]
+    results = {}
+
+    def _run(name, observe):
+        def _worker():
+            for i in range(observations):
+                observe(values[i % 1000])
+        workers = [threading.Thread(target=_worker) for _ in range(threads)]
+        start = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - start
+        results[f"{name}_ns_per_observe"] = round(elapsed / (threads * observations) * 1e9, 1)
+
+    sharded = Histogram()
+    _run("sharded", sharded.observe)
+
+    lock = threading.Lock()
+    shared = [0] * (len(LATENCY_BUCKETS) + 3)
+
+    def _locked_observe(value):
+        with lock:
+            shared[bisect_left(LATENCY_BUCKETS, value)] += 1
+            shared[-2] += value
+            shared[-1] += 1
+    _run("locked", _locked_observe)
+
+    results["sharded_count_ok"] = sharded.snapshot()[2] == threads * observations
+    return results
+
+
+if __name__ == "__main__":
+    import json
+
+    @timed("demo")
+    def work(n):
+        return sum(range(n))
+
+    for n in (1_000, 10_000, 100_000):
+        work(n)
+    REQUESTS.labels("practice", "ACCEPT").inc()
+    BATCH_SIZE.labels("api").observe(12)
+    print(REGISTRY.render())
+    print(json.dumps(benchmark_observe(), indent=2))
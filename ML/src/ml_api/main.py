@@ -1,20 +1,30 @@
 from __future__ import annotations
+import os
 import sys
 from contextlib import asynccontextmanager
 from typing import Optional, List, Dict, Any
 
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Header, Query
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel, Field
 
 from src.logger import logging
 from src.exception import CustomException
-from src.components.data_ingestion import DataIngestion
+from src.components.data_ingestion import DataIngestion, LANGUAGES
 from src.components.normalization import Normalizer
 from src.ml_core.model_loader import get_model_singleton
 from src.ml_core.code_detector import AICodeDetector
-from src.ml_core.plagiarism_detector import PlagiarismDetector
+from src.ml_core.bucketed_model import BucketedCausalLM
+from src.ml_core.inference_executor import InferenceExecutor, DEFAULT_NUM_REPLICAS
+from src.ml_core.plagiarism_detector import PlagiarismDetector, AlgorithmPattern
+from src.ml_core.sharded_detector import ShardedPlagiarismDetector, DEFAULT_NUM_SHARDS
 from src.ml_core.decision_engine import DecisionEngine, DecisionConfig
+from src.metrics import REGISTRY, REQUESTS, REQUEST_ERRORS, BATCH_SIZE, IN_FLIGHT
+from src.tracing import RequestTracer
+from src.ml_api.serialization import (
+    detection_payload, plagiarism_payload, decision_payload, parse_fields, encode_response,
+)
 
 class AnalyzeRequest(BaseModel):
     code: str = Field(..., description="Raw source code to analyze")
@@ -33,11 +43,41 @@ class AnalyzeResponse(BaseModel):
     plagiarism_detection: Dict[str, Any]
     decision: Dict[str, Any]
 
+    trace: Optional[Dict[str, Any]] = None  # only with the X-Debug-Trace header
+
 class HealthResponse(BaseModel):
     status: str
     device: str
     model_loaded: bool
 
+
+class PatternRequest(BaseModel):
+    name: str = Field(..., min_length=1)
+    category: str = Field(default="uncategorized")
+    code: str = Field(..., description="Source code of the known solution")
+    sources: List[str] = Field(default_factory=list)
+    language: str = Field(default="python")
+
+
+class PatternBulkRequest(BaseModel):
+    patterns: List[PatternRequest]
+    replace: bool = Field(default=False, description="Drop the current corpus first")
+
+
+class PatternCorpusResponse(BaseModel):
+    version: int
+    num_patterns: int
+    changed: int = 0
+    patterns: Optional[List[Dict[str, Any]]] = None
+
+
+# Bulk pattern loads normalize in this many worker processes (unset: in-process)
+PATTERN_LOAD_WORKERS = int(os.getenv("PATTERN_LOAD_WORKERS", 0)) or None
+# More than one: the pattern corpus is partitioned across this many shard processes
+PLAGIARISM_SHARDS = DEFAULT_NUM_SHARDS
+# More than one: AI detection runs on this many model replicas pinned to disjoint cores
+INFERENCE_REPLICAS = DEFAULT_NUM_REPLICAS
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     try:
@@ -47,18 +87,36 @@ async def lifespan(app: FastAPI):
         data_ingestor = DataIngestion()
         normalizer = Normalizer()
 
-        model, tokenizer, device = get_model_singleton()
-
-        ai_detector = AICodeDetector(
-            model=model,
-            tokenizer=tokenizer,
-            device=device,
-            normalizer=normalizer,
-        )
-
-        plag_detector = PlagiarismDetector(
-            normalizer=normalizer,
-        )
+        model = None
+        if INFERENCE_REPLICAS > 1:
+            # Replicas load their own models; this process holds none
+            ai_detector = InferenceExecutor(num_replicas=INFERENCE_REPLICAS)
+            device = f"cpu (replicas={INFERENCE_REPLICAS})"
+        else:
+            model, tokenizer, device = get_model_singleton()
+            if isinstance(model, BucketedCausalLM):
+                # Compile and run every shape bucket before the first request can hit it
+                model.warmup()
+
+            ai_detector = AICodeDetector(
+                model=model,
+                tokenizer=tokenizer,
+                device=device,
+                normalizer=normalizer,
+            )
+
+        if PLAGIARISM_SHARDS > 1:
+            plag_detector = ShardedPlagiarismDetector(
+                num_shards=PLAGIARISM_SHARDS,
+                normalizer=normalizer,
+            )
+        else:
+            plag_detector = PlagiarismDetector(
+                normalizer=normalizer,
+            )
+        pattern_file = os.getenv("PATTERN_FILE")
+        if pattern_file:
+            plag_detector.load_pattern_file(pattern_file, workers=PATTERN_LOAD_WORKERS)
 
         decision_engine = DecisionEngine(DecisionConfig(mode="practice"))
 
@@ -69,6 +127,14 @@ async def lifespan(app: FastAPI):
         app.state.plag_detector = plag_detector
         app.state.decision_engine = decision_engine
         app.state.device = device
+        app.state.tracer = RequestTracer()
+
+        # Totals the components already keep, read at scrape time
+        REGISTRY.register_collector("normalizer", normalizer.get_metrics)
+        REGISTRY.register_collector("ai_detector", ai_detector.get_metrics, label="replica")
+        REGISTRY.register_collector("plagiarism_detector", plag_detector.get_metrics)
+        if isinstance(model, BucketedCausalLM):
+            REGISTRY.register_collector("model_bucket", model.bucket_stats, label="bucket")
 
         logging.info("Startup complete: detectors and decision engine initialized.")
 
@@ -80,6 +146,13 @@ async def lifespan(app: FastAPI):
 
     finally:
         logging.info("Shutting down Code Analysis Engine")
+        REGISTRY.clear_collectors()
+        plag_detector = getattr(app.state, "plag_detector", None)
+        if isinstance(plag_detector, ShardedPlagiarismDetector):
+            plag_detector.close()
+        ai_detector = getattr(app.state, "ai_detector", None)
+        if isinstance(ai_detector, InferenceExecutor):
+            ai_detector.close()
         # If you had resources to close (DB, clients), do it here.
 
 
@@ -90,6 +163,25 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+@app.middleware("http")
+async def track_in_flight(request: Request, call_next):
+    # Counted on the event loop, so requests still waiting for a worker
+    # thread show up as well as the ones being processed.
+    if not request.url.path.startswith("/analyze"):
+        return await call_next(request)
+    IN_FLIGHT.inc()
+    try:
+        return await call_next(request)
+    finally:
+        IN_FLIGHT.dec()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text exposition of stage latencies, request counters and component totals."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/health", response_model=HealthResponse)
 def health_check():
     try:
@@ -107,8 +199,34 @@ def health_check():
         raise HTTPException(status_code=500, detail="Health check failed")
 
 
-@app.post("/analyze", response_model=AnalyzeResponse)
-def analyze_code(request: AnalyzeRequest):
+def _debug_requested(header_value: Optional[str]) -> bool:
+    return bool(header_value) and header_value.lower() not in ("0", "false", "no")
+
+
+def _analyze_traced(request: AnalyzeRequest, debug: bool) -> Dict[str, Any]:
+    payload, trace = app.state.tracer.run(_analyze, request, debug=debug, label="analyze")
+    if debug and trace is not None:
+        payload["trace"] = trace.to_dict()
+    return payload
+
+
+@app.post("/analyze", response_model=AnalyzeResponse, response_model_exclude_none=True)
+def analyze_code(
+    request: AnalyzeRequest,
+    x_debug_trace: Optional[str] = Header(default=None),
+    fields: Optional[str] = Query(default=None, description="Comma-separated dotted paths, e.g. decision,ai_detection.confidence"),
+):
+    """
+    Analyze one submission. With `X-Debug-Trace: 1` the response carries a
+    `trace` field: per-span timings (normalization levels, tokenize, forward,
+    AST, style, difflib, decision) and, if this request was profiled, the
+    path of its cProfile dump. `?fields=` returns only the listed parts.
+    """
+    selection = parse_fields(fields)
+    return encode_response(_analyze_traced(request, _debug_requested(x_debug_trace)), selection)
+
+
+def _analyze(request: AnalyzeRequest) -> Dict[str, Any]:
     try:
         ai_detector: AICodeDetector = app.state.ai_detector
         plag_detector: PlagiarismDetector = app.state.plag_detector
@@ -117,53 +235,126 @@ def analyze_code(request: AnalyzeRequest):
         raw_code = request.code
         if not raw_code or not raw_code.strip():
             raise HTTPException(status_code=400, detail="Code cannot be empty")
+        if request.language not in LANGUAGES:
+            raise HTTPException(status_code=400, detail=f"Unsupported language: {request.language}")
 
         # AI detection
-        ai_result = ai_detector.detect(raw_code)
-        ai_payload = ai_result.to_dict()
+        ai_result = ai_detector.detect(raw_code, language=request.language)
 
         # Plagiarism detection
-        plag_result = plag_detector.detect(raw_code)
-        plag_payload = plag_result.to_dict()
+        plag_result = plag_detector.detect(raw_code, language=request.language)
 
         # Decision: update mode per request
         decision_engine.config = DecisionConfig(mode=request.mode)
         decision = decision_engine.decide(ai_result, plag_result)
-        decision_payload = {
-            "action": decision.action,
-            "rationale": decision.rationale,
-            "combined_confidence": decision.combined_confidence,
-            "details": decision.details,
-        }
+
+        REQUESTS.labels(request.mode, decision.action).inc()
 
         submission_id = request.submission_id or f"auto_{id(request)}"
 
-        return AnalyzeResponse(
-            submission_id=submission_id,
-            user_id=request.user_id,
-            mode=request.mode,
-            ai_detection=ai_payload,
-            plagiarism_detection=plag_payload,
-            decision=decision_payload,
-        )
+        # Plain dicts straight from the results; serialization.encode_response encodes them once
+        return {
+            "submission_id": submission_id,
+            "user_id": request.user_id,
+            "mode": request.mode,
+            "ai_detection": detection_payload(ai_result),
+            "plagiarism_detection": plagiarism_payload(plag_result),
+            "decision": decision_payload(decision),
+        }
 
     except CustomException as e:
-        logging.error(f"CustomException in /analyze: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        logging.error(f"CustomException in /analyze: {e}", extra={"error_code": e.code.value})
+        REQUEST_ERRORS.labels(e.code.value).inc()
+        raise HTTPException(status_code=422 if e.is_client_error else 500, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
         logging.error(f"Unexpected error in /analyze: {e}")
+        REQUEST_ERRORS.labels("UNEXPECTED").inc()
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
-@app.post("/analyze-batch", response_model=List[AnalyzeResponse])
-def analyze_batch(requests: List[AnalyzeRequest]):
-    responses: List[AnalyzeResponse] = []
+@app.post("/analyze-batch", response_model=List[AnalyzeResponse], response_model_exclude_none=True)
+def analyze_batch(
+    requests: List[AnalyzeRequest],
+    fields: Optional[str] = Query(default=None, description="Applied to every item, as on /analyze"),
+):
+    BATCH_SIZE.labels("api").observe(len(requests))
+    selection = parse_fields(fields)
+    responses: List[Dict[str, Any]] = []
     for req in requests:
-        resp = analyze_code(req)
-        responses.append(resp)
-    return responses
+        responses.append(_analyze_traced(req, debug=False))
+    return encode_response(responses, selection)
+
+# ----------------- Pattern corpus -----------------
+def _to_pattern(request: PatternRequest) -> AlgorithmPattern:
+    if not request.code.strip():
+        raise HTTPException(status_code=400, detail=f"Pattern {request.name!r}: code cannot be empty")
+    if request.language not in LANGUAGES:
+        raise HTTPException(status_code=400, detail=f"Unsupported language: {request.language}")
+    return AlgorithmPattern(
+        name=request.name,
+        category=request.category,
+        code=request.code,
+        sources=request.sources,
+        language=request.language,
+    )
+
+
+def _corpus_response(changed: int = 0, patterns=None) -> PatternCorpusResponse:
+    return PatternCorpusResponse(
+        **app.state.plag_detector.corpus_info(),
+        changed=changed,
+        patterns=patterns,
+    )
+
+
+def _update_patterns(update):
+    """Run a corpus update, mapping failures like /analyze does."""
+    try:
+        return update()
+    except CustomException as e:
+        logging.error(f"CustomException in pattern update: {e}", extra={"error_code": e.code.value})
+        raise HTTPException(status_code=422 if e.is_client_error else 500, detail=str(e))
+    except Exception as e:
+        logging.error(f"Unexpected error in pattern update: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@app.get("/patterns", response_model=PatternCorpusResponse, response_model_exclude_none=True)
+def list_patterns(offset: int = Query(default=0, ge=0), limit: int = Query(default=100, ge=0, le=1000)):
+    """Summaries (no code) of the current pattern corpus, in match order."""
+    return _corpus_response(patterns=app.state.plag_detector.list_patterns(offset, limit))
+
+
+@app.post("/patterns", response_model=PatternCorpusResponse, response_model_exclude_none=True)
+def add_pattern(request: PatternRequest):
+    """Add a pattern, replacing any with the same name. Running analyses keep the corpus they started with."""
+    plag_detector: PlagiarismDetector = app.state.plag_detector
+    pattern = _to_pattern(request)
+    _update_patterns(lambda: plag_detector.add_pattern(pattern))
+    return _corpus_response(changed=1)
+
+
+@app.post("/patterns/bulk", response_model=PatternCorpusResponse, response_model_exclude_none=True)
+def load_patterns(request: PatternBulkRequest):
+    """Add many patterns (or replace the corpus) with a single swap."""
+    plag_detector: PlagiarismDetector = app.state.plag_detector
+    patterns = [_to_pattern(p) for p in request.patterns]
+    _update_patterns(
+        lambda: plag_detector.load_patterns(patterns, replace=request.replace, workers=PATTERN_LOAD_WORKERS)
+    )
+    return _corpus_response(changed=len(patterns))
+
+
+@app.delete("/patterns/{name}", response_model=PatternCorpusResponse, response_model_exclude_none=True)
+def remove_pattern(name: str):
+    plag_detector: PlagiarismDetector = app.state.plag_detector
+    removed = _update_patterns(lambda: plag_detector.remove_patterns([name]))
+    if not removed:
+        raise HTTPException(status_code=404, detail=f"Unknown pattern: {name}")
+    return _corpus_response(changed=removed)
+
 
 if __name__ == "__main__":
     try:
@@ -11,7 +11,7 @@ class AIBreakdown(BaseModel):
     is_ai_generated: bool
     confidence: float = Field(ge=0.0, le=1.0)
     risk_level: str
-    perplexity: float
+    perplexity: Optional[float]  # None when the detector cascade skipped the model
     reasoning: str
 
 
@@ -102,7 +102,7 @@ class ReviewFormatter:
         factors = []
         
         # AI risks
-        if ai_result.perplexity < 15.0:
+        if ai_result.perplexity is not None and ai_result.perplexity < 15.0:
             factors.append(f"Low perplexity ({ai_result.perplexity:.1f})")
         
         if ai_result.weighted_score > 0.6:
@@ -154,7 +154,8 @@ class ReviewFormatter:
         
         md.append(f"### AI Detection")
         md.append(f"- **Risk:** {review.ai_breakdown.risk_level}")
-        md.append(f"- **Perplexity:** {review.ai_breakdown.perplexity:.1f}")
+        if review.ai_breakdown.perplexity is not None:
+            md.append(f"- **Perplexity:** {review.ai_breakdown.perplexity:.1f}")
         md.append(f"- {review.ai_breakdown.reasoning}\n")
         
         md.append(f"### Plagiarism Detection")
@@ -0,0 +1,212 @@
+"""
+Response payloads for /analyze and /analyze-batch.
+
+The old path went result.to_dict() (dataclasses.asdict deep-copies every
+nested dict and list, and PlagiarismResult converted its matches twice),
+then pydantic re-validated the Dict[str, Any] fields of AnalyzeResponse,
+then the JSON encoder walked the whole tree once more. Here payloads are
+built straight from the result objects' fields. Nested feature dicts and
+lists are referenced, not copied, because the payload is encoded right away
+and then discarded. The encoded bytes go out in a JSONBytesResponse, which
+FastAPI returns as-is, with no response_model validation.
+
+orjson encodes when it is installed; otherwise compact json.dumps. Both
+write NaN and infinities as null (orjson does so natively; the stdlib path
+maps them first), so a degenerate score never turns a response into a 500.
+
+?fields= selects parts of the payload with comma-separated dotted paths,
+e.g. "submission_id,decision.action,ai_detection.confidence". A path into a
+list applies to every element ("plagiarism_detection.matches.pattern_name").
+Unknown top-level fields are rejected; unknown nested keys are skipped.
+"""
+import json
+import math
+from dataclasses import asdict, fields, is_dataclass
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+from src.metrics import timed
+from src.ml_core.code_detector import DetectionResult
+from src.ml_core.plagiarism_detector import PlagiarismResult, PlagiarismMatch
+from src.ml_core.decision_engine import DecisionResult
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # optional: fall back to the standard library
+    orjson = None
+
+RESPONSE_FIELDS = ("submission_id", "user_id", "mode", "ai_detection", "plagiarism_detection", "decision", "trace")
+
+_DETECTION_FIELDS = tuple(f.name for f in fields(DetectionResult))
+_PLAGIARISM_FIELDS = tuple(f.name for f in fields(PlagiarismResult) if f.name not in ("matches", "best_match"))
+_MATCH_FIELDS = tuple(f.name for f in fields(PlagiarismMatch))
+
+
+# ----------------- Payloads -----------------
+def detection_payload(result: DetectionResult) -> Dict[str, Any]:
+    return {name: getattr(result, name) for name in _DETECTION_FIELDS}
+
+
+def _match_payload(match: PlagiarismMatch) -> Dict[str, Any]:
+    return {name: getattr(match, name) for name in _MATCH_FIELDS}
+
+
+def plagiarism_payload(result: PlagiarismResult) -> Dict[str, Any]:
+    payload = {name: getattr(result, name) for name in _PLAGIARISM_FIELDS}
+    matches = [_match_payload(m) for m in result.matches]
+    payload["matches"] = matches
+    best = result.best_match
+    if best is None:
+        payload["best_match"] = None
+    else:
+        # best_match is normally one of matches; reuse its dict instead of converting it again
+        payload["best_match"] = next(
+            (converted for m, converted in zip(result.matches, matches) if m is best), None
+        ) or _match_payload(best)
+    return payload
+
+
+def decision_payload(decision: DecisionResult) -> Dict[str, Any]:
+    return {
+        "action": decision.action,
+        "rationale": decision.rationale,
+        "combined_confidence": decision.combined_confidence,
+        "details": decision.details,
+    }
+
+
+# ----------------- Field selection -----------------
+def parse_fields(spec: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    "a,b.c,b.d" -> {"a": None, "b": {"c": None, "d": None}}, where None means
+    the whole value. None or blank selects everything. Raises a 400 for
+    unknown top-level fields.
+    """
+    if not spec or not spec.strip():
+        return None
+    tree: Dict[str, Any] = {}
+    for path in spec.split(","):
+        parts = [p for p in path.strip().split(".") if p]
+        if not parts:
+            continue
+        if parts[0] not in RESPONSE_FIELDS:
+            raise HTTPException(status_code=400, detail=f"Unknown field {parts[0]!r}; expected one of {RESPONSE_FIELDS}")
+        node = tree
+        for part in parts[:-1]:
+            child = node.get(part, {})
+            if child is None:
+                break  # a parent path already selects the whole value
+            node = node.setdefault(part, child)
+        else:
+            node[parts[-1]] = None
+    return tree
+
+
+def select_fields(value: Any, tree: Optional[Dict[str, Any]]) -> Any:
+    if tree is None:
+        return value
+    if isinstance(value, dict):
+        return {key: select_fields(value[key], sub) for key, sub in tree.items() if key in value}
+    if isinstance(value, list):
+        return [select_fields(item, tree) for item in value]
+    return value  # a path below a scalar: keep the scalar
+
+
+# ----------------- Encoding -----------------
+def _finite(value: Any) -> Any:
+    """NaN / +-inf -> None through dicts and lists, as orjson writes them; other values as-is."""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+
+def _default(obj: Any) -> Any:
+    if hasattr(obj, "item"):  # numpy scalars
+        return _finite(obj.item())
+    if is_dataclass(obj):
+        return _finite(asdict(obj))
+    if isinstance(obj, (set, frozenset, tuple)):
+        return _finite(list(obj))
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        _finite(obj), default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class JSONBytesResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return content if isinstance(content, bytes) else dumps(content)
+
+
+@timed("serialize")
+def encode_response(payload: Any, tree: Optional[Dict[str, Any]] = None) -> JSONBytesResponse:
+    """Select fields and encode once; the response carries the finished bytes."""
+    return JSONBytesResponse(dumps(select_fields(payload, tree)))
+
+
+if __name__ == "__main__":
+    # Old path (to_dict + pydantic validation + JSON) vs direct payloads, on a batch with many matches
+    import time
+    from src.ml_api.main import AnalyzeResponse
+
+    detection = DetectionResult(
+        is_ai_generated=True, confidence=0.8, risk_level="HIGH", perplexity_score=0.9, ast_score=0.7,
+        style_score=0.6, weighted_score=0.8, perplexity=8.5,
+        ast_features={f"feature_{i}": i * 0.5 for i in range(20)},
+        style_features={f"style_{i}": i for i in range(20)},
+        conflict_detected=False, code_length=1200, normalized_length=900, processing_time_ms=40,
+        reasoning="Low perplexity and uniform structure", recommendations=["Review manually"] * 3,
+    )
+    matches = [
+        PlagiarismMatch(f"pattern_{i}", 0.9 - i / 100, "high_similarity", "medium", ["GitHub"], 0.8)
+        for i in range(10)
+    ]
+    plagiarism = PlagiarismResult(
+        is_plagiarized=True, confidence=0.9, risk_level="HIGH", matches=matches, best_match=matches[0],
+        max_similarity_light=0.9, max_similarity_medium=0.9, max_similarity_aggressive=0.95,
+        structural_similarity=0.8, code_length=1200, normalized_hash="ab" * 16, processing_time_ms=12,
+        reasoning="Near copy of a known solution",
+    )
+    decision = DecisionResult("FLAG", "High risk", 0.85, {"ai_risk": "HIGH", "plag_risk": "HIGH"})
+    batch = 500
+
+    start = time.perf_counter()
+    old = [
+        AnalyzeResponse(
+            submission_id=str(i), user_id="u", mode="practice", ai_detection=detection.to_dict(),
+            plagiarism_detection=plagiarism.to_dict(), decision=decision_payload(decision),
+        ).model_dump(exclude_none=True)
+        for i in range(batch)
+    ]
+    old_bytes = json.dumps(old).encode("utf-8")
+    old_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    new_bytes = dumps([
+        {
+            "submission_id": str(i), "user_id": "u", "mode": "practice",
+            "ai_detection": detection_payload(detection),
+            "plagiarism_detection": plagiarism_payload(plagiarism),
+            "decision": decision_payload(decision),
+        }
+        for i in range(batch)
+    ])
+    new_ms = (time.perf_counter() - start) * 1000
+
+    print(f"encoder: {'orjson' if orjson else 'json'}")
+    print(f"old path: {old_ms:.1f} ms, {len(old_bytes)} bytes")
+    print(f"new path: {new_ms:.1f} ms, {len(new_bytes)} bytes")
+    print(f"same content: {json.loads(old_bytes) == json.loads(new_bytes)}")
@@ -0,0 +1,339 @@
+"""
+Shape-bucketed forward pass for the perplexity model.
+
+Every request used to run the model at its own (batch, sequence) shape, so
+each new length paid allocator growth and dispatch warmup and showed up as a
+p99 spike. BucketedCausalLM pads input_ids / attention_mask up to the
+smallest configured (batch, sequence) bucket, runs a forward pass compiled
+for exactly that shape (TorchScript trace or torch.compile), and slices the
+output back to the real tokens. Padding goes to the right and is masked, so
+with a causal model the real positions see the same inputs as before.
+
+Only the transformer body is compiled per bucket: it returns hidden states
+([batch, seq, hidden], about 25 MB at 8x1024 for GPT-2 small) and the LM
+head runs afterwards on the real tokens, or in chunks through the
+detector's _token_nll via hidden_states() / lm_head. Full-vocabulary
+logits of a padded bucket (1.6 GB at 8x1024) are never materialized. Models
+whose head is not separable (split_lm_head) fall back to compiling the
+logits forward.
+
+warmup() compiles and runs every bucket once; the API calls it from its
+lifespan so no request is the first at its shape. Per-bucket latency is
+recorded in model_forward_bucket_latency_seconds{bucket="<batch>x<seq>"},
+which is what to look at when moving the bucket boundaries.
+
+Enabled with MODEL_SHAPE_BUCKETS=true (see ModelLoaderConfig).
+"""
+from __future__ import annotations
+import os
+import sys
+import time
+import threading
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from dataclasses import dataclass
+
+import torch  # type: ignore
+from transformers.modeling_outputs import CausalLMOutput  # type: ignore
+
+from src.logger import logging
+from src.exception import CustomException, ErrorCode
+from src.metrics import REGISTRY
+from src.ml_core.model_loader import split_lm_head
+
+COMPILE_MODES = ("trace", "compile", "none")
+
+BUCKET_LATENCY = REGISTRY.histogram(
+    "model_forward_bucket_latency_seconds", "Forward pass latency per padded shape bucket", labelnames=("bucket",)
+)
+BUCKET_TOKENS = REGISTRY.counter(
+    "model_forward_bucket_tokens_total", "Real and padding token positions per shape bucket",
+    labelnames=("bucket", "kind"),
+)
+
+
+def _parse_ints(value: str) -> Tuple[int, ...]:
+    return tuple(sorted({int(v) for v in value.split(",") if v.strip()}))
+
+
+@dataclass
+class BucketConfig:
+    seq_buckets: Tuple[int, ...] = (64, 128, 256, 512, 1024)
+    batch_buckets: Tuple[int, ...] = (1, 2, 4, 8)  # detect_batch chunks are at most perplexity_batch_size
+    compile_mode: str = "trace"  # trace (TorchScript) / compile (torch.compile) / none (padding only)
+    warmup_rounds: int = 2  # timed forward passes per bucket after compiling it
+
+    def __post_init__(self):
+        self.validate()
+
+    @classmethod
+    def from_env(cls) -> BucketConfig:
+        return cls(
+            seq_buckets=_parse_ints(os.getenv("MODEL_SEQ_BUCKETS", "64,128,256,512,1024")),
+            batch_buckets=_parse_ints(os.getenv("MODEL_BATCH_BUCKETS", "1,2,4,8")),
+            compile_mode=os.getenv("MODEL_BUCKET_COMPILE", "trace"),
+            warmup_rounds=int(os.getenv("MODEL_BUCKET_WARMUP_ROUNDS", 2)),
+        )
+
+    def validate(self):
+        if not self.seq_buckets or not self.batch_buckets:
+            raise ValueError("Need at least one sequence and one batch bucket")
+        if min(self.seq_buckets) < 2 or min(self.batch_buckets) < 1:
+            raise ValueError("Sequence buckets must be >= 2 and batch buckets >= 1")
+        if self.compile_mode not in COMPILE_MODES:
+            raise ValueError(f"compile_mode must be one of {COMPILE_MODES}, got {self.compile_mode!r}")
+        self.seq_buckets = tuple(sorted(self.seq_buckets))
+        self.batch_buckets = tuple(sorted(self.batch_buckets))
+
+
+class _BodyForward(torch.nn.Module):
+    """Positional (input_ids, attention_mask) -> last hidden state, without KV cache; the form trace/compile want."""
+
+    def __init__(self, base_model: Any):
+        super().__init__()
+        self.base_model = base_model
+
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        return self.base_model(input_ids=input_ids, attention_mask=attention_mask, use_cache=False).last_hidden_state
+
+
+class _LogitsForward(torch.nn.Module):
+    """Same for models whose LM head cannot run separately: returns logits."""
+
+    def __init__(self, model: Any):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        return self.model(input_ids=input_ids, attention_mask=attention_mask, use_cache=False).logits
+
+
+class BucketedCausalLM:
+    """
+    Wraps a causal LM behind the same call the detector makes on a
+    transformers model: model(**inputs, labels=...) -> CausalLMOutput with
+    .logits and the shifted mean cross-entropy .loss. hidden_states() and
+    lm_head expose the body and head separately (see split_lm_head). Inputs
+    larger than the biggest bucket run eagerly on the wrapped model and are
+    counted as overflow.
+    """
+
+    def __init__(self, model: Any, config: Optional[BucketConfig] = None, pad_token_id: int = 0):
+        self.model = model
+        self.config = config or BucketConfig.from_env()
+        self.pad_token_id = pad_token_id
+        self.device = getattr(model, "device", torch.device("cpu"))
+
+        split = split_lm_head(model)
+        # None: the compiled forward returns logits rather than hidden states
+        self.lm_head: Optional[torch.nn.Module] = split[1] if split else None
+        if split is not None:
+            self._eager: Callable = split[0]
+            self._module = _BodyForward(model.base_model).eval() if isinstance(model, torch.nn.Module) else None
+        else:
+            self._eager = lambda input_ids, attention_mask: model(
+                input_ids=input_ids, attention_mask=attention_mask, use_cache=False
+            ).logits
+            self._module = _LogitsForward(model).eval() if isinstance(model, torch.nn.Module) else None
+
+        compile_mode = self.config.compile_mode
+        if compile_mode != "none" and self._module is None:
+            logging.warning(f"{type(model).__name__} is not a torch module, shape buckets will only pad")
+            compile_mode = "none"
+        self.compile_mode = compile_mode
+
+        self._compiled: Dict[Tuple[int, int], Callable] = {}
+        self._compile_lock = threading.Lock()
+        self._shared_compiled: Optional[Callable] = None
+        # Warmup results per bucket, read by bucket_stats()
+        self.compile_ms: Dict[str, float] = {}
+        self.warmup_ms: Dict[str, float] = {}
+        self.overflow = 0
+
+    @property
+    def buckets(self) -> List[Tuple[int, int]]:
+        return [(b, s) for b in self.config.batch_buckets for s in self.config.seq_buckets]
+
+    def bucket_for(self, batch: int, length: int) -> Optional[Tuple[int, int]]:
+        """Smallest (batch, seq) bucket that fits, or None when the input is larger than every bucket."""
+        b = bisect_left(self.config.batch_buckets, batch)
+        s = bisect_left(self.config.seq_buckets, length)
+        if b == len(self.config.batch_buckets) or s == len(self.config.seq_buckets):
+            return None
+        return self.config.batch_buckets[b], self.config.seq_buckets[s]
+
+    # ----------------- Compilation -----------------
+    def _example(self, bucket: Tuple[int, int]) -> Tuple[torch.Tensor, torch.Tensor]:
+        batch, length = bucket
+        input_ids = torch.full((batch, length), self.pad_token_id, dtype=torch.long, device=self.device)
+        attention_mask = torch.ones_like(input_ids)
+        attention_mask[:, length // 2:] = 0  # trace with padding present, as real requests have it
+        return input_ids, attention_mask
+
+    def _compile(self, bucket: Tuple[int, int]) -> Callable:
+        if self.compile_mode == "none":
+            return self._eager
+
+        if self.compile_mode == "compile":
+            # One compiled callable; dynamic=False gives it one graph per bucket shape
+            if self._shared_compiled is None:
+                # Not `import torch._dynamo`: that would make torch a local name for all of _compile
+                from torch import _dynamo  # type: ignore
+                _dynamo.config.cache_size_limit = max(_dynamo.config.cache_size_limit, len(self.buckets) + 1)
+                self._shared_compiled = torch.compile(self._module, dynamic=False)
+            return self._shared_compiled
+
+        with torch.no_grad():
+            return torch.jit.trace(self._module, self._example(bucket), check_trace=False)
+
+    def _forward_fn(self, bucket: Tuple[int, int]) -> Callable:
+        fn = self._compiled.get(bucket)
+        if fn is None:
+            with self._compile_lock:
+                fn = self._compiled.get(bucket)
+                if fn is None:
+                    start = time.perf_counter()
+                    fn = self._compile(bucket)
+                    self.compile_ms[_label(bucket)] = round((time.perf_counter() - start) * 1000, 1)
+                    self._compiled[bucket] = fn
+        return fn
+
+    def warmup(self) -> Dict[str, Dict[str, float]]:
+        """
+        Compile every bucket and run it warmup_rounds times. Returns (and
+        logs) per bucket the compile time, the first-call time (which for
+        torch.compile includes the real compilation) and the last warm
+        forward time. Only the body runs, so this allocates hidden states,
+        not bucket-sized logits.
+        """
+        try:
+            start_time = time.time()
+            report: Dict[str, Dict[str, float]] = {}
+            for bucket in self.buckets:
+                label = _label(bucket)
+                fn = self._forward_fn(bucket)
+                timings = []
+                with torch.no_grad():
+                    for _ in range(max(1, self.config.warmup_rounds) + 1):
+                        call_start = time.perf_counter()
+                        fn(*self._example(bucket))
+                        timings.append((time.perf_counter() - call_start) * 1000)
+                self.warmup_ms[label] = round(timings[-1], 2)
+                report[label] = {
+                    "compile_ms": self.compile_ms.get(label, 0.0),
+                    "first_call_ms": round(timings[0], 2),
+                    "warm_ms": round(timings[-1], 2),
+                }
+
+            logging.info(
+                "Shape buckets warmed up",
+                extra={
+                    "compile_mode": self.compile_mode,
+                    "buckets": report,
+                    "warmup_time_seconds": round(time.time() - start_time, 2),
+                }
+            )
+            return report
+
+        except Exception as e:
+            logging.error(f"Shape bucket warmup failed: {e}")
+            raise CustomException(str(e), code=ErrorCode.MODEL_LOAD_ERROR)
+
+    # ----------------- Inference -----------------
+    def _run(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        """Compiled forward at the input's bucket, sliced back: hidden states, or logits without a split head."""
+        batch, length = input_ids.shape
+        bucket = self.bucket_for(batch, length)
+        if bucket is None:
+            self.overflow += 1
+            return self._eager(input_ids, attention_mask)
+
+        padded_ids = input_ids.new_full(bucket, self.pad_token_id)
+        padded_ids[:batch, :length] = input_ids
+        # Filler rows attend to their own pad tokens so no row is fully masked
+        padded_mask = attention_mask.new_ones(bucket)
+        padded_mask[:batch, length:] = 0
+        padded_mask[:batch, :length] = attention_mask
+
+        fn = self._forward_fn(bucket)
+        label = _label(bucket)
+        start = time.perf_counter()
+        output = fn(padded_ids, padded_mask)[:batch, :length]
+        BUCKET_LATENCY.labels(label).observe(time.perf_counter() - start)
+        real = int(attention_mask.sum().item())
+        BUCKET_TOKENS.labels(label, "real").inc(real)
+        BUCKET_TOKENS.labels(label, "padding").inc(bucket[0] * bucket[1] - real)
+        return output
+
+    def hidden_states(self, input_ids: torch.Tensor, attention_mask: Optional[torch.Tensor] = None) -> torch.Tensor:
+        """Last hidden state of the real tokens; apply lm_head to get logits."""
+        if self.lm_head is None:
+            raise RuntimeError(f"{type(self.model).__name__} has no separable LM head")
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        return self._run(input_ids, attention_mask)
+
+    def __call__(
+        self,
+        input_ids: torch.Tensor,
+        attention_mask: Optional[torch.Tensor] = None,
+        labels: Optional[torch.Tensor] = None,
+        **kwargs
+    ) -> CausalLMOutput:
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        output = self._run(input_ids, attention_mask)
+        logits = self.lm_head(output) if self.lm_head is not None else output
+
+        loss = None
+        if labels is not None:
+            # Same as transformers' causal LM loss: predict token t+1 from t, mean over non-ignored labels
+            loss = torch.nn.functional.cross_entropy(
+                logits[:, :-1, :].reshape(-1, logits.shape[-1]).float(),
+                labels[:, 1:].reshape(-1).to(logits.device),
+                ignore_index=-100,
+            )
+        return CausalLMOutput(loss=loss, logits=logits)
+
+    forward = __call__
+
+    def eval(self) -> BucketedCausalLM:
+        return self
+
+    def to(self, *args, **kwargs) -> BucketedCausalLM:
+        return self
+
+    def bucket_stats(self) -> Dict[str, Any]:
+        """Collector for /metrics: {metric: {bucket: value}}, plus the overflow count."""
+        return {
+            "compile_ms": dict(self.compile_ms),
+            "warmup_ms": dict(self.warmup_ms),
+            "overflow": self.overflow,
+        }
+
+
+def _label(bucket: Tuple[int, int]) -> str:
+    return f"{bucket[0]}x{bucket[1]}"
+
+
+if __name__ == "__main__":
+    # Warm every bucket on the local model and compare one loss with the eager path
+    try:
+        from src.ml_core.model_loader import ModelLoaderConfig, load_model_and_tokenizer
+
+        loader_config = ModelLoaderConfig.from_env()
+        loader_config.shape_buckets = False
+        model, tokenizer, device = load_model_and_tokenizer(loader_config)
+        bucketed = BucketedCausalLM(model, BucketConfig.from_env(), pad_token_id=tokenizer.eos_token_id)
+        for label, timings in bucketed.warmup().items():
+            print(f"{label:>10}  {timings}")
+
+        inputs = tokenizer("def add(a, b):\n    return a + b\n", return_tensors="pt").to(device)
+        with torch.no_grad():
+            eager_loss = model(**inputs, labels=inputs["input_ids"]).loss.item()
+            bucketed_loss = bucketed(**inputs, labels=inputs["input_ids"]).loss.item()
+        print(f"eager loss: {eager_loss:.6f}  bucketed loss: {bucketed_loss:.6f}")
+
+    except CustomException as e:
+        logging.error(f"Example failed: {e}")
+        raise CustomException(e, sys)
@@ -5,6 +5,7 @@ import re
 import time
 import math
 import os
+import random
 from typing import Optional, List, Tuple, Dict, Any
 from dataclasses import dataclass, field, asdict
 
@@ -12,10 +13,18 @@ import torch
 import numpy as np
 from transformers import PreTrainedModel, PreTrainedTokenizerBase
 
-from src.logger import logging
-from src.exception import CustomException
+from src.logger import logging, get_logger
+from src.exception import CustomException, ErrorCode
+from src.metrics import timed, BATCH_SIZE
+from src.tracing import span
 from src.components.normalization import Normalizer
-from src.ml_core.model_loader import load_model_and_tokenizer, ModelLoaderConfig
+from src.ml_core.model_loader import load_model_and_tokenizer, ModelLoaderConfig, split_lm_head
+
+logger = get_logger(__name__)
+
+# decided: AST + style fixed the risk level; skipped: model not run;
+# verified / mismatches: sampled decided items that ran anyway, and how many disagreed
+CASCADE_COUNTERS = ("decided", "skipped", "verified", "mismatches")
 
 
 @dataclass
@@ -29,12 +38,12 @@ class DetectionResult:
     risk_level: str 
     
     # Score breakdown
-    perplexity_score: float
+    perplexity_score: Optional[float]  # None when the cascade skipped the model
     ast_score: float
     style_score: float
     weighted_score: float  # Final combined score
     
-    perplexity: float
+    perplexity: Optional[float]
     ast_features: Dict[str, Any]
     style_features: Dict[str, Any]
     
@@ -45,11 +54,26 @@ class DetectionResult:
     
     reasoning: str
     recommendations: List[str] = field(default_factory=list)
+    perplexity_skipped: bool = False  # risk band fixed by AST + style alone
+    # With perplexity_skipped: (lowest, highest) confidence any perplexity could give;
+    # confidence / weighted_score are then its midpoint, derived rather than measured
+    confidence_range: Optional[Tuple[float, float]] = None
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary for serialization."""
         return asdict(self)
 
+
+@dataclass
+class CheapSignals:
+    """AST and style signals, and what they leave for the perplexity pass to decide."""
+    ast_features: Dict[str, Any]
+    ast_score: float
+    style_features: Dict[str, Any]
+    style_score: float
+    fixed_band: Optional[str] = None  # risk level every perplexity score leads to
+    run_model: bool = True  # False only when fixed_band is set and not sampled for verification
+
 @dataclass
 class AIDetectorConfig:
     """Configuration for AI code detection."""
@@ -84,11 +108,18 @@ class AIDetectorConfig:
     # Processing limits
     max_code_length: int = 50000
     max_tokens_for_perplexity: int = 1024
+    perplexity_batch_size: int = 8  # sequences per padded forward pass in detect_batch
+    loss_chunk_size: int = 128  # positions per LM-head + cross-entropy chunk; 0 = full-vocabulary logits at once
     
     # Performance
     enable_caching: bool = True
     cache_size: int = 500
     
+    # Cascade: AST + style first, perplexity only when it can still change the risk level
+    enable_cascade: bool = False
+    cascade_verify_rate: float = 0.0  # share of skippable items run in full anyway and compared
+    cascade_seed: Optional[int] = None  # seeds the verification sampling; None = OS entropy
+    
     def __post_init__(self):
         """Validate config after initialization."""
         self.validate()
@@ -99,6 +130,10 @@ class AIDetectorConfig:
         return cls(
             perplexity_ai_threshold=float(os.getenv("PERPLEXITY_AI_THRESHOLD", 10.0)),
             high_confidence_threshold=float(os.getenv("HIGH_CONFIDENCE_THRESHOLD", 0.65)),
+            enable_cascade=os.getenv("AI_DETECTOR_CASCADE", "false").lower() in ("1", "true", "yes"),
+            cascade_verify_rate=float(os.getenv("AI_DETECTOR_CASCADE_VERIFY_RATE", 0.0)),
+            cascade_seed=int(os.environ["AI_DETECTOR_CASCADE_SEED"]) if os.getenv("AI_DETECTOR_CASCADE_SEED") else None,
+            loss_chunk_size=int(os.getenv("PERPLEXITY_LOSS_CHUNK", 128)),
         )
     
     def validate(self):
@@ -133,10 +168,14 @@ class AICodeDetector:
         self.model = model
         self.tokenizer = tokenizer
         self.device = device
+        # (body, LM head) for the chunked loss; None when the model does not expose them
+        self._split = split_lm_head(model)
         
         # Set pad token if not set
         if self.tokenizer.pad_token is None:
             self.tokenizer.pad_token = self.tokenizer.eos_token
+        # Batched perplexity relies on real tokens coming first
+        self.tokenizer.padding_side = "right"
         
         # Normalizer
         self.normalizer = normalizer or Normalizer()
@@ -144,6 +183,9 @@ class AICodeDetector:
         # Metrics
         self.total_detections = 0
         self.total_processing_time_ms = 0
+        self.cascade_counts = dict.fromkeys(CASCADE_COUNTERS, 0)
+        # Own generator so verification sampling is reproducible under cascade_seed
+        self._cascade_rng = random.Random(self.config.cascade_seed)
         
         logging.info(
             "AI Code Detector initialized",
@@ -154,6 +196,7 @@ class AICodeDetector:
             }
         )
     
+    @timed("perplexity")
     def _calculate_perplexity(self, code: str) -> Tuple[float, float]:
 
         try:
@@ -162,50 +205,149 @@ class AICodeDetector:
                 logging.warning("Empty code provided for perplexity calculation")
                 return 50.0, 0.5  # Neutral
             
-            inputs = self.tokenizer(
-                code,
-                return_tensors="pt",
-                truncation=True,
-                max_length=self.config.max_tokens_for_perplexity,
-                padding=False,
-                add_special_tokens=True
-            ).to(self.device)
+            with span("tokenize"):
+                inputs = self.tokenizer(
+                    code,
+                    return_tensors="pt",
+                    truncation=True,
+                    max_length=self.config.max_tokens_for_perplexity,
+                    padding=False,
+                    add_special_tokens=True
+                ).to(self.device)
             
             # Check token count
             if inputs["input_ids"].shape[1] == 0:
                 logging.warning("Tokenization produced empty sequence")
                 return 50.0, 0.5
             
-            # Forward pass with proper labels
-            with torch.no_grad():
-                outputs = self.model(**inputs, labels=inputs["input_ids"])
-                loss = outputs.loss
+            # Forward pass; mean next-token cross-entropy, as the model's built-in loss
+            with span("forward"), torch.no_grad():
+                loss = self._token_nll(inputs).mean()
             
             # Perplexity = exp(loss)
-            perplexity = torch.exp(loss).item()
-            
-            # Clamp extreme values
-            perplexity = max(1.0, min(perplexity, 500.0))
-            
-            # Normalize to 0-1 score (lower perplexity = higher score)
-            if perplexity < self.config.perplexity_ai_threshold:
-                normalized_score = 1.0  # Very AI-like
-            elif perplexity > self.config.perplexity_human_threshold:
-                normalized_score = 0.0  # Very human-like
-            else:
-                # Linear interpolation between thresholds
-                range_size = self.config.perplexity_human_threshold - self.config.perplexity_ai_threshold
-                normalized_score = 1.0 - (perplexity - self.config.perplexity_ai_threshold) / range_size
-            
-            normalized_score = max(0.0, min(1.0, normalized_score))
-            
-            return perplexity, normalized_score
+            return self._score_perplexity(torch.exp(loss).item())
         
         except Exception as e:
             logging.warning(f"Perplexity calculation failed: {e}")
             # Return neutral values on failure
             return 50.0, 0.5
+
+    def _token_nll(self, inputs) -> torch.Tensor:
+        """
+        Cross-entropy of every next token, [batch, seq - 1], computed only
+        where the next token is real (attention_mask 1); padded positions are
+        0. With loss_chunk_size set and a model whose body and LM head are
+        separable (split_lm_head: plain transformers models, and the ONNX and
+        shape bucket wrappers, which return hidden states), the real positions
+        of the whole batch are flattened and the head runs over that many at
+        a time, so float32 logits exist for one chunk rather than the whole
+        [batch, seq, vocab].
+        """
+        labels = inputs["input_ids"][:, 1:]
+        attention_mask = inputs.get("attention_mask")
+        valid = (
+            attention_mask[:, 1:].bool() if attention_mask is not None
+            else torch.ones_like(labels, dtype=torch.bool)
+        )
+        token_nll = torch.zeros(labels.shape, dtype=torch.float32, device=labels.device)
+        chunk = self.config.loss_chunk_size
+        if chunk <= 0 or self._split is None:
+            logits = self.model(**inputs).logits[:, :-1][valid]
+            token_nll[valid] = torch.nn.functional.cross_entropy(logits.float(), labels[valid], reduction="none")
+            return token_nll
+
+        body, head = self._split
+        hidden = body(inputs["input_ids"], attention_mask)[:, :-1][valid]
+        targets = labels[valid]
+        nll = torch.empty(targets.shape, dtype=torch.float32, device=hidden.device)
+        for start in range(0, targets.shape[0], chunk):
+            logits = head(hidden[start:start + chunk]).float()
+            nll[start:start + chunk] = torch.nn.functional.cross_entropy(
+                logits, targets[start:start + chunk], reduction="none"
+            )
+        token_nll[valid] = nll.to(token_nll.device)
+        return token_nll
+
+    def _score_perplexity(self, perplexity: float) -> Tuple[float, float]:
+        """Clamp a raw perplexity and map it to a 0-1 AI score."""
+        # Clamp extreme values
+        perplexity = max(1.0, min(perplexity, 500.0))
+        
+        # Normalize to 0-1 score (lower perplexity = higher score)
+        if perplexity < self.config.perplexity_ai_threshold:
+            normalized_score = 1.0  # Very AI-like
+        elif perplexity > self.config.perplexity_human_threshold:
+            normalized_score = 0.0  # Very human-like
+        else:
+            # Linear interpolation between thresholds
+            range_size = self.config.perplexity_human_threshold - self.config.perplexity_ai_threshold
+            normalized_score = 1.0 - (perplexity - self.config.perplexity_ai_threshold) / range_size
+        
+        normalized_score = max(0.0, min(1.0, normalized_score))
+        
+        return perplexity, normalized_score
+
+    @timed("perplexity_batch")
+    def _calculate_perplexity_batch(self, codes: List[str]) -> List[Tuple[float, float]]:
+        """
+        Perplexity for several snippets with one padded forward pass per
+        chunk of perplexity_batch_size. Snippets are chunked in order of token
+        length so each chunk pads to a similar length (results still come
+        back in input order). Per-sequence loss is the masked mean token
+        cross-entropy, i.e. the same value the single-item path gets from the
+        model's built-in loss.
+        """
+        results: List[Tuple[float, float]] = [(50.0, 0.5)] * len(codes)
+        todo = [i for i, code in enumerate(codes) if code and code.strip()]
+        if not todo:
+            return results
+        step = max(1, self.config.perplexity_batch_size)
+
+        try:
+            with span("tokenize"):
+                encoded = self.tokenizer(
+                    [codes[i] for i in todo],
+                    truncation=True,
+                    max_length=self.config.max_tokens_for_perplexity,
+                    add_special_tokens=True
+                )
+        except Exception as e:
+            logging.warning(f"Batched tokenization failed, falling back to per-item: {e}")
+            for i in todo:
+                results[i] = self._calculate_perplexity(codes[i])
+            return results
+        token_ids = dict(zip(todo, encoded["input_ids"]))
+        todo.sort(key=lambda i: len(token_ids[i]))
+
+        for start in range(0, len(todo), step):
+            chunk = todo[start:start + step]
+            try:
+                inputs = self.tokenizer.pad(
+                    {"input_ids": [token_ids[i] for i in chunk]}, padding=True, return_tensors="pt"
+                ).to(self.device)
+
+                with span("forward"), torch.no_grad():
+                    token_nll = self._token_nll(inputs)
+
+                mask = inputs["attention_mask"][:, 1:].to(torch.float32)
+                token_counts = mask.sum(dim=1)
+                losses = (token_nll * mask).sum(dim=1) / token_counts.clamp(min=1.0)
+
+                for row, i in enumerate(chunk):
+                    if token_counts[row].item() == 0:
+                        # Single-token input: keep the single-item behaviour
+                        results[i] = self._calculate_perplexity(codes[i])
+                    else:
+                        results[i] = self._score_perplexity(math.exp(losses[row].item()))
+
+            except Exception as e:
+                logging.warning(f"Batched perplexity failed, falling back to per-item: {e}")
+                for i in chunk:
+                    results[i] = self._calculate_perplexity(codes[i])
+
+        return results
    
+    @timed("ast")
     def _extract_ast_features(self, code: str) -> Tuple[Dict[str, Any], float]:
 
         try:
@@ -296,6 +438,7 @@ class AICodeDetector:
             logging.warning(f"AST feature extraction failed: {e}")
             return {"error": str(e)}, 0.5
     
+    @timed("style")
     def _analyze_style_patterns(self, code: str) -> Tuple[Dict[str, Any], float]:
 
         try:
@@ -371,7 +514,62 @@ class AICodeDetector:
             logging.warning(f"Style analysis failed: {e}")
             return {"error": str(e)}, 0.5
   
-    def detect(self, code: str) -> DetectionResult:
+    def _weighted_score(self, perplexity_score: float, ast_score: float, style_score: float) -> float:
+        return (
+            self.config.weight_perplexity * perplexity_score +
+            self.config.weight_ast * ast_score +
+            self.config.weight_style * style_score
+        )
+    
+    def _risk_band(self, weighted_score: float) -> str:
+        if weighted_score >= self.config.high_confidence_threshold:
+            return "HIGH"
+        if weighted_score >= self.config.medium_confidence_threshold:
+            return "MEDIUM"
+        if weighted_score >= self.config.low_confidence_threshold:
+            return "LOW"
+        return "CLEAN"
+    
+    def _fixed_band(self, ast_score: float, style_score: float) -> Optional[str]:
+        """
+        Risk level every perplexity score would lead to, or None. weighted_score
+        rises with perplexity_score, which lies in [0, 1], so it stays within
+        [w(0), w(1)]; when both ends fall in one band the model cannot change
+        the verdict. The conflict flag depends on perplexity too, so nothing is
+        fixed while a conflict is still possible.
+        """
+        if ast_score < self.config.conflict_ast_threshold:
+            return None
+        low = self._risk_band(self._weighted_score(0.0, ast_score, style_score))
+        high = self._risk_band(self._weighted_score(1.0, ast_score, style_score))
+        return low if low == high else None
+    
+    def _cheap_signals(self, code: str) -> CheapSignals:
+        """AST and style scores, plus the cascade's decision on the perplexity pass."""
+        ast_features, ast_score = self._extract_ast_features(code)
+        style_features, style_score = self._analyze_style_patterns(code)
+        signals = CheapSignals(ast_features, ast_score, style_features, style_score)
+        if self.config.enable_cascade:
+            signals.fixed_band = self._fixed_band(ast_score, style_score)
+            if signals.fixed_band is not None:
+                self.cascade_counts["decided"] += 1
+                signals.run_model = self._cascade_rng.random() < self.config.cascade_verify_rate
+        return signals
+    
+    def detect(
+        self,
+        code: str,
+        normalized_code: Optional[str] = None,
+        perplexity_result: Optional[Tuple[float, float]] = None,
+        language: str = "python",
+        signals: Optional[CheapSignals] = None
+    ) -> DetectionResult:
+        """
+        normalized_code / perplexity_result / signals can be supplied when they
+        were already computed upstream (detect_batch, offline pipeline). With
+        enable_cascade the perplexity pass is skipped when AST and style
+        already fix the risk level (see _fixed_band).
+        """
 
         start_time = time.time()
         original_length = len(code)
@@ -389,44 +587,60 @@ class AICodeDetector:
                 code = code[:self.config.max_code_length]
             
             # Normalize code (light)
-            normalized_code = self.normalizer.normalize(code, "light")
+            if normalized_code is None:
+                normalized_code = self.normalizer.normalize(code, "light", language)
             normalized_length = len(normalized_code)
             
-            # Calculate all signals
-            perplexity, perplexity_score = self._calculate_perplexity(normalized_code)
-            ast_features, ast_score = self._extract_ast_features(code)
-            style_features, style_score = self._analyze_style_patterns(code)
-            
-            # Weighted combined score
-            weighted_score = (
-                self.config.weight_perplexity * perplexity_score +
-                self.config.weight_ast * ast_score +
-                self.config.weight_style * style_score
-            )
+            # Cheap signals first; they decide whether perplexity is needed
+            signals = signals or self._cheap_signals(code)
+            ast_features, ast_score = signals.ast_features, signals.ast_score
+            style_features, style_score = signals.style_features, signals.style_score
+            
+            if perplexity_result is None and signals.run_model:
+                perplexity_result = self._calculate_perplexity(normalized_code)
+            perplexity_skipped = perplexity_result is None
+            
+            confidence_range = None
+            if perplexity_skipped:
+                # Any perplexity gives the same risk level; report the reachable range and its midpoint
+                self.cascade_counts["skipped"] += 1
+                perplexity, perplexity_score = None, None
+                low = self._weighted_score(0.0, ast_score, style_score)
+                high = self._weighted_score(1.0, ast_score, style_score)
+                confidence_range = (round(low, 3), round(high, 3))
+                weighted_score = (low + high) / 2
+            else:
+                perplexity, perplexity_score = perplexity_result
+                # Weighted combined score
+                weighted_score = self._weighted_score(perplexity_score, ast_score, style_score)
             
             # Determine risk level and verdict
-            if weighted_score >= self.config.high_confidence_threshold:
-                risk_level = "HIGH"
-                is_ai_generated = True
-            elif weighted_score >= self.config.medium_confidence_threshold:
-                risk_level = "MEDIUM"
-                is_ai_generated = True
-            elif weighted_score >= self.config.low_confidence_threshold:
-                risk_level = "LOW"
-                is_ai_generated = False
-            else:
-                risk_level = "CLEAN"
-                is_ai_generated = False
+            risk_level = signals.fixed_band if perplexity_skipped else self._risk_band(weighted_score)
+            is_ai_generated = risk_level in ("HIGH", "MEDIUM")
+            
+            if signals.fixed_band is not None and not perplexity_skipped:
+                self.cascade_counts["verified"] += 1
+                if risk_level != signals.fixed_band:
+                    self.cascade_counts["mismatches"] += 1
+                    logging.error(
+                        "Cascade verification mismatch",
+                        extra={"fixed_band": signals.fixed_band, "risk_level": risk_level}
+                    )
             
             # Conflict detection
-            conflict_detected = (
+            conflict_detected = not perplexity_skipped and (
                 perplexity < self.config.conflict_perplexity_threshold and
                 ast_score < self.config.conflict_ast_threshold
             )
             
             # Generate reasoning
             reasoning_parts = []
-            if perplexity < self.config.perplexity_ai_threshold:
+            if perplexity_skipped:
+                reasoning_parts.append(
+                    f"Perplexity not computed: structure and style alone give {risk_level} risk "
+                    f"(confidence between {confidence_range[0]} and {confidence_range[1]})"
+                )
+            elif perplexity < self.config.perplexity_ai_threshold:
                 reasoning_parts.append(f"Very low perplexity ({perplexity:.1f}) indicates AI-like patterns")
             elif perplexity < self.config.perplexity_human_threshold:
                 reasoning_parts.append(f"Moderate perplexity ({perplexity:.1f}) suggests some AI characteristics")
@@ -467,11 +681,11 @@ class AICodeDetector:
                 is_ai_generated=is_ai_generated,
                 confidence=weighted_score,
                 risk_level=risk_level,
-                perplexity_score=round(perplexity_score, 3),
+                perplexity_score=None if perplexity_skipped else round(perplexity_score, 3),
                 ast_score=round(ast_score, 3),
                 style_score=round(style_score, 3),
                 weighted_score=round(weighted_score, 3),
-                perplexity=round(perplexity, 2),
+                perplexity=None if perplexity_skipped else round(perplexity, 2),
                 ast_features=ast_features,
                 style_features=style_features,
                 conflict_detected=conflict_detected,
@@ -479,17 +693,20 @@ class AICodeDetector:
                 normalized_length=normalized_length,
                 processing_time_ms=processing_time_ms,
                 reasoning=reasoning,
-                recommendations=recommendations
+                recommendations=recommendations,
+                perplexity_skipped=perplexity_skipped,
+                confidence_range=confidence_range,
             )
             
             # Log result
-            logging.info(
+            logger.info(
                 "AI detection complete",
                 extra={
                     "is_ai": is_ai_generated,
                     "confidence": round(weighted_score, 3),
                     "risk_level": risk_level,
-                    "perplexity": round(perplexity, 2),
+                    "perplexity": None if perplexity_skipped else round(perplexity, 2),
+                    "perplexity_skipped": perplexity_skipped,
                     "processing_time_ms": processing_time_ms,
                 }
             )
@@ -498,18 +715,55 @@ class AICodeDetector:
         
         except ValueError as e:
             logging.error(f"Validation error in AI detection: {e}")
-            raise CustomException(f"AI_DETECTION_VALIDATION_ERROR: {str(e)}", sys)
+            raise CustomException(str(e), code=ErrorCode.AI_DETECTION_VALIDATION_ERROR)
         
         except Exception as e:
             logging.error(f"AI detection failed: {e}")
-            raise CustomException(f"AI_DETECTION_ERROR: {str(e)}", sys)
+            raise CustomException(str(e), code=ErrorCode.AI_DETECTION_ERROR)
    
-    def detect_batch(self, codes: List[str]) -> List[Optional[DetectionResult]]:
+    def detect_batch(
+        self,
+        codes: List[str],
+        normalized_codes: Optional[List[Optional[str]]] = None
+    ) -> List[Optional[DetectionResult]]:
+        """
+        Detect several snippets, running the perplexity model on padded
+        batches instead of one forward pass per snippet. Failed items are
+        returned as None.
+        """
+        BATCH_SIZE.labels("ai_detector").observe(len(codes))
+        normalized: List[Optional[str]] = list(normalized_codes) if normalized_codes else [None] * len(codes)
+        for idx, code in enumerate(codes):
+            if normalized[idx] is not None:
+                continue
+            try:
+                if code and isinstance(code, str) and code.strip():
+                    normalized[idx] = self.normalizer.normalize(code[:self.config.max_code_length], "light")
+            except Exception as e:
+                logging.warning(f"Batch normalization failed at index {idx}: {e}")
+
+        # Cascade: only items whose risk level is still open go to the model
+        signals: List[Optional[CheapSignals]] = [None] * len(codes)
+        if self.config.enable_cascade:
+            for idx, norm in enumerate(normalized):
+                if norm is not None:
+                    signals[idx] = self._cheap_signals(codes[idx][:self.config.max_code_length])
+
+        live = [
+            idx for idx, norm in enumerate(normalized)
+            if norm is not None and (signals[idx] is None or signals[idx].run_model)
+        ]
+        perplexities = dict(zip(live, self._calculate_perplexity_batch([normalized[idx] for idx in live])))
 
         results = []
         for idx, code in enumerate(codes):
             try:
-                result = self.detect(code)
+                result = self.detect(
+                    code,
+                    normalized_code=normalized[idx],
+                    perplexity_result=perplexities.get(idx),
+                    signals=signals[idx]
+                )
                 results.append(result)
             except Exception as e:
                 logging.warning(f"Batch detection failed at index {idx}: {e}")
@@ -528,12 +782,14 @@ class AICodeDetector:
             "total_detections": self.total_detections,
             "total_processing_time_ms": self.total_processing_time_ms,
             "avg_processing_time_ms": avg_time,
+            **{f"cascade_{name}": n for name, n in self.cascade_counts.items()},
         }
     
     def reset_metrics(self):
         """Reset metrics counters."""
         self.total_detections = 0
         self.total_processing_time_ms = 0
+        self.cascade_counts = dict.fromkeys(CASCADE_COUNTERS, 0)
 
 
 if __name__ == "__main__":
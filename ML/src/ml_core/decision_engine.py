@@ -5,6 +5,7 @@ from dataclasses import dataclass, field
 
 from src.logger import logging
 from src.exception import CustomException
+from src.metrics import timed
 from src.ml_core.code_detector import DetectionResult
 from src.ml_core.plagiarism_detector import PlagiarismResult
 
@@ -66,6 +67,7 @@ class DecisionEngine:
         self.config.validate()
         logging.info(f"DecisionEngine initialized with mode: {self.config.mode}")
 
+    @timed("decision")
     def decide(
         self,
         ai_result: Optional[DetectionResult],
@@ -127,6 +129,8 @@ class DecisionEngine:
             "plag_confidence": plag_conf,
             "plag_risk": plag_risk,
             "ai_verdict": getattr(ai_result, 'risk_level', None) if ai_result else None,
+            # Set when the AI confidence is the midpoint of this range, not a measured value
+            "ai_confidence_range": getattr(ai_result, 'confidence_range', None) if ai_result else None,
             "plag_verdict": getattr(plag_result, 'risk_level', None) if plag_result else None,
         }
 
@@ -0,0 +1,408 @@
+"""
+AI detection on K model replicas, each pinned to its own cores.
+
+With one model singleton, every uvicorn worker thread runs torch with its
+full intra-op thread pool, so N concurrent requests start N x cores threads
+and the threads fight over the cores. InferenceExecutor starts K replica
+processes. Each replica is pinned (sched_setaffinity) to a disjoint group
+of cores, sets torch to that many intra-op threads, loads its own model,
+and runs one detection at a time. Requests go to the replica with the
+fewest calls in flight.
+
+K trades latency for throughput: one replica with every core gives the
+lowest single-request latency; one replica per core gives the most
+requests per second. Every replica holds a full copy of the model.
+
+Stage latencies and trace spans are recorded inside the replicas, so they
+do not show up in the API process's /metrics or X-Debug-Trace output. The
+executor reports per-replica dispatch counts and the summed detector
+totals instead.
+"""
+from __future__ import annotations
+import os
+import math
+import time
+import itertools
+import threading
+import multiprocessing as mp
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.logger import logging, get_logger
+from src.exception import CustomException, ErrorCode
+from src.ml_core.code_detector import AIDetectorConfig, DetectionResult
+from src.ml_core.model_loader import ModelLoaderConfig
+
+logger = get_logger(__name__)
+
+# 1 = in-process detector; the API starts InferenceExecutor only above that
+DEFAULT_NUM_REPLICAS = int(os.getenv("INFERENCE_REPLICAS", 1))
+DEFAULT_REPLICA_TIMEOUT_S = float(os.getenv("INFERENCE_REPLICA_TIMEOUT_S", 30.0))
+DEFAULT_REPLICA_START_TIMEOUT_S = float(os.getenv("INFERENCE_REPLICA_START_TIMEOUT_S", 300.0))
+
+
+def available_cores() -> List[int]:
+    """Cores this process may run on (the affinity mask where the OS has one)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def core_groups(num_replicas: int, cores: Optional[List[int]] = None) -> List[List[int]]:
+    """
+    Split the cores into num_replicas contiguous, disjoint groups (sizes
+    differ by at most one). With more replicas than cores, replicas share
+    single cores round-robin.
+    """
+    cores = cores or available_cores()
+    if num_replicas <= len(cores):
+        size, extra = divmod(len(cores), num_replicas)
+        groups, start = [], 0
+        for i in range(num_replicas):
+            end = start + size + (1 if i < extra else 0)
+            groups.append(cores[start:end])
+            start = end
+        return groups
+    return [[cores[i % len(cores)]] for i in range(num_replicas)]
+
+
+# ----------------- Replica process -----------------
+def _replica_main(
+    conn,
+    replica_id: int,
+    cores: List[int],
+    threads: int,
+    detector_config: AIDetectorConfig,
+    loader_config: Optional[ModelLoaderConfig],
+    model_factory: Optional[Callable[[], Tuple[Any, Any, Any]]],
+):
+    """Pin, load a model and serve detections until "stop" or the executor goes away."""
+    try:
+        # Before the first parallel region, so the intra-op pool is created on these cores
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cores)
+        import torch  # type: ignore
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+
+        from src.ml_core.code_detector import AICodeDetector
+        from src.ml_core.model_loader import load_model_and_tokenizer
+
+        if model_factory is not None:
+            model, tokenizer, device = model_factory()
+        else:
+            model, tokenizer, device = load_model_and_tokenizer(loader_config)
+        if hasattr(model, "warmup"):
+            model.warmup()  # shape buckets: compile on this replica's cores before serving
+        detector = AICodeDetector(config=detector_config, model=model, tokenizer=tokenizer, device=device)
+        conn.send((None, True, {"pid": os.getpid(), "cores": cores, "threads": threads}))
+
+    except Exception as e:
+        conn.send((None, False, (ErrorCode.MODEL_LOAD_ERROR.value, f"replica {replica_id}: {e}")))
+        conn.close()
+        return
+
+    ops = {
+        "detect": lambda code, language: detector.detect(code, language=language),
+        "detect_batch": detector.detect_batch,
+        "metrics": detector.get_metrics,
+        "reset_metrics": detector.reset_metrics,
+    }
+    while True:
+        try:
+            request_id, op, args = conn.recv()
+        except (EOFError, OSError):
+            break
+        if op == "stop":
+            break
+        try:
+            conn.send((request_id, True, ops[op](*args)))
+        except CustomException as e:
+            conn.send((request_id, False, (e.code.value, e.detail)))
+        except Exception as e:
+            conn.send((request_id, False, (ErrorCode.AI_DETECTION_ERROR.value, f"replica {replica_id}: {e}")))
+    conn.close()
+
+
+class _ReplicaClient:
+    """Executor side of one replica: request ids, a receiver thread, one Future per call, in-flight count."""
+
+    def __init__(self, replica_id: int, ctx, cores: List[int], threads: int, args: Tuple):
+        self.replica_id = replica_id
+        self.cores = cores
+        self.threads = threads
+        self.in_flight = 0
+        self.dispatched = 0
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_replica_main,
+            args=(child_conn, replica_id, cores, threads, *args),
+            name=f"inference-replica-{replica_id}",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+        self._ids = itertools.count()
+        self._pending: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+        self.ready: Future = Future()
+        self._receiver = threading.Thread(target=self._receive, name=f"replica-{replica_id}-recv", daemon=True)
+        self._receiver.start()
+
+    def _receive(self):
+        while True:
+            try:
+                request_id, ok, payload = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            if request_id is None:
+                future = self.ready  # startup handshake
+            else:
+                with self._lock:
+                    future = self._pending.pop(request_id, None)
+                    if future is not None:
+                        self.in_flight -= 1
+            if future is None:
+                continue  # caller already gave up (timeout)
+            if ok:
+                future.set_result(payload)
+            else:
+                code, detail = payload
+                future.set_exception(CustomException(detail, code=ErrorCode(code)))
+
+        # Replica is gone: fail whatever is still waiting
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self.in_flight = 0
+        if not self.ready.done():
+            pending[-1] = self.ready
+        for future in pending.values():
+            future.set_exception(CustomException(
+                f"replica {self.replica_id} exited", code=ErrorCode.AI_DETECTION_ERROR
+            ))
+
+    def call(self, op: str, *args) -> Future:
+        future: Future = Future()
+        with self._lock:
+            if not self.process.is_alive():
+                future.set_exception(CustomException(
+                    f"replica {self.replica_id} is not running", code=ErrorCode.AI_DETECTION_ERROR
+                ))
+                return future
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            self.in_flight += 1
+            self.dispatched += 1
+            future.request_id = request_id
+            try:
+                self.conn.send((request_id, op, args))
+            except (OSError, ValueError) as e:
+                del self._pending[request_id]
+                self.in_flight -= 1
+                future.set_exception(CustomException(
+                    f"replica {self.replica_id}: {e}", code=ErrorCode.AI_DETECTION_ERROR
+                ))
+        return future
+
+    def abandon(self, future: Future):
+        with self._lock:
+            if self._pending.pop(getattr(future, "request_id", None), None) is not None:
+                self.in_flight -= 1
+
+    def stop(self, timeout: float = 5.0):
+        try:
+            with self._lock:
+                self.conn.send((None, "stop", ()))
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+
+# ----------------- Executor -----------------
+class InferenceExecutor:
+    """
+    Stands in for AICodeDetector where only detect(), detect_batch() and the
+    metrics are used (the API). detect() goes to the least-loaded replica;
+    detect_batch() splits the batch into one contiguous slice per replica.
+    """
+
+    def __init__(
+        self,
+        num_replicas: int = DEFAULT_NUM_REPLICAS,
+        cores: Optional[List[int]] = None,
+        threads_per_replica: Optional[int] = None,
+        config: Optional[AIDetectorConfig] = None,
+        loader_config: Optional[ModelLoaderConfig] = None,
+        model_factory: Optional[Callable[[], Tuple[Any, Any, Any]]] = None,
+        replica_timeout_s: float = DEFAULT_REPLICA_TIMEOUT_S,
+        start_timeout_s: float = DEFAULT_REPLICA_START_TIMEOUT_S,
+    ):
+        """
+        cores: cores to divide between the replicas (default: the process
+        affinity mask). threads_per_replica: intra-op threads (default: the
+        size of the replica's core group). model_factory: picklable callable
+        returning (model, tokenizer, device), run in every replica instead of
+        load_model_and_tokenizer(loader_config).
+        """
+        if num_replicas < 1:
+            raise ValueError("num_replicas must be at least 1")
+        self.config = config or AIDetectorConfig.from_env()
+        self.num_replicas = num_replicas
+        self.replica_timeout_s = replica_timeout_s
+        self.replica_timeouts = 0
+        self.replica_errors = 0
+        self._next = itertools.count()
+        self._dispatch_lock = threading.Lock()
+
+        start_time = time.time()
+        ctx = mp.get_context("spawn")
+        groups = core_groups(num_replicas, cores)
+        self.replicas = [
+            _ReplicaClient(
+                i, ctx, group, threads_per_replica or len(group),
+                (self.config, loader_config or ModelLoaderConfig.from_env(), model_factory),
+            )
+            for i, group in enumerate(groups)
+        ]
+        try:
+            for replica in self.replicas:
+                replica.ready.result(timeout=start_timeout_s)
+        except Exception as e:
+            self.close()
+            logging.error(f"Inference replicas failed to start: {e}")
+            raise CustomException(f"Inference replicas failed to start: {e}", code=ErrorCode.MODEL_LOAD_ERROR)
+
+        logging.info(
+            "Inference Executor initialized",
+            extra={
+                "num_replicas": num_replicas,
+                "core_groups": groups,
+                "threads_per_replica": [r.threads for r in self.replicas],
+                "startup_time_seconds": round(time.time() - start_time, 2),
+            }
+        )
+
+    def _pick(self) -> _ReplicaClient:
+        """Fewest calls in flight; ties rotate so idle replicas share the load."""
+        with self._dispatch_lock:
+            offset = next(self._next) % self.num_replicas
+            order = self.replicas[offset:] + self.replicas[:offset]
+            return min((r for r in order if r.process.is_alive()), key=lambda r: r.in_flight, default=order[0])
+
+    def _result(self, replica: _ReplicaClient, future: Future, timeout: Optional[float]) -> Any:
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            replica.abandon(future)
+            self.replica_timeouts += 1
+            logger.warning("Replica timed out", extra={"replica": replica.replica_id, "timeout_s": timeout})
+            raise CustomException(
+                f"replica {replica.replica_id} timed out after {timeout}s", code=ErrorCode.AI_DETECTION_ERROR
+            )
+        except CustomException:
+            self.replica_errors += 1
+            raise
+
+    def detect(self, code: str, language: str = "python") -> DetectionResult:
+        replica = self._pick()
+        return self._result(replica, replica.call("detect", code, language), self.replica_timeout_s)
+
+    def detect_batch(
+        self,
+        codes: List[str],
+        normalized_codes: Optional[List[Optional[str]]] = None
+    ) -> List[Optional[DetectionResult]]:
+        if not codes:
+            return []
+        normalized = list(normalized_codes) if normalized_codes else [None] * len(codes)
+        step = max(self.config.perplexity_batch_size, math.ceil(len(codes) / self.num_replicas))
+        calls = []
+        for start in range(0, len(codes), step):
+            replica = self._pick()
+            size = len(codes[start:start + step])
+            calls.append((replica, size, replica.call("detect_batch", codes[start:start + step], normalized[start:start + step])))
+
+        # A slice runs several padded forward passes; allow the per-call timeout for each
+        timeout = self.replica_timeout_s * math.ceil(step / max(1, self.config.perplexity_batch_size))
+        results: List[Optional[DetectionResult]] = []
+        for replica, size, future in calls:
+            try:
+                results.extend(self._result(replica, future, timeout))
+            except CustomException as e:
+                # Same contract as AICodeDetector.detect_batch: failed items are None
+                logger.warning(f"Batch slice failed: {e}", extra={"replica": replica.replica_id, "items": size})
+                results.extend([None] * size)
+        return results
+
+    # ---- metrics / lifecycle ----
+    def get_metrics(self) -> Dict[str, Any]:
+        """Detector totals summed over replicas, plus dispatch and failure counts."""
+        metrics: Dict[str, Any] = {}
+        for replica in self.replicas:
+            try:
+                replica_metrics = self._result(replica, replica.call("metrics"), self.replica_timeout_s)
+            except CustomException:
+                continue
+            for key, value in replica_metrics.items():
+                if isinstance(value, (int, float)) and not key.startswith("avg_"):
+                    metrics[key] = metrics.get(key, 0) + value
+        if metrics.get("total_detections"):
+            metrics["avg_processing_time_ms"] = round(
+                metrics["total_processing_time_ms"] / metrics["total_detections"], 2
+            )
+        metrics.update({
+            "num_replicas": self.num_replicas,
+            "replicas_alive": sum(1 for r in self.replicas if r.process.is_alive()),
+            "replica_timeouts": self.replica_timeouts,
+            "replica_errors": self.replica_errors,
+            "replica_in_flight": {str(r.replica_id): r.in_flight for r in self.replicas},
+            "replica_dispatched": {str(r.replica_id): r.dispatched for r in self.replicas},
+        })
+        return metrics
+
+    def reset_metrics(self):
+        self.replica_timeouts = 0
+        self.replica_errors = 0
+        for replica in self.replicas:
+            replica.dispatched = 0
+            replica.call("reset_metrics")
+
+    def close(self):
+        for replica in self.replicas:
+            replica.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    # Throughput vs latency for a few replica counts, on the tiny random model
+    import json
+    from concurrent.futures import ThreadPoolExecutor
+    from benchmarks.common import build_tiny_model, summarize
+    from benchmarks.corpus import generate_corpus
+
+    codes = [item.code for item in generate_corpus(int(os.getenv("EXECUTOR_DEMO_ITEMS", 64)), 42)]
+    cores = available_cores()
+    for replicas in sorted({1, 2, len(cores)}):
+        with InferenceExecutor(num_replicas=replicas, model_factory=build_tiny_model) as executor:
+            for code in codes[:replicas * 2]:
+                executor.detect(code)
+
+            def _timed(code):
+                start = time.perf_counter()
+                executor.detect(code)
+                return (time.perf_counter() - start) * 1000
+
+            wall_start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=replicas * 2) as pool:
+                latencies = list(pool.map(_timed, codes))
+            stats = summarize(latencies, len(codes), time.perf_counter() - wall_start)
+            print(f"{replicas} replicas on {len(cores)} cores: {json.dumps(stats)}")
@@ -2,7 +2,7 @@ from __future__ import annotations
 import sys
 import os
 import time
-from typing import Tuple,Optional
+from typing import Any, Callable, Tuple, Optional
 from dataclasses import dataclass
 
 import torch  # type: ignore
@@ -13,7 +13,7 @@ from transformers import (  # type: ignore
 
 # Import the already-configured logging and exception
 from src.logger import logging   
-from src.exception import CustomException
+from src.exception import CustomException, ErrorCode
 
 
 
@@ -27,6 +27,8 @@ class ModelLoaderConfig:
     use_fast_tokenizer: bool = True
     validate_on_load: bool = True
     max_validation_tokens: int = 50
+    backend: str = os.getenv("MODEL_BACKEND", "torch")  # "torch" or "onnx" (ONNX Runtime, CPU)
+    shape_buckets: bool = False  # pad to fixed shapes and run a per-shape compiled forward (bucketed_model)
     
     @classmethod
     def from_env(cls) -> ModelLoaderConfig:
@@ -35,6 +37,8 @@ class ModelLoaderConfig:
             models_root=os.getenv("MODELS_ROOT", r"E:\project\ML\models"),
             device_preference=os.getenv("MODEL_DEVICE", None),
             torch_dtype=os.getenv("TORCH_DTYPE", "auto"),
+            backend=os.getenv("MODEL_BACKEND", "torch"),
+            shape_buckets=os.getenv("MODEL_SHAPE_BUCKETS", "false").lower() in ("1", "true", "yes"),
         )
 
 
@@ -110,7 +114,7 @@ def _validate_model_directory(model_dir:str)-> str:
     
     except Exception as e:
         logging.error(f"Unexpected validation error: {e}")
-        raise CustomException(f"Model Dir error: {e}",sys)
+        raise CustomException(f"Model Dir error: {e}", code=ErrorCode.MODEL_VALIDATION_ERROR)
             
 
 def _load_config_(model_dir:str)->AutoConfig:
@@ -165,7 +169,7 @@ def _load_tokenizer(model_dir:str,use_fast:bool=True)->PreTrainedTokenizerBase:
     
     except Exception as e:
         logging.error(f"Failed to load tokenizer: {e}")
-        raise CustomException(f"TOKENIZER_LOAD_ERROR: {str(e)}", sys)
+        raise CustomException(str(e), code=ErrorCode.TOKENIZER_LOAD_ERROR)
 
 def _load_model(
     model_dir: str,
@@ -210,7 +214,7 @@ def _load_model(
     
     except Exception as e:
         logging.error(f"Failed to load model: {e}")
-        raise CustomException(f"MODEL_LOAD_ERROR: {str(e)}", sys)
+        raise CustomException(str(e), code=ErrorCode.MODEL_LOAD_ERROR)
 
 
 def _validate_model(
@@ -263,7 +267,61 @@ def _validate_model(
     
     except Exception as e:
         logging.error(f"Model validation failed: {e}")
-        raise CustomException(f"MODEL_VALIDATION_ERROR: {str(e)}", sys)
+        raise CustomException(str(e), code=ErrorCode.MODEL_VALIDATION_ERROR)
+
+def _load_onnx_backend(model_dir: str, model_config: AutoConfig, config: ModelLoaderConfig):
+    """ONNX Runtime session for model_dir, exported on first use and cached next to the weights."""
+    from src.ml_core.onnx_backend import load_onnx_model, weights_signature
+
+    return load_onnx_model(
+        model_config,
+        weights_signature(model_dir),
+        lambda: _load_model(model_dir, torch.device("cpu"), "float32", config.low_cpu_mem_usage),
+        default_cache_dir=os.path.join(model_dir, "onnx"),
+    )
+
+
+def _validate_forward(model, tokenizer: PreTrainedTokenizerBase) -> bool:
+    """Validation for backends without generate(): one forward pass must give a finite loss."""
+    try:
+        inputs = tokenizer("def hello():", return_tensors="pt")
+        loss = model(**inputs, labels=inputs["input_ids"]).loss
+        if not torch.isfinite(loss):
+            raise RuntimeError(f"Non-finite loss from validation forward pass: {loss.item()}")
+        logging.info("Model validation passed", extra={"loss": round(loss.item(), 4)})
+        return True
+
+    except Exception as e:
+        logging.error(f"Model validation failed: {e}")
+        raise CustomException(str(e), code=ErrorCode.MODEL_VALIDATION_ERROR)
+
+def split_lm_head(model: Any) -> Optional[Tuple[Callable[..., torch.Tensor], torch.nn.Module]]:
+    """
+    (body, head) with head(body(input_ids, attention_mask)) equal to the
+    model's logits, so callers can run the vocabulary projection on slices
+    of the hidden states. Plain transformers causal LMs qualify unless they
+    post-process their logits; wrappers (ONNX, shape buckets) qualify by
+    exposing hidden_states() and lm_head. None when the head is not separable.
+    """
+    if isinstance(model, PreTrainedModel):
+        base = getattr(model, "base_model", model)
+        if base is model:
+            return None
+        if getattr(model.config, "final_logit_softcapping", None) or getattr(model.config, "logit_scale", None):
+            return None
+        head = model.get_output_embeddings()
+        if head is None:
+            return None
+
+        def body(input_ids: torch.Tensor, attention_mask: Optional[torch.Tensor] = None) -> torch.Tensor:
+            return base(input_ids=input_ids, attention_mask=attention_mask, use_cache=False).last_hidden_state
+        return body, head
+
+    hidden_states = getattr(model, "hidden_states", None)
+    head = getattr(model, "lm_head", None)
+    if callable(hidden_states) and head is not None:
+        return hidden_states, head
+    return None
 
 def load_model_and_tokenizer(
     config: Optional[ModelLoaderConfig] = None
@@ -281,6 +339,8 @@ def load_model_and_tokenizer(
                 "models_root": config.models_root,
                 "device_preference": config.device_preference,
                 "torch_dtype": config.torch_dtype,
+                "backend": config.backend,
+                "shape_buckets": config.shape_buckets,
             }
         )
         
@@ -297,16 +357,29 @@ def load_model_and_tokenizer(
         tokenizer = _load_tokenizer(model_dir, config.use_fast_tokenizer)
         
         # 5. Load model
-        model = _load_model(
-            model_dir,
-            device,
-            config.torch_dtype,
-            config.low_cpu_mem_usage
-        )
+        if config.backend == "onnx":
+            model, device = _load_onnx_backend(model_dir, model_config, config), torch.device("cpu")
+        else:
+            model = _load_model(
+                model_dir,
+                device,
+                config.torch_dtype,
+                config.low_cpu_mem_usage
+            )
         
         # 6. Optional validation
         if config.validate_on_load:
-            _validate_model(model, tokenizer, device, config.max_validation_tokens)
+            if config.backend == "onnx":
+                _validate_forward(model, tokenizer)
+            else:
+                _validate_model(model, tokenizer, device, config.max_validation_tokens)
+        
+        # 7. Optional shape buckets; compiled lazily, warmed by the caller (API lifespan)
+        if config.shape_buckets:
+            from src.ml_core.bucketed_model import BucketedCausalLM, BucketConfig
+
+            pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+            model = BucketedCausalLM(model, BucketConfig.from_env(), pad_token_id=pad_token_id)
         
         total_time = time.time() - start_time
         
@@ -326,7 +399,7 @@ def load_model_and_tokenizer(
     
     except Exception as e:
         logging.error(f"Unexpected error in loading pipeline: {e}")
-        raise CustomException(f"MODEL_LOADING_PIPELINE_ERROR: {str(e)}", sys)
+        raise CustomException(str(e), code=ErrorCode.MODEL_LOADING_PIPELINE_ERROR)
     
 _cached_model: Optional[PreTrainedModel] = None
 _cached_tokenizer: Optional[PreTrainedTokenizerBase] = None
@@ -346,6 +419,16 @@ def get_model_singleton(
     
     return _cached_model, _cached_tokenizer, _cached_device
 
+def set_model_singleton(
+    model: PreTrainedModel,
+    tokenizer: PreTrainedTokenizerBase,
+    device: torch.device
+) -> None:
+    """Install an already-built model as the singleton (benchmarks, load tests)."""
+    global _cached_model, _cached_tokenizer, _cached_device
+    _cached_model, _cached_tokenizer, _cached_device = model, tokenizer, device
+    logging.info("Model singleton set explicitly", extra={"device": str(device)})
+
 def clear_model_cache():
     
     global _cached_model, _cached_tokenizer, _cached_device
@@ -0,0 +1,379 @@
+"""
+ONNX Runtime backend for the perplexity model.
+
+The causal LM is exported to ONNX once and cached on disk under a key derived
+from the model config (plus a weights signature), then served by an ONNX
+Runtime CPU session. OnnxCausalLM answers the same calls AICodeDetector makes
+on a transformers model -- model(**inputs, labels=...) -> .loss / .logits --
+so the detector does not know which backend it runs on.
+
+When the LM head is separable (split_lm_head) only the body is exported: the
+graph returns hidden states and the head weights are saved next to it
+(<name>.head.pt) and run in torch. hidden_states() / lm_head then let the
+detector chunk the vocabulary projection instead of getting full
+[batch, seq, vocab] logits out of the session.
+
+onnxruntime is optional: it is imported only when this backend is selected
+(MODEL_BACKEND=onnx).
+"""
+from __future__ import annotations
+import os
+import sys
+import json
+import time
+import hashlib
+from typing import Any, Callable, Dict, Optional
+from dataclasses import dataclass
+
+import torch  # type: ignore
+from transformers import PretrainedConfig, PreTrainedModel  # type: ignore
+from transformers.modeling_outputs import CausalLMOutput  # type: ignore
+
+from src.logger import logging
+from src.exception import CustomException, ErrorCode
+from src.ml_core.model_loader import split_lm_head
+
+EXPORT_VERSION = 2  # bump when the export recipe changes, invalidates every cache entry
+WEIGHT_FILES = ("model.safetensors", "pytorch_model.bin")
+
+
+@dataclass
+class OnnxBackendConfig:
+    cache_dir: Optional[str] = None  # default: <models_root>/onnx
+    intra_op_threads: int = 0  # 0 = ONNX Runtime default (one per physical core)
+    inter_op_threads: int = 1
+    opset: int = 18  # the torch.export-based exporter emits opset 18+
+    graph_optimization: str = "all"  # disable / basic / extended / all
+    # The arena keeps the largest buffers it ever handed out; with changing shapes
+    # (and a [batch, seq, vocab] output for logits exports) that grows far past one request
+    cpu_mem_arena: bool = False
+
+    @classmethod
+    def from_env(cls) -> OnnxBackendConfig:
+        return cls(
+            cache_dir=os.getenv("ONNX_CACHE_DIR") or None,
+            intra_op_threads=int(os.getenv("ONNX_INTRA_OP_THREADS", 0)),
+            inter_op_threads=int(os.getenv("ONNX_INTER_OP_THREADS", 1)),
+            opset=int(os.getenv("ONNX_OPSET", 18)),
+            graph_optimization=os.getenv("ONNX_GRAPH_OPTIMIZATION", "all"),
+            cpu_mem_arena=os.getenv("ONNX_CPU_MEM_ARENA", "false").lower() in ("1", "true", "yes"),
+        )
+
+
+# ----------------- Cache keys -----------------
+def weights_signature(model_dir: str) -> str:
+    """Name, size and mtime of the weight files; cheap and changes with the checkpoint."""
+    parts = []
+    for name in WEIGHT_FILES:
+        path = os.path.join(model_dir, name)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            parts.append(f"{name}:{stat.st_size}:{int(stat.st_mtime)}")
+    return ";".join(parts)
+
+
+def parameter_signature(model: torch.nn.Module, sample: int = 256) -> str:
+    """Digest of the first values of every parameter, for models that never touched disk."""
+    digest = hashlib.sha256()
+    for name, param in model.named_parameters():
+        digest.update(name.encode())
+        digest.update(param.detach().flatten()[:sample].float().cpu().numpy().tobytes())
+    return digest.hexdigest()
+
+
+def cache_key(model_config: PretrainedConfig, weights: str, opset: int) -> str:
+    """Hash of the model config, the weights signature and the export recipe."""
+    payload = json.dumps({
+        "config": model_config.to_dict(),
+        "weights": weights,
+        "opset": opset,
+        "export_version": EXPORT_VERSION,
+        "torch": torch.__version__,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+# ----------------- Export -----------------
+class _LogitsOnly(torch.nn.Module):
+    """Forward without KV cache that returns bare logits, which is all the exporter should trace."""
+
+    def __init__(self, model: PreTrainedModel):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        return self.model(input_ids=input_ids, attention_mask=attention_mask, use_cache=False).logits
+
+
+class _BodyOnly(torch.nn.Module):
+    """Same for the transformer body: returns the last hidden state."""
+
+    def __init__(self, base_model: torch.nn.Module):
+        super().__init__()
+        self.base_model = base_model
+
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        return self.base_model(input_ids=input_ids, attention_mask=attention_mask, use_cache=False).last_hidden_state
+
+
+def head_path(path: str) -> str:
+    return f"{os.path.splitext(path)[0]}.head.pt"
+
+
+def _save_head(head: torch.nn.Module, path: str):
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    bias = getattr(head, "bias", None)
+    torch.save({
+        "weight": head.weight.detach().cpu().contiguous(),
+        "bias": None if bias is None else bias.detach().cpu().contiguous(),
+    }, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _load_head(path: str) -> torch.nn.Linear:
+    state = torch.load(path, map_location="cpu", weights_only=True)
+    out_features, in_features = state["weight"].shape
+    head = torch.nn.Linear(in_features, out_features, bias=state["bias"] is not None)
+    head.load_state_dict({k: v for k, v in state.items() if v is not None})
+    return head.eval().requires_grad_(False)
+
+
+def export_onnx(model: PreTrainedModel, path: str, opset: int = 18) -> str:
+    """
+    Export `model` to `path` with dynamic batch and sequence axes; the file
+    appears atomically. A separable LM head is saved to head_path(path) first
+    and the graph outputs hidden states; otherwise it outputs logits.
+    """
+    try:
+        start_time = time.time()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        model = model.to("cpu").eval()
+        # Eager attention traces to plain ops; sdpa/flash kernels do not export reliably
+        if hasattr(model, "set_attn_implementation"):
+            model.set_attn_implementation("eager")
+
+        split = split_lm_head(model)
+        if split is not None and isinstance(split[1], torch.nn.Linear):
+            _save_head(split[1], head_path(path))
+            module, output = _BodyOnly(model.base_model), "hidden_states"
+        else:
+            module, output = _LogitsOnly(model), "logits"
+
+        # torch.export based: the TorchScript exporter (dynamo=False) bakes parts of the
+        # attention mask into constants and disagrees with torch even at the traced shape.
+        # Batch 2 so neither axis is specialized to 1.
+        dummy = torch.ones((2, 8), dtype=torch.long)
+        max_positions = getattr(model.config, "max_position_embeddings", None)
+        axes = {
+            0: torch.export.Dim("batch"),
+            1: torch.export.Dim("sequence", max=max_positions) if max_positions else torch.export.Dim("sequence"),
+        }
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with torch.no_grad():
+            torch.onnx.export(
+                module,
+                (dummy, torch.ones_like(dummy)),
+                tmp_path,
+                input_names=["input_ids", "attention_mask"],
+                output_names=[output],
+                dynamic_shapes={"input_ids": axes, "attention_mask": axes},
+                opset_version=opset,
+                dynamo=True,
+                external_data=False,  # one file, so the atomic rename moves everything
+                verbose=False,
+            )
+        os.replace(tmp_path, path)
+
+        logging.info(
+            "Model exported to ONNX",
+            extra={
+                "path": path,
+                "output": output,
+                "opset": opset,
+                "size_mb": round(os.path.getsize(path) / 2**20, 1),
+                "export_time_seconds": round(time.time() - start_time, 2),
+            }
+        )
+        return path
+
+    except Exception as e:
+        logging.error(f"ONNX export failed: {e}")
+        raise CustomException(str(e), code=ErrorCode.MODEL_LOAD_ERROR)
+
+
+# ----------------- Runtime -----------------
+class OnnxCausalLM:
+    """
+    ONNX Runtime session behind the slice of the PreTrainedModel interface the
+    detector uses: calling it with input_ids / attention_mask (and optionally
+    labels) returns a CausalLMOutput with torch logits and the usual shifted
+    mean cross-entropy loss. With a body-only export, hidden_states() and
+    lm_head expose the two halves (see split_lm_head); lm_head is None for
+    logits exports.
+    """
+
+    device = torch.device("cpu")
+
+    def __init__(self, session: Any, config: PretrainedConfig, path: str, lm_head: Optional[torch.nn.Module] = None):
+        self.session = session
+        self.config = config
+        self.path = path
+        self.lm_head = lm_head
+        self._output = session.get_outputs()[0].name
+
+    def _run(self, input_ids: torch.Tensor, attention_mask: Optional[torch.Tensor]) -> torch.Tensor:
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        return torch.from_numpy(self.session.run([self._output], {
+            "input_ids": input_ids.cpu().numpy().astype("int64"),
+            "attention_mask": attention_mask.cpu().numpy().astype("int64"),
+        })[0])
+
+    def hidden_states(self, input_ids: torch.Tensor, attention_mask: Optional[torch.Tensor] = None) -> torch.Tensor:
+        """Last hidden state from the session; apply lm_head to get logits."""
+        if self.lm_head is None:
+            raise RuntimeError(f"{self.path} is a logits export, it has no separate LM head")
+        return self._run(input_ids, attention_mask)
+
+    def __call__(
+        self,
+        input_ids: torch.Tensor,
+        attention_mask: Optional[torch.Tensor] = None,
+        labels: Optional[torch.Tensor] = None,
+        **kwargs
+    ) -> CausalLMOutput:
+        output = self._run(input_ids, attention_mask)
+        logits = self.lm_head(output) if self.lm_head is not None else output
+
+        loss = None
+        if labels is not None:
+            # Same as transformers' causal LM loss: predict token t+1 from t, mean over non-ignored labels
+            loss = torch.nn.functional.cross_entropy(
+                logits[:, :-1, :].reshape(-1, logits.shape[-1]).float(),
+                labels[:, 1:].reshape(-1).to(logits.device),
+                ignore_index=-100,
+            )
+        return CausalLMOutput(loss=loss, logits=logits)
+
+    forward = __call__
+
+    def eval(self) -> OnnxCausalLM:
+        return self
+
+    def to(self, *args, **kwargs) -> OnnxCausalLM:
+        return self
+
+    def session_info(self) -> Dict[str, Any]:
+        options = self.session.get_session_options()
+        return {
+            "backend": "onnx",
+            "path": self.path,
+            "output": self._output,
+            "providers": self.session.get_providers(),
+            "intra_op_threads": options.intra_op_num_threads,
+            "inter_op_threads": options.inter_op_num_threads,
+        }
+
+
+def _create_session(path: str, backend_config: OnnxBackendConfig):
+    try:
+        import onnxruntime as ort  # type: ignore
+    except ImportError as e:
+        raise CustomException(
+            f"MODEL_BACKEND=onnx needs the onnxruntime package: {e}", code=ErrorCode.MODEL_LOAD_ERROR
+        )
+
+    levels = {
+        "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = backend_config.intra_op_threads
+    options.inter_op_num_threads = backend_config.inter_op_threads
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = levels.get(backend_config.graph_optimization, levels["all"])
+    options.enable_cpu_mem_arena = backend_config.cpu_mem_arena
+    options.enable_mem_pattern = False  # shapes change every call, a recorded pattern never applies
+    return ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+def load_onnx_model(
+    model_config: PretrainedConfig,
+    weights: str,
+    load_torch_model: Callable[[], PreTrainedModel],
+    backend_config: Optional[OnnxBackendConfig] = None,
+    default_cache_dir: Optional[str] = None,
+) -> OnnxCausalLM:
+    """
+    Session for the cached export keyed by (model_config, weights); the torch
+    model is only loaded (via load_torch_model) when the cache has no entry.
+    """
+    backend_config = backend_config or OnnxBackendConfig.from_env()
+    cache_dir = (
+        backend_config.cache_dir or default_cache_dir or os.path.join(os.getenv("MODELS_ROOT", "models"), "onnx")
+    )
+
+    try:
+        start_time = time.time()
+        key = cache_key(model_config, weights, backend_config.opset)
+        path = os.path.join(cache_dir, f"{getattr(model_config, 'model_type', 'model')}-{key}.onnx")
+        cached = os.path.isfile(path)
+        if not cached:
+            export_onnx(load_torch_model(), path, backend_config.opset)
+
+        lm_head = _load_head(head_path(path)) if os.path.isfile(head_path(path)) else None
+        model = OnnxCausalLM(_create_session(path, backend_config), model_config, path, lm_head)
+        logging.info(
+            "ONNX Runtime model ready",
+            extra={
+                "path": path,
+                "cache_hit": cached,
+                "separate_head": lm_head is not None,
+                "intra_op_threads": backend_config.intra_op_threads,
+                "inter_op_threads": backend_config.inter_op_threads,
+                "load_time_seconds": round(time.time() - start_time, 2),
+            }
+        )
+        return model
+
+    except CustomException:
+        raise
+
+    except Exception as e:
+        logging.error(f"Failed to load ONNX model: {e}")
+        raise CustomException(str(e), code=ErrorCode.MODEL_LOAD_ERROR)
+
+
+def onnx_from_torch(
+    model: PreTrainedModel,
+    backend_config: Optional[OnnxBackendConfig] = None,
+    cache_dir: Optional[str] = None,
+) -> OnnxCausalLM:
+    """ONNX twin of an in-memory model (benchmarks, tests); keyed by config and a parameter digest."""
+    return load_onnx_model(
+        model.config, parameter_signature(model), lambda: model, backend_config, cache_dir
+    )
+
+
+if __name__ == "__main__":
+    # Export the local model (or reuse the cache) and compare one loss with torch
+    try:
+        from src.ml_core.model_loader import ModelLoaderConfig, load_model_and_tokenizer
+
+        model, tokenizer, device = load_model_and_tokenizer(ModelLoaderConfig.from_env())
+        onnx_model = onnx_from_torch(model)
+
+        inputs = tokenizer("def add(a, b):\n    return a + b\n", return_tensors="pt")
+        with torch.no_grad():
+            torch_loss = model(**inputs.to(device), labels=inputs["input_ids"]).loss.item()
+        onnx_loss = onnx_model(**inputs, labels=inputs["input_ids"]).loss.item()
+
+        print(f"torch loss: {torch_loss:.6f}  onnx loss: {onnx_loss:.6f}  diff: {abs(torch_loss - onnx_loss):.2e}")
+        print(onnx_model.session_info())
+
+    except CustomException as e:
+        logging.error(f"Example failed: {e}")
+        raise CustomException(e, sys)
@@ -0,0 +1,392 @@
+"""
+Runtime-mutable pattern corpus for the plagiarism detector.
+
+Readers (detect) grab the current PatternSnapshot once and use it for the
+whole request; it is never modified. Writers (add / remove / load) prepare
+new patterns outside the lock, then under it copy the derived maps, apply
+their change and publish a new snapshot with a single attribute swap, so a
+request never blocks on an update and never sees half of one. Existing
+patterns are never re-normalized, but every update is O(corpus): it copies
+by_name, order and the three by_hash maps and rebuilds the patterns tuple
+(about 30 ms per add or remove at 100k patterns). That is the price of
+lock-free readers on plain dicts; batch changes through load() rather than
+many add() calls.
+
+Bulk loads of large corpora should come from a pattern file written by
+save_patterns(): it stores the normalized forms, so loading is parsing, not
+normalizing (forms are recomputed when the normalizer fingerprint differs).
+"""
+from __future__ import annotations
+import ast
+import json
+import time
+import hashlib
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Tuple, Iterable, Any
+
+from src.logger import logging, get_logger
+from src.components.normalization import Normalizer
+
+logger = get_logger(__name__)
+
+LEVELS = ("aggressive", "medium", "light")  # exact-match precedence
+PATTERN_FILE_FORMAT = 1
+
+
+@dataclass
+class AlgorithmPattern:
+    """Canonical algorithm pattern for matching."""
+    name: str
+    category: str  # "sorting", "searching", "dynamic_programming", etc.
+    code: str
+    sources: List[str]  # ["StackOverflow", "LeetCode", etc.]
+    language: str = "python"
+    hash_light: str = ""
+    hash_medium: str = ""
+    hash_aggressive: str = ""
+    normalized: Dict[str, str] = field(default_factory=dict, repr=False)
+    token_ids: Tuple[int, ...] = field(default=(), repr=False)
+    char_counts: Dict[str, Counter] = field(default_factory=dict, repr=False)
+    fingerprint: str = field(default="", repr=False)  # normalizer the forms came from
+    _structure: Optional[str] = field(default=None, repr=False, compare=False)
+
+    def compute_hashes(self, normalizer: Normalizer):
+        """Precompute normalized forms and their hashes (one normalizer pass)."""
+        forms = normalizer.normalize_all(self.code, self.language, use_cache=False)
+        self.set_forms(forms.light, forms.medium, forms.aggressive, forms.token_ids, normalizer.fingerprint)
+
+    def set_forms(self, light: str, medium: str, aggressive: str, token_ids: Iterable[int], fingerprint: str):
+        self.normalized = {
+            "light": light,
+            "medium": medium,
+            "aggressive": aggressive,
+        }
+        self.token_ids = tuple(token_ids)
+        self.char_counts = {level: Counter(text) for level, text in self.normalized.items()}
+        self.hash_light = self._hash_code(light)
+        self.hash_medium = self._hash_code(medium)
+        self.hash_aggressive = self._hash_code(aggressive)
+        self.fingerprint = fingerprint
+
+    def is_prepared(self, normalizer: Normalizer) -> bool:
+        return bool(self.normalized) and self.fingerprint == normalizer.fingerprint
+
+    def structure(self) -> Optional[str]:
+        """ast.dump of the pattern, parsed on first use (Python only)."""
+        if self._structure is None and self.language == "python":
+            try:
+                self._structure = ast.dump(ast.parse(self.code))
+            except SyntaxError:
+                self._structure = ""
+        return self._structure
+
+    def hash(self, level: str) -> str:
+        return getattr(self, f"hash_{level}")
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "category": self.category,
+            "sources": list(self.sources),
+            "language": self.language,
+            "code_length": len(self.code),
+        }
+
+    @staticmethod
+    def _hash_code(code: str) -> str:
+        """Generate SHA-256 hash of code."""
+        return hashlib.sha256(code.encode('utf-8')).hexdigest()
+
+
+# ----------------- Snapshot -----------------
+@dataclass(frozen=True)
+class PatternSnapshot:
+    """One immutable version of the pattern corpus and its derived indexes."""
+    version: int
+    by_name: Dict[str, AlgorithmPattern]              # insertion order = pattern order
+    order: Dict[str, int]                             # name -> insertion sequence
+    by_hash: Dict[str, Dict[str, Tuple[str, ...]]]    # level -> hash -> names
+    patterns: Tuple[AlgorithmPattern, ...] = ()
+
+    def __len__(self) -> int:
+        return len(self.by_name)
+
+    def get(self, name: str) -> Optional[AlgorithmPattern]:
+        return self.by_name.get(name)
+
+    def exact_match(self, hashes: Dict[str, str]) -> Optional[Tuple[AlgorithmPattern, str]]:
+        """
+        (pattern, level) of the earliest pattern whose hash equals the
+        submission's at some level, the level checked aggressive first; the
+        same answer as scanning the patterns in order, in O(1).
+        """
+        best_name = None
+        for level in LEVELS:
+            for name in self.by_hash[level].get(hashes[level], ()):
+                if best_name is None or self.order[name] < self.order[best_name]:
+                    best_name = name
+        if best_name is None:
+            return None
+        pattern = self.by_name[best_name]
+        level = next(level for level in LEVELS if pattern.hash(level) == hashes[level])
+        return pattern, level
+
+
+def _empty_snapshot() -> PatternSnapshot:
+    return PatternSnapshot(0, {}, {}, {level: {} for level in LEVELS})
+
+
+# ----------------- Preparation workers -----------------
+_worker_normalizer: Optional[Normalizer] = None
+
+
+def _init_worker(settings: Dict[str, Any]):
+    global _worker_normalizer
+    _worker_normalizer = Normalizer(**settings, enable_cache=False)
+
+
+def _prepare_chunk(items: List[Tuple[str, str]]):
+    out = []
+    for code, language in items:
+        forms = _worker_normalizer.normalize_all(code, language)
+        out.append((forms.light, forms.medium, forms.aggressive, forms.token_ids))
+    return out
+
+
+# ----------------- Index -----------------
+class PatternIndex:
+    """Copy-on-write holder of the current PatternSnapshot; names are unique keys."""
+
+    def __init__(self, normalizer: Normalizer, patterns: Iterable[AlgorithmPattern] = ()):
+        self.normalizer = normalizer
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._snapshot = _empty_snapshot()
+        patterns = list(patterns)
+        if patterns:
+            self.load(patterns)
+
+    @property
+    def snapshot(self) -> PatternSnapshot:
+        return self._snapshot
+
+    # ---- preparation (no lock held) ----
+    def prepare(self, patterns: List[AlgorithmPattern], workers: Optional[int] = None) -> List[AlgorithmPattern]:
+        """Compute forms and hashes for patterns that lack them (or came from another normalizer)."""
+        pending = [p for p in patterns if not p.is_prepared(self.normalizer)]
+        if not pending:
+            return patterns
+
+        if workers and workers > 1 and len(pending) >= 4 * workers:
+            chunk = -(-len(pending) // (workers * 4))
+            items = [(p.code, p.language) for p in pending]
+            fingerprint = self.normalizer.fingerprint
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(self.normalizer.settings,),
+            ) as pool:
+                chunks = pool.map(_prepare_chunk, [items[i:i + chunk] for i in range(0, len(items), chunk)])
+                results = [forms for part in chunks for forms in part]
+            for pattern, (light, medium, aggressive, token_ids) in zip(pending, results):
+                pattern.set_forms(light, medium, aggressive, token_ids, fingerprint)
+        else:
+            for pattern in pending:
+                pattern.compute_hashes(self.normalizer)
+        return patterns
+
+    # ---- updates ----
+    def _publish(
+        self,
+        upserts: List[AlgorithmPattern],
+        removals: Iterable[str],
+        replace: bool = False,
+        orders: Optional[List[int]] = None,
+    ) -> Tuple[PatternSnapshot, int]:
+        """
+        Apply an update to copies of the current maps and swap in the result.
+        Copy-on-write of the whole index: O(len(corpus)) whatever the size of
+        the update, so one call with many upserts costs about as much as one
+        with a single pattern. `orders` sets the match order of the upserts explicitly (a sharding
+        coordinator's global sequence); by default it is insertion order.
+        """
+        with self._lock:
+            old = self._snapshot if not replace else _empty_snapshot()
+            by_name = dict(old.by_name)
+            order = dict(old.order)
+            by_hash = {level: dict(hashes) for level, hashes in old.by_hash.items()}
+            # Buckets changed by this update, as lists until published; the
+            # tuples in by_hash may still be shared with the old snapshot.
+            buckets: Dict[Tuple[str, str], List[str]] = {}
+
+            def _bucket(level: str, key: str) -> List[str]:
+                bucket = buckets.get((level, key))
+                if bucket is None:
+                    bucket = buckets[(level, key)] = list(by_hash[level].get(key, ()))
+                return bucket
+
+            def _unindex(pattern: AlgorithmPattern):
+                for level in LEVELS:
+                    _bucket(level, pattern.hash(level)).remove(pattern.name)
+                del by_name[pattern.name]
+                del order[pattern.name]
+
+            removed = 0
+            for name in removals:
+                if name in by_name:
+                    _unindex(by_name[name])
+                    removed += 1
+
+            for i, pattern in enumerate(upserts):
+                if pattern.name in by_name:
+                    _unindex(by_name[pattern.name])  # replaced patterns move to the end
+                self._seq = orders[i] if orders else self._seq + 1
+                by_name[pattern.name] = pattern
+                order[pattern.name] = self._seq
+                for level in LEVELS:
+                    _bucket(level, pattern.hash(level)).append(pattern.name)
+
+            for (level, key), names in buckets.items():
+                if names:
+                    by_hash[level][key] = tuple(names)
+                else:
+                    by_hash[level].pop(key, None)
+
+            snapshot = PatternSnapshot(
+                version=self._snapshot.version + 1,
+                by_name=by_name,
+                order=order,
+                by_hash=by_hash,
+                patterns=tuple(by_name.values()),
+            )
+            self._snapshot = snapshot
+            return snapshot, removed
+
+    def add(self, pattern: AlgorithmPattern, order: Optional[int] = None) -> PatternSnapshot:
+        """Add a pattern, replacing any pattern with the same name."""
+        return self._publish(self.prepare([pattern]), (), orders=None if order is None else [order])[0]
+
+    def remove(self, names: Iterable[str]) -> int:
+        """Remove patterns by name; returns how many existed."""
+        return self._publish([], list(names))[1]
+
+    def load(
+        self,
+        patterns: Iterable[AlgorithmPattern],
+        replace: bool = False,
+        workers: Optional[int] = None,
+        orders: Optional[List[int]] = None,
+    ) -> PatternSnapshot:
+        """Add many patterns with one snapshot swap; replace=True drops the current corpus."""
+        start = time.perf_counter()
+        patterns = self.prepare(list(patterns), workers)
+        snapshot, _ = self._publish(patterns, (), replace=replace, orders=orders)
+        logging.info(
+            "Pattern corpus updated",
+            extra={
+                "loaded": len(patterns),
+                "num_patterns": len(snapshot),
+                "version": snapshot.version,
+                "replace": replace,
+                "latency_ms": int((time.perf_counter() - start) * 1000),
+            }
+        )
+        return snapshot
+
+
+# ----------------- Pattern files -----------------
+def save_patterns(patterns: Iterable[AlgorithmPattern], path: str, normalizer: Normalizer) -> int:
+    """Write patterns with their normalized forms as JSON lines; returns the count."""
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"format": PATTERN_FILE_FORMAT, "fingerprint": normalizer.fingerprint}) + "\n")
+        for pattern in patterns:
+            if not pattern.is_prepared(normalizer):
+                pattern.compute_hashes(normalizer)
+            f.write(json.dumps({
+                "name": pattern.name,
+                "category": pattern.category,
+                "code": pattern.code,
+                "sources": pattern.sources,
+                "language": pattern.language,
+                "normalized": pattern.normalized,
+                "token_ids": pattern.token_ids,
+            }) + "\n")
+            count += 1
+    return count
+
+
+def read_patterns(path: str, normalizer: Optional[Normalizer] = None) -> List[AlgorithmPattern]:
+    """
+    Patterns from a save_patterns() file. With a normalizer whose fingerprint
+    matches the file, the stored forms are reused; otherwise the patterns
+    come back unprepared and PatternIndex.prepare() normalizes them.
+    """
+    patterns = []
+    with open(path, encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("format") != PATTERN_FILE_FORMAT:
+            raise ValueError(f"Unsupported pattern file format: {header.get('format')}")
+        reuse = normalizer is not None and header.get("fingerprint") == normalizer.fingerprint
+        for line in f:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            pattern = AlgorithmPattern(
+                name=data["name"],
+                category=data["category"],
+                code=data["code"],
+                sources=data["sources"],
+                language=data.get("language", "python"),
+            )
+            forms = data.get("normalized")
+            if reuse and forms:
+                pattern.set_forms(
+                    forms["light"], forms["medium"], forms["aggressive"],
+                    data.get("token_ids", ()), normalizer.fingerprint,
+                )
+            patterns.append(pattern)
+    return patterns
+
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+
+    normalizer = Normalizer()
+    templates = [
+        "def f_{i}(arr):\n    total = 0\n    for x in arr:\n        if x > {i}:\n            total += x * {k}\n    return total\n",
+        "def g_{i}(n):\n    dp = [0] * (n + {k})\n    for j in range(1, n):\n        dp[j] = dp[j - 1] + {i}\n    return dp[n - 1]\n",
+    ]
+    n = int(os.getenv("PATTERN_DEMO_SIZE", 100_000))
+    raw = [
+        AlgorithmPattern(f"pattern_{i}", "synthetic", templates[i % 2].format(i=i, k=i % 7), ["demo"])
+        for i in range(n)
+    ]
+
+    index = PatternIndex(normalizer)
+    start = time.perf_counter()
+    index.load(raw, workers=os.cpu_count())
+    print(f"normalize + index {n} patterns: {time.perf_counter() - start:.2f}s")
+
+    path = os.path.join(tempfile.gettempdir(), "patterns_demo.jsonl")
+    save_patterns(index.snapshot.patterns, path, normalizer)
+    start = time.perf_counter()
+    loaded = read_patterns(path, normalizer)
+    fresh = PatternIndex(normalizer)
+    fresh.load(loaded, replace=True)
+    print(f"load {len(fresh.snapshot)} patterns from file: {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    fresh.add(AlgorithmPattern("extra", "synthetic", "def extra(a):\n    return a[::-1]\n", ["demo"]))
+    fresh.remove(["pattern_0", "pattern_1"])
+    print(f"add + remove on {len(fresh.snapshot)} patterns: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    probe = raw[5]
+    hashes = {level: probe.hash(level) for level in LEVELS}
+    match = fresh.snapshot.exact_match(hashes)
+    print("exact match:", match[0].name if match else None, match[1] if match else None)
+    os.remove(path)
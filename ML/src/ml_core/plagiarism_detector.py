@@ -4,13 +4,25 @@ import ast
 import hashlib
 import time
 import difflib
+from collections import Counter
 from typing import Optional, List, Dict, Tuple, Any
 from dataclasses import dataclass, field, asdict
 from functools import lru_cache
 
-from src.logger import logging
-from src.exception import CustomException
+from src.logger import logging, get_logger
+from src.exception import CustomException, ErrorCode
+from src.metrics import timed
+from src.tracing import traced
 from src.components.normalization import Normalizer
+from src.ml_core.pattern_index import (
+    AlgorithmPattern, PatternIndex, PatternSnapshot, read_patterns, save_patterns,
+)
+
+logger = get_logger(__name__)
+
+# Similarity cascade tiers, cheapest first. "pairs" counts (pattern, level)
+# pairs considered; every other tier counts the pairs it disposed of.
+CASCADE_TIERS = ("pairs", "length_screen", "length_bound", "multiset_bound", "top_k_cut", "full_ratio")
 
 
 @dataclass
@@ -72,6 +84,19 @@ class ComparisonResult:
     reasoning: str
 
 
+@dataclass
+class PatternSearch:
+    """Raw outcome of searching one pattern corpus (or shard), before the verdict."""
+    exact_match: Optional[PlagiarismMatch]
+    matches: List[PlagiarismMatch]  # similarity matches, best first, at most similarity_top_k
+    max_similarities: Dict[str, float]
+    structural_similarity: float  # against the best match
+    terminated_early: bool = False  # exact match with enable_early_termination
+    # Corpus match order of exact_match / each of matches, for merging shard results
+    exact_order: Optional[int] = None
+    match_orders: List[int] = field(default_factory=list)
+
+
 @dataclass
 class PlagiarismDetectorConfig:
     """Configuration for plagiarism detection."""
@@ -92,6 +117,8 @@ class PlagiarismDetectorConfig:
     # Processing limits
     max_code_length: int = 50000
     max_patterns_to_check: int = 100
+    similarity_top_k: int = 5  # similarity matches kept per submission (detect reports 5)
+    exact_similarity_maxima: bool = True  # max_similarity_* are returned to clients; False trades exactness for pruning
     
     # Performance
     enable_early_termination: bool = True  # Stop at first exact match
@@ -105,38 +132,10 @@ class PlagiarismDetectorConfig:
         return cls(
             high_similarity_threshold=float(os.getenv("PLAG_HIGH_THRESHOLD", 0.95)),
             medium_similarity_threshold=float(os.getenv("PLAG_MEDIUM_THRESHOLD", 0.85)),
+            exact_similarity_maxima=os.getenv("PLAG_EXACT_SIMILARITY_MAXIMA", "true").lower() in ("1", "true", "yes"),
         )
 
 
-@dataclass
-class AlgorithmPattern:
-    """Canonical algorithm pattern for matching."""
-    name: str
-    category: str  # "sorting", "searching", "dynamic_programming", etc.
-    code: str
-    sources: List[str]  # ["StackOverflow", "LeetCode", etc.]
-    hash_light: str = ""
-    hash_medium: str = ""
-    hash_aggressive: str = ""
-    
-    def compute_hashes(self, normalizer: Normalizer):
-        """Precompute normalized hashes."""
-        self.hash_light = self._hash_code(
-            normalizer.normalize(self.code, "light")
-        )
-        self.hash_medium = self._hash_code(
-            normalizer.normalize(self.code, "medium")
-        )
-        self.hash_aggressive = self._hash_code(
-            normalizer.normalize(self.code, "aggressive")
-        )
-    
-    @staticmethod
-    def _hash_code(code: str) -> str:
-        """Generate SHA-256 hash of code."""
-        return hashlib.sha256(code.encode('utf-8')).hexdigest()
-
-
 # Default pattern database (minimal examples)
 # to be created databse own!!
 DEFAULT_PATTERNS = [
@@ -211,28 +210,58 @@ class PlagiarismDetector:
         self.config = config or PlagiarismDetectorConfig.from_env()
         self.normalizer = normalizer or Normalizer()
         
-        # Load and preprocess patterns
-        self.patterns = patterns or DEFAULT_PATTERNS
-        self._preprocess_patterns()
+        # Load and preprocess patterns (copy-on-write, see pattern_index)
+        self.index = PatternIndex(self.normalizer, DEFAULT_PATTERNS if patterns is None else patterns)
         
         # Metrics
         self.total_detections = 0
         self.total_processing_time_ms = 0
+        self.cascade_counts = dict.fromkeys(CASCADE_TIERS, 0)
         
         logging.info(
             "Plagiarism Detector initialized",
             extra={
-                "num_patterns": len(self.patterns),
+                "num_patterns": len(self.index.snapshot),
                 "high_threshold": self.config.high_similarity_threshold,
             }
         )
     
-    def _preprocess_patterns(self):
-        """Precompute normalized hashes for all patterns."""
-        logging.info("Preprocessing pattern database...")
-        for pattern in self.patterns:
-            pattern.compute_hashes(self.normalizer)
-        logging.info(f"Preprocessed {len(self.patterns)} patterns")
+    @property
+    def patterns(self) -> Tuple[AlgorithmPattern, ...]:
+        """Patterns of the current snapshot, in match order."""
+        return self.index.snapshot.patterns
+    
+    def add_pattern(self, pattern: AlgorithmPattern) -> PatternSnapshot:
+        """Add (or replace, by name) one pattern; detections already running keep their snapshot."""
+        return self.index.add(pattern)
+    
+    def remove_patterns(self, names: List[str]) -> int:
+        """Remove patterns by name; returns how many were present."""
+        return self.index.remove(names)
+    
+    def load_patterns(
+        self,
+        patterns: List[AlgorithmPattern],
+        replace: bool = False,
+        workers: Optional[int] = None
+    ) -> PatternSnapshot:
+        """Bulk add with a single snapshot swap; workers > 1 normalizes in worker processes."""
+        return self.index.load(patterns, replace=replace, workers=workers)
+    
+    def load_pattern_file(self, path: str, replace: bool = False, workers: Optional[int] = None) -> PatternSnapshot:
+        """Bulk add from a save_pattern_file() file, reusing its normalized forms when they apply."""
+        return self.index.load(read_patterns(path, self.normalizer), replace=replace, workers=workers)
+    
+    def save_pattern_file(self, path: str) -> int:
+        return save_patterns(self.patterns, path, self.normalizer)
+    
+    def corpus_info(self) -> Dict[str, int]:
+        snapshot = self.index.snapshot
+        return {"version": snapshot.version, "num_patterns": len(snapshot)}
+    
+    def list_patterns(self, offset: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """Summaries (no code) of patterns[offset:offset + limit]."""
+        return [pattern.summary() for pattern in self.patterns[offset:offset + limit]]
     
     
     @staticmethod
@@ -250,13 +279,23 @@ class PlagiarismDetector:
         ratio = min(len1, len2) / max(len1, len2)
         return self.config.length_ratio_min <= ratio <= self.config.length_ratio_max
     
-    def _check_exact_match(self, code: str) -> Optional[PlagiarismMatch]:
-
-        normalized = {
-            "light": self.normalizer.normalize(code, "light"),
-            "medium": self.normalizer.normalize(code, "medium"),
-            "aggressive": self.normalizer.normalize(code, "aggressive"),
+    def _normalize_levels(self, code: str, language: str = "python") -> Dict[str, str]:
+        forms = self.normalizer.normalize_all(code, language)
+        return {
+            "light": forms.light,
+            "medium": forms.medium,
+            "aggressive": forms.aggressive,
         }
+
+    def _check_exact_match(
+        self,
+        code: str,
+        language: str = "python",
+        normalized: Optional[Dict[str, str]] = None,
+        snapshot: Optional[PatternSnapshot] = None
+    ) -> Optional[PlagiarismMatch]:
+
+        normalized = normalized or self._normalize_levels(code, language)
         
         # Compute hashes
         hashes = {
@@ -264,103 +303,154 @@ class PlagiarismDetector:
             for level, norm_code in normalized.items()
         }
         
-        # Check against patterns
-        for pattern in self.patterns:
-            # Check aggressive first (most strict)
-            if hashes["aggressive"] == pattern.hash_aggressive:
-                return PlagiarismMatch(
-                    pattern_name=pattern.name,
-                    similarity=1.0,
-                    match_type="exact",
-                    normalization_level="aggressive",
-                    sources=pattern.sources,
-                    confidence=1.0
-                )
-            
-            # Check medium
-            if hashes["medium"] == pattern.hash_medium:
-                return PlagiarismMatch(
-                    pattern_name=pattern.name,
-                    similarity=1.0,
-                    match_type="exact",
-                    normalization_level="medium",
-                    sources=pattern.sources,
-                    confidence=1.0
-                )
-            
-            # Check light
-            if hashes["light"] == pattern.hash_light:
-                return PlagiarismMatch(
-                    pattern_name=pattern.name,
-                    similarity=1.0,
-                    match_type="exact",
-                    normalization_level="light",
-                    sources=pattern.sources,
-                    confidence=0.95  # Slightly lower confidence for light match
-                )
+        # Hash lookup; the earliest matching pattern wins, aggressive level first
+        snapshot = snapshot or self.index.snapshot
+        found = snapshot.exact_match(hashes)
+        if found:
+            pattern, level = found
+            return PlagiarismMatch(
+                pattern_name=pattern.name,
+                similarity=1.0,
+                match_type="exact",
+                normalization_level=level,
+                sources=pattern.sources,
+                confidence=0.95 if level == "light" else 1.0  # Slightly lower confidence for light match
+            )
         
         return None
 
     
+    @traced("difflib.text")
     def _calculate_similarity(self, code1: str, code2: str) -> float:
         return difflib.SequenceMatcher(None, code1, code2).ratio()
+
+    @staticmethod
+    def _multiset_bound(counts1: Counter, counts2: Counter, total: int) -> float:
+        """quick_ratio() from precomputed character counts: 2 * |A ∩ B| / (|A| + |B|)."""
+        if len(counts1) > len(counts2):
+            counts1, counts2 = counts2, counts1
+        common = sum(min(n, counts2.get(ch, 0)) for ch, n in counts1.items())
+        return 2.0 * common / total
     
     def _check_similarity(
         self,
         code: str,
-        max_patterns: Optional[int] = None
+        max_patterns: Optional[int] = None,
+        language: str = "python",
+        normalized: Optional[Dict[str, str]] = None,
+        snapshot: Optional[PatternSnapshot] = None
     ) -> Tuple[List[PlagiarismMatch], Dict[str, float]]:
+        """
+        Fuzzy match against the patterns through a cascade of upper bounds on
+        SequenceMatcher.ratio(), cheapest first:
+
+            length_bound    2 * min(len) / (len1 + len2)   (real_quick_ratio)
+            multiset_bound  shared character counts        (quick_ratio)
+            top_k_cut       bound below the k-th best pattern found so far
+            full_ratio      SequenceMatcher.ratio()
+
+        The two bounds are computed for every (pattern, level) pair first and
+        pairs below low_similarity_threshold are dropped. The rest are refined
+        best bound first, so once similarity_top_k patterns have matched, the
+        remaining pairs whose bound is under the k-th best similarity are cut
+        without a ratio. Reported matches are the same as with the full ratio
+        everywhere. The per-level maxima are returned to clients as
+        PlagiarismResult.max_similarity_light/medium/aggressive (and in the
+        /analyze payload), so by default (exact_similarity_maxima) pairs that
+        could still raise a level's maximum keep being refined and the output
+        is the uncascaded one exactly. With exact_similarity_maxima=False
+        more pairs are cut and those three fields, plus the CLEAN confidence
+        derived from them, become lower bounds.
+        """
 
-        matches = []
         max_similarities = {
             "light": 0.0,
             "medium": 0.0,
             "aggressive": 0.0,
         }
+        counts = dict.fromkeys(CASCADE_TIERS, 0)
+        top_k = self.config.similarity_top_k
+        low_threshold = self.config.low_similarity_threshold
+        exact_maxima = self.config.exact_similarity_maxima
         
         # Normalize submission at all levels
-        normalized_submission = {
-            "light": self.normalizer.normalize(code, "light"),
-            "medium": self.normalizer.normalize(code, "medium"),
-            "aggressive": self.normalizer.normalize(code, "aggressive"),
-        }
+        normalized_submission = normalized or self._normalize_levels(code, language)
+        submission_counts: Dict[str, Counter] = {}
         
         # Limit patterns if requested
-        patterns_to_check = self.patterns[:max_patterns] if max_patterns else self.patterns
+        patterns = (snapshot or self.index.snapshot).patterns
+        patterns_to_check = patterns[:max_patterns] if max_patterns else patterns
         
-        for pattern in patterns_to_check:
+        # Tiers 1-2: bounds for every pair
+        candidates = []  # (bound, pattern index, level)
+        pattern_forms = []
+        for idx, pattern in enumerate(patterns_to_check):
             # Normalize pattern at all levels (cached in pattern object)
-            pattern_normalized = {
-                "light": self.normalizer.normalize(pattern.code, "light"),
-                "medium": self.normalizer.normalize(pattern.code, "medium"),
-                "aggressive": self.normalizer.normalize(pattern.code, "aggressive"),
-            }
-            
-            # Calculate similarity at each level
-            similarities = {}
+            pattern_normalized = pattern.normalized or self._normalize_levels(pattern.code)
+            pattern_forms.append(pattern_normalized)
             for level in ["light", "medium", "aggressive"]:
+                counts["pairs"] += 1
+                text1, text2 = normalized_submission[level], pattern_normalized[level]
+                
                 # Length screening
-                if not self._should_compare(
-                    normalized_submission[level],
-                    pattern_normalized[level]
-                ):
-                    similarities[level] = 0.0
+                if not self._should_compare(text1, text2):
+                    counts["length_screen"] += 1
                     continue
                 
-                sim = self._calculate_similarity(
-                    normalized_submission[level],
-                    pattern_normalized[level]
-                )
-                similarities[level] = sim
-                max_similarities[level] = max(max_similarities[level], sim)
+                total = len(text1) + len(text2)
+                bound = 2.0 * min(len(text1), len(text2)) / total
+                if bound < low_threshold and not exact_maxima:
+                    counts["length_bound"] += 1
+                    continue
+                
+                if level not in submission_counts:
+                    submission_counts[level] = Counter(text1)
+                pattern_counts = pattern.char_counts.get(level) or Counter(text2)
+                bound = self._multiset_bound(submission_counts[level], pattern_counts, total)
+                if bound < low_threshold and not exact_maxima:
+                    counts["multiset_bound"] += 1
+                    continue
+                candidates.append((bound, idx, level))
+        
+        # Tiers 3-4: full ratio, best bound first. Ranking uses the reported
+        # (rounded) similarity with pattern order breaking ties, as detect does.
+        candidates.sort(key=lambda c: (-c[0], c[1]))
+        similarities: Dict[int, Dict[str, float]] = {}
+        top: Dict[int, Tuple[float, int]] = {}  # best top_k patterns so far -> rank key
+        for bound, idx, level in candidates:
+            full = bool(top_k) and len(top) >= top_k
+            cut = min(top.values())[0] if full else low_threshold
+            if (round(bound, 3) < cut if full else bound < cut) and (
+                not exact_maxima or bound <= max_similarities[level]
+            ):
+                counts["top_k_cut" if full else "multiset_bound"] += 1
+                continue
+            
+            counts["full_ratio"] += 1
+            sim = self._calculate_similarity(normalized_submission[level], pattern_forms[idx][level])
+            similarities.setdefault(idx, {})[level] = sim
+            max_similarities[level] = max(max_similarities[level], sim)
             
+            best = max(similarities[idx].values())
+            if best >= low_threshold:
+                top[idx] = (round(best, 3), -idx)
+                if top_k and len(top) > top_k:
+                    del top[min(top, key=top.get)]
+        
+        matches = []
+        for idx in sorted(top, key=top.get, reverse=True):
             # Take max similarity across all levels for this pattern
-            max_sim = max(similarities.values())
+            max_sim = max(similarities[idx].values())
             
             # Create match if above threshold
-            if max_sim >= self.config.low_similarity_threshold:
+            if max_sim >= low_threshold:
+                pattern = patterns_to_check[idx]
                 # Determine which level had highest similarity
-                best_level = max(similarities, key=similarities.get)
+                level_sims = similarities[idx]
+                best_level = max(
+                    (level for level in ["light", "medium", "aggressive"] if level in level_sims),
+                    key=level_sims.get
+                )
                 
                 # Determine match type
                 if max_sim >= self.config.high_similarity_threshold:
@@ -382,17 +472,18 @@ class PlagiarismDetector:
                     confidence=confidence
                 ))
         
-        # Sort matches by similarity (highest first)
-        matches.sort(key=lambda m: m.similarity, reverse=True)
+        for tier, n in counts.items():
+            self.cascade_counts[tier] += n
         
         return matches, max_similarities
     
     
-    def _calculate_structural_similarity(self, code1: str, code2: str) -> float:
+    @traced("difflib.structural")
+    def _calculate_structural_similarity(self, code1: str, code2: str, tree2: Optional[str] = None) -> float:
 
         try:
             tree1 = ast.dump(ast.parse(code1))
-            tree2 = ast.dump(ast.parse(code2))
+            tree2 = tree2 or ast.dump(ast.parse(code2))
             return difflib.SequenceMatcher(None, tree1, tree2).ratio()
         except SyntaxError:
             return 0.0
@@ -401,7 +492,66 @@ class PlagiarismDetector:
             return 0.0
     
     
-    def detect(self, code: str) -> PlagiarismResult:
+    def search(
+        self,
+        code: str,
+        language: str = "python",
+        normalized: Optional[Dict[str, str]] = None,
+        snapshot: Optional[PatternSnapshot] = None
+    ) -> PatternSearch:
+        """
+        Exact, fuzzy and structural search of one snapshot of the corpus (the
+        current one by default). detect() turns this into a verdict; shard
+        processes run it on their partition (see sharded_detector).
+        """
+        # One snapshot for the whole search, however the corpus changes meanwhile
+        snapshot = snapshot or self.index.snapshot
+        normalized = normalized or self._normalize_levels(code, language)
+        
+        # Step 1: Check for exact match (fastest)
+        exact_match = self._check_exact_match(code, language, normalized, snapshot)
+        exact_order = snapshot.order[exact_match.pattern_name] if exact_match else None
+        if exact_match and self.config.enable_early_termination:
+            return PatternSearch(
+                exact_match=exact_match,
+                matches=[],
+                max_similarities={"light": 1.0, "medium": 1.0, "aggressive": 1.0},
+                structural_similarity=1.0,
+                terminated_early=True,
+                exact_order=exact_order,
+            )
+        
+        # Step 2: Fuzzy similarity check
+        similarity_matches, max_similarities = self._check_similarity(
+            code,
+            max_patterns=self.config.max_patterns_to_check,
+            language=language,
+            normalized=normalized,
+            snapshot=snapshot
+        )
+        
+        # Step 3: Structural similarity (for best match only; ast-based, so Python only)
+        best_match = exact_match or (similarity_matches[0] if similarity_matches else None)
+        structural_similarity = 0.0
+        if best_match and getattr(language, "value", language) == "python":
+            pattern = snapshot.get(best_match.pattern_name)
+            if pattern and pattern.structure():
+                structural_similarity = self._calculate_structural_similarity(
+                    code, pattern.code, pattern.structure()
+                )
+        
+        return PatternSearch(
+            exact_match=exact_match,
+            matches=similarity_matches,
+            max_similarities=max_similarities,
+            structural_similarity=structural_similarity,
+            exact_order=exact_order,
+            match_orders=[snapshot.order[match.pattern_name] for match in similarity_matches],
+        )
+    
+    
+    @timed("plagiarism")
+    def detect(self, code: str, language: str = "python") -> PlagiarismResult:
 
         start_time = time.time()
         original_length = len(code)
@@ -418,10 +568,12 @@ class PlagiarismDetector:
                 logging.warning(f"Code truncated from {len(code)} to {self.config.max_code_length}")
                 code = code[:self.config.max_code_length]
             
-            # Step 1: Check for exact match (fastest)
-            exact_match = self._check_exact_match(code)
+            # Steps 1-3: exact, fuzzy and structural search of the pattern corpus
+            normalized = self._normalize_levels(code, language)
+            search = self.search(code, language, normalized)
+            exact_match = search.exact_match
             
-            if exact_match and self.config.enable_early_termination:
+            if search.terminated_early:
                 # Early termination on exact match
                 processing_time_ms = int((time.time() - start_time) * 1000)
                 self.total_detections += 1
@@ -429,7 +581,7 @@ class PlagiarismDetector:
                 
                 # Generate hash
                 normalized_hash = self._hash_code(
-                    self.normalizer.normalize(code, "aggressive")
+                    normalized["aggressive"]
                 )
                 
                 return PlagiarismResult(
@@ -449,18 +601,14 @@ class PlagiarismDetector:
                     recommendations=["BLOCK_AND_REPORT: Exact copy of known algorithm"]
                 )
             
-            # Step 2: Fuzzy similarity check
-            similarity_matches, max_similarities = self._check_similarity(
-                code,
-                max_patterns=self.config.max_patterns_to_check
-            )
-            
             # Combine exact match with similarity matches if exists
             all_matches = [exact_match] if exact_match else []
-            all_matches.extend(similarity_matches)
+            all_matches.extend(search.matches)
             
             # Get best match
             best_match = all_matches[0] if all_matches else None
+            max_similarities = search.max_similarities
+            structural_similarity = search.structural_similarity
             
             # Calculate overall similarity
             overall_similarity = max(
@@ -469,16 +617,6 @@ class PlagiarismDetector:
                 max_similarities["aggressive"]
             )
             
-            # Step 3: Structural similarity (for best match only)
-            structural_similarity = 0.0
-            if best_match:
-                pattern_code = next(
-                    (p.code for p in self.patterns if p.name == best_match.pattern_name),
-                    None
-                )
-                if pattern_code:
-                    structural_similarity = self._calculate_structural_similarity(code, pattern_code)
-            
             # Determine verdict and risk level
             if overall_similarity >= self.config.high_similarity_threshold:
                 is_plagiarized = True
@@ -527,7 +665,7 @@ class PlagiarismDetector:
             
             # Generate hash
             normalized_hash = self._hash_code(
-                self.normalizer.normalize(code, "aggressive")
+                normalized["aggressive"]
             )
             
             # Build result
@@ -549,7 +687,7 @@ class PlagiarismDetector:
             )
             
             # Log
-            logging.info(
+            logger.info(
                 "Plagiarism detection complete",
                 extra={
                     "is_plagiarized": is_plagiarized,
@@ -564,26 +702,18 @@ class PlagiarismDetector:
         
         except ValueError as e:
             logging.error(f"Validation error in plagiarism detection: {e}")
-            raise CustomException(f"PLAGIARISM_DETECTION_VALIDATION_ERROR: {str(e)}", sys)
+            raise CustomException(str(e), code=ErrorCode.PLAGIARISM_DETECTION_VALIDATION_ERROR)
         
         except Exception as e:
             logging.error(f"Plagiarism detection failed: {e}")
-            raise CustomException(f"PLAGIARISM_DETECTION_ERROR: {str(e)}", sys)
+            raise CustomException(str(e), code=ErrorCode.PLAGIARISM_DETECTION_ERROR)
     
-    def compare_submissions(self, code1: str, code2: str) -> ComparisonResult:
+    def compare_submissions(self, code1: str, code2: str, language: str = "python") -> ComparisonResult:
         
         try:
             # Normalize both at all levels
-            norm1 = {
-                "light": self.normalizer.normalize(code1, "light"),
-                "medium": self.normalizer.normalize(code1, "medium"),
-                "aggressive": self.normalizer.normalize(code1, "aggressive"),
-            }
-            norm2 = {
-                "light": self.normalizer.normalize(code2, "light"),
-                "medium": self.normalizer.normalize(code2, "medium"),
-                "aggressive": self.normalizer.normalize(code2, "aggressive"),
-            }
+            norm1 = self._normalize_levels(code1, language)
+            norm2 = self._normalize_levels(code2, language)
             
             # Calculate similarity at each level
             similarity_by_level = {}
@@ -594,7 +724,10 @@ class PlagiarismDetector:
                 )
             
             # Structural similarity
-            structural_sim = self._calculate_structural_similarity(code1, code2)
+            structural_sim = (
+                self._calculate_structural_similarity(code1, code2)
+                if getattr(language, "value", language) == "python" else 0.0
+            )
             
             # Overall similarity (max across levels)
             overall_sim = max(similarity_by_level.values())
@@ -622,7 +755,7 @@ class PlagiarismDetector:
         
         except Exception as e:
             logging.error(f"Submission comparison failed: {e}")
-            raise CustomException(f"COMPARISON_ERROR: {str(e)}", sys)
+            raise CustomException(str(e), code=ErrorCode.COMPARISON_ERROR)
     
     
     def get_metrics(self) -> Dict[str, Any]:
@@ -631,18 +764,22 @@ class PlagiarismDetector:
             round(self.total_processing_time_ms / self.total_detections, 2)
             if self.total_detections > 0 else 0.0
         )
+        corpus = self.corpus_info()
         
         return {
             "total_detections": self.total_detections,
             "total_processing_time_ms": self.total_processing_time_ms,
             "avg_processing_time_ms": avg_time,
-            "num_patterns": len(self.patterns),
+            "num_patterns": corpus["num_patterns"],
+            "pattern_index_version": corpus["version"],
+            **{f"cascade_{tier}": n for tier, n in self.cascade_counts.items()},
         }
     
     def reset_metrics(self):
         """Reset metrics counters."""
         self.total_detections = 0
         self.total_processing_time_ms = 0
+        self.cascade_counts = dict.fromkeys(CASCADE_TIERS, 0)
 
 
 if __name__ == "__main__":
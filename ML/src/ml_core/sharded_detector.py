@@ -0,0 +1,417 @@
+"""
+Pattern corpus hash-partitioned across local shard processes.
+
+Each shard process owns a PlagiarismDetector over its slice of the corpus
+(pattern name -> crc32 % num_shards) with its own indexes. The coordinator,
+ShardedPlagiarismDetector, normalizes a submission once, fans the forms out
+to every shard, and merges the per-shard PatternSearch results into the
+verdict detect() would give over the whole corpus:
+
+    exact match     earliest pattern in corpus order
+    similarity      per-shard top-k lists merged by (similarity, corpus order)
+    max similarity  per-level maximum over shards
+    structural      from the shard that owns the merged best match
+
+Every shard gets `shard_timeout_s` to answer; a late or failed shard is
+left out of the merge (counted in get_metrics) and the request fails only
+when no shard answered. max_patterns_to_check applies per shard, so each
+added shard adds that much searched corpus at the same latency.
+"""
+from __future__ import annotations
+import os
+import time
+import zlib
+import itertools
+import threading
+import multiprocessing as mp
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Optional, List, Dict, Any, Tuple
+
+from src.logger import logging, get_logger
+from src.exception import CustomException, ErrorCode
+from src.components.normalization import Normalizer
+from src.ml_core.pattern_index import AlgorithmPattern, PatternSnapshot, read_patterns
+from src.ml_core.plagiarism_detector import (
+    PlagiarismDetector, PlagiarismDetectorConfig, PatternSearch, DEFAULT_PATTERNS, CASCADE_TIERS,
+)
+
+logger = get_logger(__name__)
+
+# 1 = no sharding; the API starts ShardedPlagiarismDetector only above that
+DEFAULT_NUM_SHARDS = int(os.getenv("PLAGIARISM_SHARDS", 1))
+DEFAULT_SHARD_TIMEOUT_S = float(os.getenv("PLAGIARISM_SHARD_TIMEOUT_S", 5.0))
+# Corpus updates normalize whole pattern batches, so they get longer than a search
+DEFAULT_UPDATE_TIMEOUT_S = float(os.getenv("PLAGIARISM_UPDATE_TIMEOUT_S", 60.0))
+
+
+def shard_of(name: str, num_shards: int) -> int:
+    """Owning shard of a pattern name; crc32 so every process agrees."""
+    return zlib.crc32(name.encode("utf-8")) % num_shards
+
+
+# ----------------- Shard process -----------------
+def _shard_main(conn, shard_id: int, config: PlagiarismDetectorConfig, normalizer_settings: Dict[str, Any]):
+    """Serve requests for one partition until "stop" or the coordinator goes away."""
+    detector = PlagiarismDetector(
+        config=config,
+        normalizer=Normalizer(**normalizer_settings),
+        patterns=[],
+    )
+    ops = {
+        "search": detector.search,
+        "add": lambda pattern, order: len(detector.index.add(pattern, order)),
+        "remove": detector.remove_patterns,
+        "load": lambda patterns, replace, orders: len(detector.index.load(patterns, replace=replace, orders=orders)),
+        "patterns": lambda: list(detector.patterns),
+        "list": detector.list_patterns,
+        "metrics": detector.get_metrics,
+        "reset_metrics": detector.reset_metrics,
+    }
+    while True:
+        try:
+            request_id, op, args = conn.recv()
+        except (EOFError, OSError):
+            break
+        if op == "stop":
+            break
+        try:
+            conn.send((request_id, True, ops[op](*args)))
+        except CustomException as e:
+            conn.send((request_id, False, (e.code.value, e.detail)))
+        except Exception as e:
+            conn.send((request_id, False, (ErrorCode.PLAGIARISM_DETECTION_ERROR.value, f"shard {shard_id}: {e}")))
+    conn.close()
+
+
+class _ShardClient:
+    """Coordinator side of one shard: request ids, a receiver thread, one Future per call."""
+
+    def __init__(self, shard_id: int, ctx, config: PlagiarismDetectorConfig, normalizer_settings: Dict[str, Any]):
+        self.shard_id = shard_id
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_shard_main,
+            args=(child_conn, shard_id, config, normalizer_settings),
+            name=f"plagiarism-shard-{shard_id}",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+        self._ids = itertools.count()
+        self._pending: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+        self._receiver = threading.Thread(target=self._receive, name=f"shard-{shard_id}-recv", daemon=True)
+        self._receiver.start()
+
+    def _receive(self):
+        while True:
+            try:
+                request_id, ok, payload = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                future = self._pending.pop(request_id, None)
+            if future is None:
+                continue  # caller already gave up (timeout)
+            if ok:
+                future.set_result(payload)
+            else:
+                code, detail = payload
+                future.set_exception(CustomException(detail, code=ErrorCode(code)))
+
+        # Shard is gone: fail whatever is still waiting
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(CustomException(
+                f"shard {self.shard_id} exited", code=ErrorCode.PLAGIARISM_DETECTION_ERROR
+            ))
+
+    def call(self, op: str, *args) -> Future:
+        future: Future = Future()
+        with self._lock:
+            if not self.process.is_alive():
+                future.set_exception(CustomException(
+                    f"shard {self.shard_id} is not running", code=ErrorCode.PLAGIARISM_DETECTION_ERROR
+                ))
+                return future
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            future.request_id = request_id
+            try:
+                self.conn.send((request_id, op, args))
+            except (OSError, ValueError) as e:
+                del self._pending[request_id]
+                future.set_exception(CustomException(
+                    f"shard {self.shard_id}: {e}", code=ErrorCode.PLAGIARISM_DETECTION_ERROR
+                ))
+        return future
+
+    def abandon(self, future: Future):
+        with self._lock:
+            self._pending.pop(getattr(future, "request_id", None), None)
+
+    def stop(self, timeout: float = 5.0):
+        try:
+            with self._lock:
+                self.conn.send((None, "stop", ()))
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+
+# ----------------- Coordinator -----------------
+class ShardedPlagiarismDetector(PlagiarismDetector):
+    """
+    Drop-in PlagiarismDetector whose corpus lives in shard processes.
+    detect() and compare_submissions() behave as in the base class; corpus
+    updates are routed to the owning shards and return corpus_info().
+    """
+
+    def __init__(
+        self,
+        num_shards: int = DEFAULT_NUM_SHARDS,
+        config: Optional[PlagiarismDetectorConfig] = None,
+        normalizer: Optional[Normalizer] = None,
+        patterns: Optional[List[AlgorithmPattern]] = None,
+        shard_timeout_s: float = DEFAULT_SHARD_TIMEOUT_S,
+        update_timeout_s: float = DEFAULT_UPDATE_TIMEOUT_S,
+    ):
+        if num_shards < 1:
+            raise ValueError("num_shards must be at least 1")
+        # The coordinator keeps no patterns itself
+        super().__init__(config=config, normalizer=normalizer, patterns=[])
+        self.num_shards = num_shards
+        self.shard_timeout_s = shard_timeout_s
+        self.update_timeout_s = update_timeout_s
+        self.shard_timeouts = 0
+        self.shard_errors = 0
+        self._version = 0
+        self._seq = 0  # global corpus order, handed to the shards with each pattern
+        self._counts = [0] * num_shards
+        self._update_lock = threading.Lock()
+
+        ctx = mp.get_context("spawn")
+        # Same normalizer as the coordinator's, so shard pattern forms match submission forms
+        settings = self.normalizer.settings
+        self.shards = [_ShardClient(i, ctx, self.config, settings) for i in range(num_shards)]
+        self.load_patterns(DEFAULT_PATTERNS if patterns is None else patterns)
+
+        logging.info(
+            "Sharded Plagiarism Detector initialized",
+            extra={"num_shards": num_shards, "num_patterns": sum(self._counts), "shard_timeout_s": shard_timeout_s}
+        )
+
+    # ---- fan-out ----
+    def _gather(self, futures: List[Future], timeout: Optional[float]) -> List[Optional[Any]]:
+        """Results per shard; None for shards that timed out or failed (their futures are abandoned)."""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        results: List[Optional[Any]] = []
+        for shard, future in zip(self.shards, futures):
+            remaining = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            try:
+                results.append(future.result(timeout=remaining))
+            except FutureTimeout:
+                shard.abandon(future)
+                self.shard_timeouts += 1
+                logger.warning("Shard timed out", extra={"shard": shard.shard_id, "timeout_s": timeout})
+                results.append(None)
+            except CustomException as e:
+                self.shard_errors += 1
+                logger.warning(f"Shard failed: {e}", extra={"shard": shard.shard_id})
+                results.append(None)
+        return results
+
+    def _update(self, calls: Dict[int, Tuple]) -> List[Any]:
+        """
+        Run one update per listed shard and wait for all of them within
+        update_timeout_s; errors propagate, a timeout as a CustomException.
+        """
+        futures = {shard_id: self.shards[shard_id].call(*call) for shard_id, call in calls.items()}
+        deadline = time.perf_counter() + self.update_timeout_s
+        results = []
+        for shard_id, future in futures.items():
+            try:
+                results.append((shard_id, future.result(timeout=max(0.0, deadline - time.perf_counter()))))
+            except FutureTimeout:
+                self.shards[shard_id].abandon(future)
+                self.shard_timeouts += 1
+                logger.warning("Shard update timed out", extra={"shard": shard_id, "timeout_s": self.update_timeout_s})
+                raise CustomException(
+                    f"shard {shard_id} did not apply the update within {self.update_timeout_s}s",
+                    code=ErrorCode.PLAGIARISM_DETECTION_ERROR,
+                )
+        return results
+
+    # ---- search ----
+    def search(
+        self,
+        code: str,
+        language: str = "python",
+        normalized: Optional[Dict[str, str]] = None,
+        snapshot: Optional[PatternSnapshot] = None
+    ) -> PatternSearch:
+        normalized = normalized or self._normalize_levels(code, language)
+        futures = [shard.call("search", code, language, normalized) for shard in self.shards]
+        answered = [
+            (shard_id, result)
+            for shard_id, result in enumerate(self._gather(futures, self.shard_timeout_s))
+            if result is not None
+        ]
+        if not answered:
+            raise CustomException("No pattern shard answered", code=ErrorCode.PLAGIARISM_DETECTION_ERROR)
+        return self._merge(answered)
+
+    def _merge(self, answered: List[Tuple[int, PatternSearch]]) -> PatternSearch:
+        exact = [result for _, result in answered if result.exact_match]
+        if exact:
+            owner = min(exact, key=lambda result: result.exact_order)
+            if owner.terminated_early:
+                return owner
+
+        ranked = sorted(
+            (
+                (match, order, result)
+                for _, result in answered
+                for match, order in zip(result.matches, result.match_orders)
+            ),
+            key=lambda item: (-item[0].similarity, item[1]),
+        )
+        top_k = self.config.similarity_top_k
+        if top_k:
+            ranked = ranked[:top_k]
+        max_similarities = {
+            level: max(result.max_similarities[level] for _, result in answered)
+            for level in ("light", "medium", "aggressive")
+        }
+
+        if not exact:
+            owner = ranked[0][2] if ranked else None
+
+        return PatternSearch(
+            exact_match=owner.exact_match if exact else None,
+            matches=[match for match, _, _ in ranked],
+            max_similarities=max_similarities,
+            structural_similarity=owner.structural_similarity if owner else 0.0,
+            exact_order=owner.exact_order if exact else None,
+            match_orders=[order for _, order, _ in ranked],
+        )
+
+    # ---- corpus updates ----
+    def _applied(self, counts: List[Tuple[int, int]]) -> Dict[str, int]:
+        for shard_id, count in counts:
+            self._counts[shard_id] = count
+        self._version += 1
+        return self.corpus_info()
+
+    def add_pattern(self, pattern: AlgorithmPattern) -> Dict[str, int]:
+        with self._update_lock:
+            self._seq += 1
+            return self._applied(self._update({shard_of(pattern.name, self.num_shards): ("add", pattern, self._seq)}))
+
+    def remove_patterns(self, names: List[str]) -> int:
+        by_shard: Dict[int, List[str]] = {}
+        for name in names:
+            by_shard.setdefault(shard_of(name, self.num_shards), []).append(name)
+        with self._update_lock:
+            removed = self._update({shard_id: ("remove", part) for shard_id, part in by_shard.items()})
+            for shard_id, n in removed:
+                self._counts[shard_id] -= n
+            self._version += 1
+        return sum(n for _, n in removed)
+
+    def load_patterns(
+        self,
+        patterns: List[AlgorithmPattern],
+        replace: bool = False,
+        workers: Optional[int] = None
+    ) -> Dict[str, int]:
+        """Partition and load; shards normalize their parts in parallel, so `workers` is not used."""
+        with self._update_lock:
+            parts: Dict[int, Tuple[List, List]] = {i: ([], []) for i in range(self.num_shards)} if replace else {}
+            for pattern in patterns:
+                self._seq += 1
+                part, orders = parts.setdefault(shard_of(pattern.name, self.num_shards), ([], []))
+                part.append(pattern)
+                orders.append(self._seq)
+            return self._applied(self._update({
+                shard_id: ("load", part, replace, orders) for shard_id, (part, orders) in parts.items()
+            }))
+
+    def load_pattern_file(self, path: str, replace: bool = False, workers: Optional[int] = None) -> Dict[str, int]:
+        return self.load_patterns(read_patterns(path, self.normalizer), replace=replace)
+
+    # ---- corpus reads ----
+    @property
+    def patterns(self) -> Tuple[AlgorithmPattern, ...]:
+        """Every pattern, shard by shard (copies the whole corpus into this process)."""
+        return tuple(p for _, part in self._update({i: ("patterns",) for i in range(self.num_shards)}) for p in part)
+
+    def corpus_info(self) -> Dict[str, int]:
+        return {"version": self._version, "num_patterns": sum(self._counts)}
+
+    def list_patterns(self, offset: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        parts = self._update({i: ("list", 0, offset + limit) for i in range(self.num_shards)})
+        return [summary for _, part in parts for summary in part][offset:offset + limit]
+
+    # ---- metrics / lifecycle ----
+    def get_metrics(self) -> Dict[str, Any]:
+        metrics = super().get_metrics()
+        shard_metrics = [m for m in self._gather([s.call("metrics") for s in self.shards], self.shard_timeout_s) if m]
+        for tier in CASCADE_TIERS:
+            metrics[f"cascade_{tier}"] = sum(m.get(f"cascade_{tier}", 0) for m in shard_metrics)
+        metrics.update({
+            "num_shards": self.num_shards,
+            "shards_alive": sum(1 for s in self.shards if s.process.is_alive()),
+            "shard_timeouts": self.shard_timeouts,
+            "shard_errors": self.shard_errors,
+        })
+        return metrics
+
+    def reset_metrics(self):
+        super().reset_metrics()
+        self.shard_timeouts = 0
+        self.shard_errors = 0
+        self._gather([s.call("reset_metrics") for s in self.shards], self.shard_timeout_s)
+
+    def close(self):
+        for shard in self.shards:
+            shard.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    import json
+    from benchmarks.corpus import generate_corpus
+
+    n = int(os.getenv("SHARD_DEMO_PATTERNS", 300))
+    corpus = generate_corpus(n + 10, 42)
+    patterns = [AlgorithmPattern(f"corpus_{i}", "synthetic", item.code, ["demo"]) for i, item in enumerate(corpus[:n])]
+    submissions = [item.code for item in corpus[n:]]
+    config = PlagiarismDetectorConfig(max_patterns_to_check=None)
+
+    single = PlagiarismDetector(config=config, patterns=[AlgorithmPattern(p.name, p.category, p.code, p.sources) for p in patterns])
+    start = time.perf_counter()
+    expected = [single.detect(code) for code in submissions]
+    print(f"single process: {(time.perf_counter() - start) / len(submissions) * 1000:.1f} ms/detect over {n} patterns")
+
+    for shards in (1, 2, 4):
+        with ShardedPlagiarismDetector(num_shards=shards, config=config, patterns=patterns, shard_timeout_s=60) as sharded:
+            start = time.perf_counter()
+            results = [sharded.detect(code) for code in submissions]
+            elapsed = (time.perf_counter() - start) / len(submissions) * 1000
+            same = sum(
+                r.risk_level == e.risk_level and [m.pattern_name for m in r.matches] == [m.pattern_name for m in e.matches]
+                for r, e in zip(results, expected)
+            )
+            print(f"{shards} shards: {elapsed:.1f} ms/detect, {same}/{len(submissions)} verdicts identical")
+            print(json.dumps({k: v for k, v in sharded.get_metrics().items() if k.startswith(("num_", "shard"))}))
@@ -0,0 +1,281 @@
+from __future__ import annotations
+import os
+import sys
+import json
+import time
+from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+from pymongo import UpdateOne  # type: ignore
+
+from src.logger import logging
+from src.exception import CustomException, ErrorCode
+from src.components.data_ingestion import DataIngestion, IngestionConfig, MongoCheckpoint, Language
+from src.components.normalization import Normalizer
+from src.ml_core.plagiarism_detector import PlagiarismDetector
+from src.ml_core.decision_engine import DecisionEngine, DecisionConfig
+from src.pipeline.stage_runner import Envelope, Stage, StagePipeline
+
+
+@dataclass
+class ReanalysisConfig:
+    """Configuration for an offline re-scoring run over a submissions collection."""
+
+    db_url: str = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+    db_name: str = os.getenv("MONGO_DB", "coding_database")
+    collection_name: str = os.getenv("MONGO_COLLECTION", "submissions")
+    query: Dict[str, Any] = field(default_factory=dict)
+
+    batch_size: int = 32          # submissions per envelope
+    queue_size: int = 4           # envelopes buffered between stages
+    cpu_workers: int = max(1, (os.cpu_count() or 2) - 1)  # processes for normalize / plagiarism
+
+    checkpoint_path: Optional[str] = None  # JSON file; resumes from it when present
+    checkpoint_field: str = "_id"          # "_id" or "timestamp"
+
+    result_field: str = "analysis"         # field written back on each document
+    default_mode: str = "practice"         # decision policy when the submission mode has none
+    write_results: bool = True
+
+
+# ----------------- process-pool workers -----------------
+# Detectors are created once per worker process by the pool initializer.
+_worker_normalizer: Optional[Normalizer] = None
+_worker_plag_detector: Optional[PlagiarismDetector] = None
+
+
+def _init_cpu_worker():
+    global _worker_normalizer, _worker_plag_detector
+    _worker_normalizer = Normalizer()
+    _worker_plag_detector = PlagiarismDetector(normalizer=_worker_normalizer)
+
+
+def normalize_records(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Light normalization for the AI detector (CPU-bound, runs in the pool)."""
+    for record in records:
+        try:
+            record["normalized"] = _worker_normalizer.normalize(record["submission"].code, "light")
+        except Exception as e:
+            record["error"] = f"normalize: {e}"
+    return records
+
+
+def plagiarism_records(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Plagiarism detection (CPU-bound, runs in the pool)."""
+    for record in records:
+        if "error" in record:
+            continue
+        try:
+            record["plagiarism"] = _worker_plag_detector.detect(record["submission"].code)
+        except Exception as e:
+            record["error"] = f"plagiarism: {e}"
+    return records
+
+
+class ReanalysisPipeline:
+    """
+    Offline re-analysis: ingest -> normalize -> detect -> decide -> write back.
+
+    Submissions are streamed from Mongo with DataIngestion.iter_submissions
+    and passed through bounded queues. Normalization and plagiarism run in a
+    process pool, the perplexity model runs batched in this process via
+    AICodeDetector.detect_batch, and results are written with one unordered
+    bulk_write per batch. After each written batch the checkpoint is saved,
+    so a stopped run resumes where it left off (the last batch may be
+    re-scored; writes are idempotent).
+    """
+
+    def __init__(
+        self,
+        config: Optional[ReanalysisConfig] = None,
+        ingestor: Optional[DataIngestion] = None,
+        ai_detector=None,
+    ):
+        self.config = config or ReanalysisConfig()
+        self.ingestor = ingestor or DataIngestion(IngestionConfig(language=Language.python))
+
+        if ai_detector is None:
+            from src.ml_core.model_loader import get_model_singleton
+            from src.ml_core.code_detector import AICodeDetector
+            model, tokenizer, device = get_model_singleton()
+            ai_detector = AICodeDetector(model=model, tokenizer=tokenizer, device=device)
+        self.ai_detector = ai_detector
+
+        self._decision_engines: Dict[str, DecisionEngine] = {}
+        self._collection = None
+
+    # ---- checkpoint ----
+    def _load_checkpoint(self) -> MongoCheckpoint:
+        path = self.config.checkpoint_path
+        if path and os.path.isfile(path):
+            with open(path) as f:
+                checkpoint = MongoCheckpoint.from_dict(json.load(f))
+            logging.info(f"Resuming re-analysis from checkpoint {checkpoint.last_id}")
+            return checkpoint
+        return MongoCheckpoint(field_name=self.config.checkpoint_field)
+
+    def _save_checkpoint(self, state: Dict[str, Any]):
+        path = self.config.checkpoint_path
+        if not path:
+            return
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    # ---- source ----
+    def _envelopes(self, checkpoint: MongoCheckpoint) -> Iterator[Envelope]:
+        """
+        iter_submissions advances the checkpoint for batch N-1 only when
+        batch N is requested, so the state read right after batch N arrives
+        covers everything before it: committing it once N is written means
+        a restart re-scores at most that one batch.
+        """
+        batches = self.ingestor.iter_submissions(
+            self.config.db_url,
+            self.config.db_name,
+            self.config.collection_name,
+            query=self.config.query,
+            mode=self.config.default_mode,
+            batch_size=self.config.batch_size,
+            checkpoint=checkpoint,
+        )
+        for batch in batches:
+            yield Envelope(
+                records=[{"submission": submission} for submission in batch],
+                context={"resume_state": checkpoint.to_dict()},
+            )
+
+    # ---- in-process stages ----
+    def _ai_stage(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        live = [r for r in records if "error" not in r]
+        results = self.ai_detector.detect_batch(
+            [r["submission"].code for r in live],
+            normalized_codes=[r.get("normalized") for r in live],
+        )
+        for record, result in zip(live, results):
+            if result is None:
+                record["error"] = "ai_detection failed"
+            else:
+                record["ai"] = result
+        return records
+
+    def _engine_for(self, mode: str) -> DecisionEngine:
+        if mode not in self._decision_engines:
+            config = DecisionConfig(mode=mode)
+            if mode not in config.policy_actions:
+                config = DecisionConfig(mode=self.config.default_mode)
+            self._decision_engines[mode] = DecisionEngine(config)
+        return self._decision_engines[mode]
+
+    def _decision_stage(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        for record in records:
+            if "error" in record:
+                continue
+            mode = str(record["submission"].mode)
+            record["decision"] = self._engine_for(mode).decide(record["ai"], record["plagiarism"])
+        return records
+
+    def _result_document(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        analyzed_at = datetime.utcnow().isoformat()
+        if "error" in record:
+            return {"error": record["error"], "analyzed_at": analyzed_at}
+
+        ai, plag, decision = record["ai"], record["plagiarism"], record["decision"]
+        return {
+            "ai": {
+                "is_ai_generated": ai.is_ai_generated,
+                "confidence": ai.confidence,
+                "risk_level": ai.risk_level,
+                "perplexity": ai.perplexity,
+                "weighted_score": ai.weighted_score,
+            },
+            "plagiarism": {
+                "is_plagiarized": plag.is_plagiarized,
+                "confidence": plag.confidence,
+                "risk_level": plag.risk_level,
+                "best_match": plag.best_match.pattern_name if plag.best_match else None,
+                "normalized_hash": plag.normalized_hash,
+            },
+            "decision": {
+                "action": decision.action,
+                "combined_confidence": decision.combined_confidence,
+                "rationale": decision.rationale,
+            },
+            "analyzed_at": analyzed_at,
+        }
+
+    def _write_stage(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not self.config.write_results:
+            return records
+
+        operations = []
+        for record in records:
+            submission = record["submission"]
+            doc_id = submission.metadata.get("_id")
+            doc_filter = {"_id": doc_id} if doc_id is not None else {"submission_id": submission.submission_id}
+            operations.append(UpdateOne(doc_filter, {"$set": {self.config.result_field: self._result_document(record)}}))
+
+        if operations:
+            if self._collection is None:
+                self._collection = self.ingestor._get_mongo_collection(
+                    self.config.db_url, self.config.db_name, self.config.collection_name
+                )
+            self._collection.bulk_write(operations, ordered=False)
+        return records
+
+    def run(self) -> Dict[str, Any]:
+        cfg = self.config
+        checkpoint = self._load_checkpoint()
+        errors = 0
+        start_time = time.time()
+
+        pipeline = StagePipeline(
+            stages=[
+                Stage("normalize", normalize_records, processes=cfg.cpu_workers, initializer=_init_cpu_worker),
+                Stage("plagiarism", plagiarism_records, processes=cfg.cpu_workers, initializer=_init_cpu_worker),
+                Stage("ai_detection", self._ai_stage),
+                Stage("decision", self._decision_stage),
+                Stage("write", self._write_stage),
+            ],
+            queue_size=cfg.queue_size,
+        )
+
+        def _commit(env: Envelope):
+            nonlocal errors
+            errors += sum(1 for r in env.records if "error" in r)
+            self._save_checkpoint(env.context["resume_state"])
+
+        try:
+            report = pipeline.run(self._envelopes(checkpoint), sink=_commit)
+        except CustomException:
+            raise
+        except Exception as e:
+            logging.error(f"Re-analysis run failed: {e}")
+            raise CustomException(str(e), code=ErrorCode.REANALYSIS_ERROR)
+
+        # Source exhausted: the final checkpoint covers everything
+        self._save_checkpoint(checkpoint.to_dict())
+
+        report.update({
+            "processed": checkpoint.processed,
+            "skipped_invalid": checkpoint.skipped,
+            "errors": errors,
+            "last_id": str(checkpoint.last_id),
+        })
+        logging.info(
+            "Re-analysis run complete",
+            extra={
+                "processed": checkpoint.processed,
+                "errors": errors,
+                "latency_ms": int((time.time() - start_time) * 1000),
+            }
+        )
+        return report
+
+
+if __name__ == "__main__":
+    config = ReanalysisConfig(checkpoint_path="reanalysis_checkpoint.json")
+    report = ReanalysisPipeline(config).run()
+    print(json.dumps(report, indent=2))
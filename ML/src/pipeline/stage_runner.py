@@ -0,0 +1,245 @@
+from __future__ import annotations
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from src.logger import logging
+from src.exception import CustomException, ErrorCode
+
+
+@dataclass
+class Envelope:
+    """One batch moving through the pipeline."""
+    records: List[Dict[str, Any]]
+    context: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class StageMetrics:
+    name: str
+    items: int = 0
+    batches: int = 0
+    busy_seconds: float = 0.0
+    max_queue_depth: int = 0
+
+    def to_dict(self, wall_seconds: float) -> Dict[str, Any]:
+        return {
+            "items": self.items,
+            "batches": self.batches,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "items_per_busy_second": round(self.items / self.busy_seconds, 2) if self.busy_seconds else 0.0,
+            "items_per_wall_second": round(self.items / wall_seconds, 2) if wall_seconds else 0.0,
+            "utilization": round(self.busy_seconds / wall_seconds, 3) if wall_seconds else 0.0,
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+
+@dataclass
+class Stage:
+    """
+    A pipeline step: fn(records) -> records, applied to every batch.
+
+    Thread stages run fn in a dedicated thread of this process. Process stages
+    ship batches to a ProcessPoolExecutor (fn, initializer and records must be
+    picklable; put per-process state such as detectors in the initializer)
+    and keep up to `max_in_flight` batches running while preserving order.
+    """
+    name: str
+    fn: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]
+    processes: int = 0  # 0 = run in a thread
+    initializer: Optional[Callable] = None
+    initargs: tuple = ()
+    max_in_flight: Optional[int] = None
+
+
+_END = object()
+
+
+def _timed_call(fn, records):
+    """Runs inside pool workers so busy time excludes queueing and pickling waits."""
+    start = time.perf_counter()
+    out = fn(records)
+    return out, time.perf_counter() - start
+
+
+class StagePipeline:
+    """
+    Streams envelopes through stages connected by bounded queues.
+
+    A full queue blocks the stage in front of it, so memory is bounded by
+    queue_size batches per edge regardless of source size. The first stage
+    error stops the whole run and is re-raised from run().
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = 4, poll_seconds: float = 0.1):
+        if not stages:
+            raise ValueError("Pipeline needs at least one stage")
+        self.stages = stages
+        self.queue_size = queue_size
+        self.poll_seconds = poll_seconds
+        self.metrics: Dict[str, StageMetrics] = {}
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    # ---- queue helpers that give up when the run is stopped ----
+    def _put(self, q: queue.Queue, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=self.poll_seconds)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=self.poll_seconds)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _fail(self, stage_name: str, error: BaseException):
+        if self._error is None:
+            self._error = error
+            logging.error(f"Pipeline stage '{stage_name}' failed: {error}")
+        self._stop.set()
+
+    # ---- stage workers ----
+    def _run_thread_stage(self, stage: Stage, inq: queue.Queue, outq: queue.Queue):
+        metrics = self.metrics[stage.name]
+        try:
+            while True:
+                env = self._get(inq)
+                if env is _END:
+                    break
+                metrics.max_queue_depth = max(metrics.max_queue_depth, inq.qsize() + 1)
+                start = time.perf_counter()
+                env.records = stage.fn(env.records)
+                metrics.busy_seconds += time.perf_counter() - start
+                metrics.items += len(env.records)
+                metrics.batches += 1
+                if not self._put(outq, env):
+                    return
+        except BaseException as e:
+            self._fail(stage.name, e)
+        finally:
+            self._put(outq, _END)
+
+    def _run_process_stage(self, stage: Stage, inq: queue.Queue, outq: queue.Queue):
+        metrics = self.metrics[stage.name]
+        max_in_flight = stage.max_in_flight or stage.processes * 2
+        in_flight = deque()
+
+        def _drain_one():
+            env, future = in_flight.popleft()
+            env.records, busy = future.result()
+            metrics.busy_seconds += busy
+            metrics.items += len(env.records)
+            metrics.batches += 1
+            return self._put(outq, env)
+
+        try:
+            with ProcessPoolExecutor(
+                max_workers=stage.processes,
+                initializer=stage.initializer,
+                initargs=stage.initargs,
+            ) as pool:
+                while True:
+                    env = self._get(inq)
+                    if env is _END:
+                        break
+                    metrics.max_queue_depth = max(metrics.max_queue_depth, inq.qsize() + 1)
+                    in_flight.append((env, pool.submit(_timed_call, stage.fn, env.records)))
+                    if len(in_flight) >= max_in_flight and not _drain_one():
+                        return
+                while in_flight and not self._stop.is_set():
+                    if not _drain_one():
+                        return
+        except BaseException as e:
+            self._fail(stage.name, e)
+        finally:
+            self._put(outq, _END)
+
+    def run(self, source: Iterable[Envelope], sink: Optional[Callable[[Envelope], None]] = None) -> Dict[str, Any]:
+        """
+        Feed every envelope from source through the stages. sink, if given,
+        is called in order for each finished envelope (e.g. to persist a
+        checkpoint after the write stage). Returns a per-stage report.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        self.metrics = {stage.name: StageMetrics(stage.name) for stage in self.stages}
+        self.metrics["source"] = StageMetrics("source")
+        self._stop.clear()
+        self._error = None
+
+        threads = []
+        for idx, stage in enumerate(self.stages):
+            target = self._run_process_stage if stage.processes > 0 else self._run_thread_stage
+            thread = threading.Thread(
+                target=target, args=(stage, queues[idx], queues[idx + 1]), name=f"stage-{stage.name}", daemon=True
+            )
+            thread.start()
+            threads.append(thread)
+
+        def _feed():
+            source_metrics = self.metrics["source"]
+            iterator = iter(source)
+            try:
+                while True:
+                    start = time.perf_counter()
+                    env = next(iterator, _END)
+                    if env is _END:
+                        break
+                    source_metrics.busy_seconds += time.perf_counter() - start
+                    source_metrics.items += len(env.records)
+                    source_metrics.batches += 1
+                    if not self._put(queues[0], env):
+                        break
+            except BaseException as e:
+                self._fail("source", e)
+            finally:
+                self._put(queues[0], _END)
+                close = getattr(iterator, "close", None)
+                if close:
+                    close()
+
+        wall_start = time.perf_counter()
+        feeder = threading.Thread(target=_feed, name="stage-source", daemon=True)
+        feeder.start()
+
+        sink_metrics = StageMetrics("sink")
+        try:
+            while True:
+                env = self._get(queues[-1])
+                if env is _END:
+                    break
+                if sink:
+                    start = time.perf_counter()
+                    sink(env)
+                    sink_metrics.busy_seconds += time.perf_counter() - start
+                sink_metrics.items += len(env.records)
+                sink_metrics.batches += 1
+        except BaseException as e:
+            self._fail("sink", e)
+
+        feeder.join()
+        for thread in threads:
+            thread.join()
+        wall_seconds = time.perf_counter() - wall_start
+        self.metrics["sink"] = sink_metrics
+
+        report = {
+            "wall_seconds": round(wall_seconds, 3),
+            "stages": {name: m.to_dict(wall_seconds) for name, m in self.metrics.items()},
+        }
+
+        if self._error is not None:
+            if isinstance(self._error, CustomException):
+                raise self._error
+            raise CustomException(str(self._error), self._error, code=ErrorCode.PIPELINE_ERROR)
+        return report
@@ -25,23 +25,35 @@ class Player:
 # ----------------- Matchmaking Queue -----------------
 
 class MatchmakingQueue:
-    def __init__(self):
+    def __init__(self, verbose=True):
         self.queue = []
+        self.verbose = verbose
 
     def add_player(self, player: Player):
-        print(f"Added {player} to queue.")
+        if self.verbose:
+            print(f"Added {player} to queue.")
         self.queue.append(player)
 
-    def search_match(self, base_player, mode="1v1", max_expand=400, step=50, tolerance=100):
+    def remove_player(self, player: Player):
+        self.queue.remove(player)
+
+    def peek_match(self, base_player, mode="1v1", max_expand=400, step=50, tolerance=100):
+        """Same search as search_match, but leaves the queue untouched."""
         while tolerance <= max_expand:
             candidates = [p for p in self.queue if p.player_id != base_player.player_id and abs(p.rating - base_player.rating) <= tolerance]
             if candidates:
-                self.queue.remove(base_player)
-                self.queue.remove(candidates[0])
-                return (base_player, candidates[0])  # Return as tuple
+                return candidates[0]
             tolerance += step
         return None
 
+    def search_match(self, base_player, mode="1v1", max_expand=400, step=50, tolerance=100):
+        candidate = self.peek_match(base_player, mode, max_expand, step, tolerance)
+        if candidate is None:
+            return None
+        self.queue.remove(base_player)
+        self.queue.remove(candidate)
+        return (base_player, candidate)  # Return as tuple
+
 
 # ----------------- Scoring Logic -----------------
 def compute_score(player, report, plag_score, did_win):
@@ -85,7 +97,7 @@ if __name__ == "__main__":
             # If no match found for this player, move to end of queue
             q.queue.append(q.queue.pop(0))
             # If after one full rotation no matches, break
-            if all(q.search_match(p, mode="1v1") is None for p in q.queue):
+            if all(q.peek_match(p, mode="1v1") is None for p in q.queue):
                 break
 
     if matches:
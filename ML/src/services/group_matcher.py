@@ -0,0 +1,270 @@
+import time
+import random
+import itertools
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from src.services.base_matcher import Player
+
+
+# ----------------- Queued Group -----------------
+@dataclass
+class QueuedGroup:
+    group_id: object
+    players: List[Player] = field(default_factory=list)
+    enqueued_at: float = 0.0
+
+    @property
+    def size(self):
+        return len(self.players)
+
+    @property
+    def total_rating(self):
+        return sum(p.rating for p in self.players)
+
+    @property
+    def mean_rating(self):
+        return self.total_rating / len(self.players) if self.players else 0.0
+
+
+@dataclass
+class GroupMatch:
+    team_a: List[QueuedGroup]
+    team_b: List[QueuedGroup]
+
+    @property
+    def rating_a(self):
+        return sum(g.total_rating for g in self.team_a)
+
+    @property
+    def rating_b(self):
+        return sum(g.total_rating for g in self.team_b)
+
+    @property
+    def rating_gap(self):
+        """Difference in mean player rating between the two teams."""
+        size = sum(g.size for g in self.team_a)
+        return abs(self.rating_a - self.rating_b) / size if size else 0.0
+
+    def __repr__(self):
+        ids_a = [g.group_id for g in self.team_a]
+        ids_b = [g.group_id for g in self.team_b]
+        return f"GroupMatch({ids_a} vs {ids_b}, gap={self.rating_gap:.1f})"
+
+
+# ----------------- Group Matchmaking Queue -----------------
+class GroupMatchmakingQueue:
+    """
+    Team-vs-team matchmaking over queued groups (parties).
+
+    Groups are indexed per size in lists sorted by mean rating. A match is
+    built around the oldest waiting group (the anchor): at most `window`
+    groups per size bucket are taken from the anchor's rating band, two teams
+    of `team_size` players are filled greedily (largest groups first, each
+    into the currently weaker team), then balanced with a bounded number of
+    equal-size swaps. Work per match depends on `window` and `team_size`,
+    not on how many groups are queued.
+    """
+
+    def __init__(self, team_size=4, window=16, max_swap_rounds=4, verbose=True):
+        self.team_size = team_size
+        self.window = window
+        self.max_swap_rounds = max_swap_rounds
+        self.verbose = verbose
+
+        self.groups: Dict[object, QueuedGroup] = {}  # insertion order == waiting order
+        self._index: Dict[int, list] = {}  # size -> sorted [(mean_rating, seq, group_id)]
+        self._keys: Dict[object, tuple] = {}  # group_id -> its key in _index
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self.groups)
+
+    # ---- index maintenance ----
+    def _index_add(self, group: QueuedGroup):
+        key = (group.mean_rating, next(self._seq), group.group_id)
+        insort(self._index.setdefault(group.size, []), key)
+        self._keys[group.group_id] = key
+
+    def _index_remove(self, group: QueuedGroup):
+        key = self._keys.pop(group.group_id)
+        bucket = self._index[group.size]
+        del bucket[bisect_left(bucket, key)]
+        if not bucket:
+            del self._index[group.size]
+
+    def add_group(self, group_id, players, enqueued_at=None):
+        if len(players) > self.team_size:
+            raise ValueError(f"Group {group_id} has {len(players)} players, team size is {self.team_size}")
+        group = QueuedGroup(group_id, list(players), time.monotonic() if enqueued_at is None else enqueued_at)
+        if group_id in self.groups:
+            self.remove_group(group_id)
+        self.groups[group_id] = group
+        self._index_add(group)
+        if self.verbose:
+            print(f"Added group {group_id} ({group.size} players, avg {group.mean_rating:.0f}) to queue.")
+        return group
+
+    def add_player(self, player: Player, enqueued_at=None):
+        """Queue a player under Player.group_id; players without a group queue solo."""
+        group_id = player.group_id if player.group_id is not None else ("solo", player.player_id)
+        group = self.groups.get(group_id)
+        if group is None:
+            return self.add_group(group_id, [player], enqueued_at)
+        if group.size >= self.team_size:
+            raise ValueError(f"Group {group_id} is already full")
+        self._index_remove(group)
+        group.players.append(player)
+        self._index_add(group)
+        return group
+
+    def remove_group(self, group_id):
+        group = self.groups.pop(group_id)
+        self._index_remove(group)
+        return group
+
+    # ---- matching ----
+    def _candidates(self, anchor: QueuedGroup, tolerance):
+        """Up to `window` groups per size bucket within tolerance of the anchor, closest first."""
+        lo, hi = anchor.mean_rating - tolerance, anchor.mean_rating + tolerance
+        picked = []
+        for bucket in self._index.values():
+            start, stop = bisect_left(bucket, (lo,)), bisect_right(bucket, (hi, float("inf")))
+            if stop - start > self.window:
+                centre = bisect_left(bucket, (anchor.mean_rating,))
+                start = max(start, min(centre - self.window // 2, stop - self.window))
+                stop = start + self.window
+            for mean, _, gid in bucket[start:stop]:
+                if gid != anchor.group_id:
+                    picked.append((abs(mean - anchor.mean_rating), gid))
+        picked.sort(key=lambda item: item[0])
+        return [self.groups[gid] for _, gid in picked]
+
+    def _fill_teams(self, anchor, candidates):
+        """Greedy fill: largest groups first, each into the lower-rated team that has room."""
+        teams = [[anchor], []]
+        slots = [self.team_size - anchor.size, self.team_size]
+        totals = [anchor.total_rating, 0]
+
+        for group in sorted(candidates, key=lambda g: -g.size):
+            if slots[0] == 0 and slots[1] == 0:
+                break
+            order = (0, 1) if totals[0] <= totals[1] else (1, 0)
+            for t in order:
+                if group.size <= slots[t]:
+                    teams[t].append(group)
+                    slots[t] -= group.size
+                    totals[t] += group.total_rating
+                    break
+
+        if slots[0] or slots[1]:
+            return None
+        return teams
+
+    def _balance(self, teams):
+        """Bounded local search: swap equal-size groups across teams while the gap shrinks."""
+        team_a, team_b = teams
+        for _ in range(self.max_swap_rounds):
+            gap = sum(g.total_rating for g in team_a) - sum(g.total_rating for g in team_b)
+            best = None
+            for i, ga in enumerate(team_a):
+                for j, gb in enumerate(team_b):
+                    if ga.size != gb.size:
+                        continue
+                    delta = ga.total_rating - gb.total_rating
+                    new_gap = abs(gap - 2 * delta)
+                    if new_gap < abs(gap) and (best is None or new_gap < best[0]):
+                        best = (new_gap, i, j)
+            if best is None:
+                break
+            _, i, j = best
+            team_a[i], team_b[j] = team_b[j], team_a[i]
+        return GroupMatch(team_a, team_b)
+
+    def peek_match(self, anchor: Optional[QueuedGroup] = None, max_expand=400, step=50, tolerance=100):
+        """Best match around the anchor (default: the oldest group), without dequeuing."""
+        if not self.groups:
+            return None
+        anchor = anchor or next(iter(self.groups.values()))
+        while tolerance <= max_expand:
+            teams = self._fill_teams(anchor, self._candidates(anchor, tolerance))
+            if teams:
+                match = self._balance(teams)
+                if match.rating_gap <= tolerance:
+                    return match
+            tolerance += step
+        return None
+
+    def search_match(self, anchor: Optional[QueuedGroup] = None, max_expand=400, step=50, tolerance=100):
+        match = self.peek_match(anchor, max_expand, step, tolerance)
+        if match:
+            for group in match.team_a + match.team_b:
+                self.remove_group(group.group_id)
+        return match
+
+    def match_all(self, max_expand=400, step=50, tolerance=100):
+        """One pass over the waiting groups, oldest first; returns the matches formed."""
+        matches = []
+        for group_id in list(self.groups):
+            group = self.groups.get(group_id)
+            if group is None:
+                continue
+            match = self.search_match(group, max_expand, step, tolerance)
+            if match:
+                matches.append(match)
+        return matches
+
+
+# ----------------- Benchmark -----------------
+def benchmark_group_matcher(queue_sizes=(100, 1_000, 10_000, 50_000), team_size=4, matches=200, seed=42):
+    """Per-match latency of search_match as the number of queued groups grows."""
+    results = []
+    for n_groups in queue_sizes:
+        rng = random.Random(seed)
+        q = GroupMatchmakingQueue(team_size=team_size, verbose=False)
+        pid = 0
+        for gid in range(n_groups):
+            members = []
+            for _ in range(min(team_size, rng.choice((1, 1, 2, 2, 3, 4)))):
+                pid += 1
+                members.append(Player(pid, rng.randint(120, 2100), gid))
+            q.add_group(gid, members, enqueued_at=float(gid))
+
+        latencies, gaps = [], []
+        for _ in range(matches):
+            start = time.perf_counter()
+            match = q.search_match()
+            latencies.append((time.perf_counter() - start) * 1000)
+            if match:
+                gaps.append(match.rating_gap)
+            elif q.groups:
+                q.remove_group(next(iter(q.groups)))  # unmatched anchor leaves, like an abandon
+
+        latencies.sort()
+        results.append({
+            "queued_groups": n_groups,
+            "matches": len(gaps),
+            "p50_ms": round(latencies[len(latencies) // 2], 4),
+            "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1], 4),
+            "max_ms": round(latencies[-1], 4),
+            "avg_rating_gap": round(sum(gaps) / len(gaps), 2) if gaps else None,
+        })
+    return results
+
+
+if __name__ == "__main__":
+    q = GroupMatchmakingQueue(team_size=3)
+    players = [Player(i, random.randint(900, 1500), group_id=i // 2 if i < 8 else None) for i in range(1, 15)]
+    for p in players:
+        q.add_player(p)
+
+    for idx, match in enumerate(q.match_all(), 1):
+        print(f"\nMatch {idx}: {match}")
+        print("  Team A:", [p for g in match.team_a for p in g.players])
+        print("  Team B:", [p for g in match.team_b for p in g.players])
+    print(f"\nGroups left in queue: {len(q)}")
+
+    print("\n=== BENCHMARK ===")
+    for row in benchmark_group_matcher():
+        print(row)
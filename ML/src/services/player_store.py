@@ -0,0 +1,318 @@
+import gc
+import time
+import random
+import tracemalloc
+from array import array
+from src.services.leagues.league_config import LEAGUE_RULES
+from src.services.base_matcher import Player
+
+NO_GROUP = -1  # group_id sentinel, arrays can't hold None
+
+# ----------------- Player Handle -----------------
+class PlayerHandle:
+    """
+    Lightweight view of one player row in a PlayerStore.
+
+    Exposes the same attributes as Player (player_id, rating, group_id, xp,
+    league()) so it can be passed to compute_score / update_elo unchanged.
+    The handle only remembers the player id, so it stays valid while rows
+    move around inside the store.
+    """
+    __slots__ = ("_store", "player_id")
+
+    def __init__(self, store, player_id):
+        self._store = store
+        self.player_id = player_id
+
+    def _row(self):
+        try:
+            return self._store._row_of[self.player_id]
+        except KeyError:
+            raise KeyError(f"Player {self.player_id} has been removed from the store")
+
+    @property
+    def rating(self):
+        return self._store.ratings[self._row()]
+
+    @rating.setter
+    def rating(self, value):
+        self._store.ratings[self._row()] = int(value)
+
+    @property
+    def xp(self):
+        return self._store.xp[self._row()]
+
+    @xp.setter
+    def xp(self, value):
+        self._store.xp[self._row()] = value
+
+    @property
+    def group_id(self):
+        gid = self._store.group_ids[self._row()]
+        return None if gid == NO_GROUP else gid
+
+    @property
+    def enqueued_at(self):
+        return self._store.enqueued_at[self._row()]
+
+    def league(self):
+        xp = self.xp
+        for league, rules in LEAGUE_RULES.items():
+            if rules['min_xp'] <= xp < float(rules['max_xp']):
+                return league
+        return "standard"
+
+    def __eq__(self, other):
+        return isinstance(other, PlayerHandle) and other._store is self._store and other.player_id == self.player_id
+
+    def __hash__(self):
+        return hash(self.player_id)
+
+    def __repr__(self):
+        if self.player_id not in self._store:
+            return f"Player({self.player_id}, <removed>)"
+        return f"Player({self.player_id}, rating={self.rating}, xp={self.xp}, league={self.league()})"
+
+
+# ----------------- Player Store -----------------
+class PlayerStore:
+    """
+    Column store for queued/active players.
+
+    Each field lives in its own typed array, so a player costs a few bytes per
+    column instead of a full object with a __dict__. Rows are kept dense:
+    removal swaps the last row into the hole. Handles are created on demand
+    and are not retained by the store.
+    """
+
+    def __init__(self):
+        self.ids = array('q')
+        self.ratings = array('q')
+        self.xp = array('d')
+        self.group_ids = array('q')
+        self.enqueued_at = array('d')
+
+        self._row_of = {}  # player_id -> row
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, player_id):
+        return player_id in self._row_of
+
+    def __iter__(self):
+        for player_id in self.ids:
+            yield PlayerHandle(self, player_id)
+
+    def add(self, player_id, rating, group_id=None, xp=0.0, enqueued_at=None):
+        """
+        Append a row. player_id and group_id must be ints (the columns are
+        int64 arrays); every value is converted before any column is touched,
+        so a bad one raises without leaving the columns out of step.
+        """
+        player_id = int(player_id)
+        rating = int(rating)
+        group_id = NO_GROUP if group_id is None else int(group_id)
+        xp = float(xp)
+        enqueued_at = time.monotonic() if enqueued_at is None else float(enqueued_at)
+        if player_id in self._row_of:
+            raise ValueError(f"Player {player_id} already in store")
+
+        row = len(self.ids)
+        self.ids.append(player_id)
+        self.ratings.append(rating)
+        self.xp.append(xp)
+        self.group_ids.append(group_id)
+        self.enqueued_at.append(enqueued_at)
+        self._row_of[player_id] = row
+        return PlayerHandle(self, player_id)
+
+    def add_player(self, player: Player, enqueued_at=None):
+        """Copy a Player object into the store and return its handle."""
+        return self.add(player.player_id, player.rating, player.group_id, player.xp, enqueued_at)
+
+    def get(self, player_id):
+        return PlayerHandle(self, player_id) if player_id in self._row_of else None
+
+    def remove(self, player_id):
+        row = self._row_of.pop(player_id)
+        last = len(self.ids) - 1
+
+        if row != last:
+            # Move the last row into the hole
+            for col in (self.ids, self.ratings, self.xp, self.group_ids, self.enqueued_at):
+                col[row] = col[last]
+            self._row_of[self.ids[row]] = row
+
+        for col in (self.ids, self.ratings, self.xp, self.group_ids, self.enqueued_at):
+            col.pop()
+
+    def pop_player(self, player_id) -> Player:
+        """Remove a row and return it as a standalone Player object."""
+        row = self._row_of[player_id]
+        gid = self.group_ids[row]
+        player = Player(player_id, self.ratings[row], None if gid == NO_GROUP else gid)
+        player.xp = self.xp[row]
+        self.remove(player_id)
+        return player
+
+    def find_candidate(self, player_id, tolerance):
+        """
+        Oldest queued player (excluding player_id) whose rating is within
+        tolerance, or None. Scans the rating column without building handles.
+        """
+        base_row = self._row_of[player_id]
+        base_rating = self.ratings[base_row]
+        ratings, enqueued = self.ratings, self.enqueued_at
+
+        best_row, best_ts = -1, float("inf")
+        for row in range(len(ratings)):
+            if row != base_row and abs(ratings[row] - base_rating) <= tolerance and enqueued[row] < best_ts:
+                best_row, best_ts = row, enqueued[row]
+
+        return None if best_row < 0 else PlayerHandle(self, self.ids[best_row])
+
+
+# ----------------- Store-backed Matchmaking Queue -----------------
+class StoreMatchmakingQueue:
+    """MatchmakingQueue with the same search semantics, backed by a PlayerStore."""
+
+    def __init__(self, store=None):
+        self.store = store or PlayerStore()
+
+    @property
+    def queue(self):
+        return list(self.store)
+
+    def add_player(self, player, enqueued_at=None):
+        if isinstance(player, Player):
+            return self.store.add_player(player, enqueued_at)
+        return self.store.add(player.player_id, player.rating, player.group_id, player.xp, enqueued_at)
+
+    def remove_player(self, player):
+        self.store.remove(player.player_id)
+
+    def peek_match(self, base_player, mode="1v1", max_expand=400, step=50, tolerance=100):
+        while tolerance <= max_expand:
+            candidate = self.store.find_candidate(base_player.player_id, tolerance)
+            if candidate:
+                return candidate
+            tolerance += step
+        return None
+
+    def search_match(self, base_player, mode="1v1", max_expand=400, step=50, tolerance=100):
+        candidate = self.peek_match(base_player, mode, max_expand, step, tolerance)
+        if candidate is None:
+            return None
+        return (self.store.pop_player(base_player.player_id), self.store.pop_player(candidate.player_id))
+
+
+# ----------------- Benchmarks -----------------
+def _measure(build):
+    """Run build() and return (result, seconds, retained bytes, peak bytes, new gc-tracked objects)."""
+    gc.collect()
+    tracked_before = len(gc.get_objects())
+    tracemalloc.start()
+    start = time.perf_counter()
+    obj = build()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gc.collect()
+    return obj, elapsed, current, peak, len(gc.get_objects()) - tracked_before
+
+
+def _player_rows(n, seed):
+    rng = random.Random(seed)
+    for i in range(n):
+        yield i, rng.randint(120, 2100), (i // 4 if rng.random() < 0.3 else None)
+
+
+def benchmark_player_store(n=200_000, removals=2_000, searches=200, seed=42):
+    """
+    Compare the current list of Player objects against a PlayerStore holding
+    the same n players: build time, retained/peak memory, rating scan,
+    removals by id and MatchmakingQueue.search_match throughput.
+    """
+    from src.services.base_matcher import MatchmakingQueue
+
+    def build_list():
+        return [Player(pid, rating, gid) for pid, rating, gid in _player_rows(n, seed)]
+
+    def build_store():
+        store = PlayerStore()
+        for pid, rating, gid in _player_rows(n, seed):
+            store.add(pid, rating, gid, enqueued_at=float(pid))
+        return store
+
+    players, list_build, list_mem, list_peak, list_tracked = _measure(build_list)
+    store, store_build, store_mem, store_peak, store_tracked = _measure(build_store)
+
+    start = time.perf_counter()
+    list_total = sum(p.rating for p in players)
+    list_scan = time.perf_counter() - start
+
+    start = time.perf_counter()
+    store_total = sum(store.ratings)
+    store_scan = time.perf_counter() - start
+    assert list_total == store_total
+
+    rng = random.Random(seed)
+    victims = rng.sample(range(n), min(removals, n))
+
+    start = time.perf_counter()
+    by_id = {p.player_id: p for p in players}
+    for pid in victims:
+        players.remove(by_id[pid])
+    list_remove = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for pid in victims:
+        store.remove(pid)
+    store_remove = time.perf_counter() - start
+
+    # search_match: both queues see the same bases in the same order
+    list_queue = MatchmakingQueue(verbose=False)
+    list_queue.queue = players
+    store_queue = StoreMatchmakingQueue(store)
+    bases = [pid for pid in rng.sample(range(n), min(searches * 4, n)) if pid in store][:searches]
+
+    start = time.perf_counter()
+    list_matches = 0
+    for pid in bases:
+        base = by_id[pid]
+        if base in list_queue.queue and list_queue.search_match(base):
+            list_matches += 1
+    list_search = time.perf_counter() - start
+
+    start = time.perf_counter()
+    store_matches = 0
+    for pid in bases:
+        base = store.get(pid)
+        if base is not None and store_queue.search_match(base):
+            store_matches += 1
+    store_search = time.perf_counter() - start
+
+    def _report(build_s, current, peak, tracked, scan_s, remove_s, search_s, matches):
+        return {
+            "build_s": round(build_s, 4),
+            "retained_bytes": current,
+            "peak_bytes": peak,
+            "bytes_per_player": round(current / n, 1),
+            "gc_tracked_objects": tracked,
+            "rating_scan_s": round(scan_s, 4),
+            "removals_per_s": round(len(victims) / remove_s) if remove_s else None,
+            "searches_per_s": round(len(bases) / search_s) if search_s else None,
+            "matches": matches,
+        }
+
+    return {
+        "players": n,
+        "list": _report(list_build, list_mem, list_peak, list_tracked, list_scan, list_remove, list_search, list_matches),
+        "store": _report(store_build, store_mem, store_peak, store_tracked, store_scan, store_remove, store_search, store_matches),
+    }
+
+
+if __name__ == "__main__":
+    import json
+    print(json.dumps(benchmark_player_store(), indent=2))
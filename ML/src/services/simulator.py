@@ -0,0 +1,229 @@
+import math
+import time
+import random
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Dict, List, Optional
+
+from src.services.base_matcher import Player, MatchmakingQueue
+
+
+# ----------------- Config -----------------
+@dataclass
+class SimulationConfig:
+    """Load profile for one simulated matchmaking run."""
+    seed: int = 42
+    minutes: float = 10.0
+    tick_seconds: float = 1.0
+
+    # Arrivals: Poisson process, players per simulated minute
+    arrivals_per_minute: float = 120.0
+
+    # Ratings: clamped normal distribution (same range as the demo players)
+    rating_mean: float = 1100.0
+    rating_std: float = 350.0
+    rating_min: int = 120
+    rating_max: int = 2100
+
+    # Abandonment: each player's patience is exponential with this mean
+    mean_patience_seconds: float = 90.0
+
+    # search_match parameters
+    mode: str = "1v1"
+    tolerance: int = 100
+    step: int = 50
+    max_expand: int = 400
+
+    # Keep one queue-length sample every N ticks
+    sample_every_ticks: int = 10
+
+
+@dataclass
+class SimulationReport:
+    scenario: str
+    queue_impl: str
+    config: Dict
+    simulated_seconds: float
+    arrivals: int
+    matches: int
+    abandoned: int
+    left_in_queue: int
+    matches_per_sim_second: float
+    matches_per_cpu_second: float
+    wait_seconds: Dict[str, float]
+    queue_length: Dict[str, float]
+    cpu_ms_per_tick: Dict[str, float]
+    queue_length_series: List[int] = field(default_factory=list)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+# ----------------- Helpers -----------------
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile on an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return float(sorted_values[rank])
+
+
+def _summary(values):
+    ordered = sorted(values)
+    return {
+        "p50": round(_percentile(ordered, 50), 3),
+        "p90": round(_percentile(ordered, 90), 3),
+        "p99": round(_percentile(ordered, 99), 3),
+        "max": round(float(ordered[-1]), 3) if ordered else 0.0,
+        "mean": round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+    }
+
+
+def _poisson(rng: random.Random, lam: float) -> int:
+    """Poisson sample: Knuth for small means, normal approximation above."""
+    if lam <= 0:
+        return 0
+    if lam > 30:
+        return max(0, int(round(rng.gauss(lam, math.sqrt(lam)))))
+    limit, k, p = math.exp(-lam), 0, 1.0
+    while True:
+        p *= rng.random()
+        if p <= limit:
+            return k
+        k += 1
+
+
+# ----------------- Simulator -----------------
+class MatchmakingSimulator:
+    """
+    Deterministic, seedable load simulator for matchmaking queues.
+
+    Any queue exposing add_player / remove_player / search_match can be
+    driven, e.g. MatchmakingQueue or StoreMatchmakingQueue. Time is
+    simulated; the measured CPU is the queue calls (add, remove, search)
+    and the loop that issues them. Arrivals, patience draws and the
+    abandonment scan run outside the timed section.
+    """
+
+    def __init__(self, config: Optional[SimulationConfig] = None, queue_factory: Optional[Callable] = None):
+        self.config = config or SimulationConfig()
+        self.queue_factory = queue_factory or (lambda: MatchmakingQueue(verbose=False))
+
+    def _new_player(self, rng, player_id):
+        cfg = self.config
+        rating = int(round(rng.gauss(cfg.rating_mean, cfg.rating_std)))
+        return Player(player_id, max(cfg.rating_min, min(cfg.rating_max, rating)))
+
+    def run(self, scenario="default", queue_impl=None) -> SimulationReport:
+        cfg = self.config
+        rng = random.Random(cfg.seed)
+        queue = self.queue_factory()
+
+        ticks = int(round(cfg.minutes * 60 / cfg.tick_seconds))
+        arrivals_per_tick = cfg.arrivals_per_minute / 60 * cfg.tick_seconds
+
+        waiting = {}  # player_id -> (enqueued_at, gives_up_at, player), in arrival order
+        next_id = 0
+        arrivals = matches = abandoned = 0
+        waits, queue_lengths, cpu_ms, series = [], [], [], []
+
+        for tick in range(ticks):
+            now = tick * cfg.tick_seconds
+
+            # Arrivals and patience are drawn outside the timed section
+            new_players = []
+            for _ in range(_poisson(rng, arrivals_per_tick)):
+                next_id += 1
+                player = self._new_player(rng, next_id)
+                new_players.append(player)
+                waiting[next_id] = (now, now + rng.expovariate(1.0 / cfg.mean_patience_seconds), player)
+            arrivals += len(new_players)
+
+            # Abandonment scan (simulator bookkeeping); new arrivals cannot have given up yet
+            gone = [entry[2] for entry in waiting.values() if entry[1] <= now]
+
+            cpu_start = time.process_time()
+
+            for player in new_players:
+                queue.add_player(player)
+
+            for player in gone:
+                queue.remove_player(player)
+                del waiting[player.player_id]
+            abandoned += len(gone)
+
+            # Matching pass, oldest players first
+            for _, _, base in list(waiting.values()):
+                if base.player_id not in waiting:
+                    continue
+                pair = queue.search_match(
+                    base, mode=cfg.mode, max_expand=cfg.max_expand, step=cfg.step, tolerance=cfg.tolerance
+                )
+                if pair:
+                    matches += 1
+                    for p in pair:
+                        waits.append(now - waiting.pop(p.player_id)[0])
+
+            cpu_ms.append((time.process_time() - cpu_start) * 1000)
+            queue_lengths.append(len(waiting))
+            if tick % cfg.sample_every_ticks == 0:
+                series.append(len(waiting))
+
+        simulated_seconds = ticks * cfg.tick_seconds
+        cpu_seconds = sum(cpu_ms) / 1000
+
+        return SimulationReport(
+            scenario=scenario,
+            queue_impl=queue_impl or type(queue).__name__,
+            config=asdict(cfg),
+            simulated_seconds=simulated_seconds,
+            arrivals=arrivals,
+            matches=matches,
+            abandoned=abandoned,
+            left_in_queue=len(waiting),
+            matches_per_sim_second=round(matches / simulated_seconds, 3) if simulated_seconds else 0.0,
+            matches_per_cpu_second=round(matches / cpu_seconds, 1) if cpu_seconds else 0.0,
+            wait_seconds=_summary(waits),
+            queue_length=_summary(queue_lengths),
+            cpu_ms_per_tick=_summary(cpu_ms),
+            queue_length_series=series,
+        )
+
+
+# ----------------- Benchmark Suite -----------------
+BENCHMARK_SCENARIOS = {
+    "quiet": SimulationConfig(minutes=10, arrivals_per_minute=30),
+    "busy": SimulationConfig(minutes=10, arrivals_per_minute=600),
+    "peak": SimulationConfig(minutes=5, arrivals_per_minute=3000, mean_patience_seconds=60),
+    "wide_ratings": SimulationConfig(minutes=10, arrivals_per_minute=600, rating_std=700),
+    # Narrow search window and patient players: the queue backs up into the thousands
+    "backlog": SimulationConfig(minutes=3, arrivals_per_minute=1200, rating_std=700, mean_patience_seconds=300,
+                                tolerance=2, step=2, max_expand=4),
+}
+
+
+def run_benchmark_suite(scenarios: Optional[Dict[str, SimulationConfig]] = None,
+                        queue_factories: Optional[Dict[str, Callable]] = None) -> List[Dict]:
+    """Run every scenario against every queue implementation with identical seeds."""
+    from src.services.player_store import StoreMatchmakingQueue
+
+    scenarios = scenarios or BENCHMARK_SCENARIOS
+    queue_factories = queue_factories or {
+        "MatchmakingQueue": lambda: MatchmakingQueue(verbose=False),
+        "StoreMatchmakingQueue": StoreMatchmakingQueue,
+    }
+
+    results = []
+    for name, cfg in scenarios.items():
+        for impl, factory in queue_factories.items():
+            report = MatchmakingSimulator(cfg, factory).run(scenario=name, queue_impl=impl)
+            results.append(report.to_dict())
+    return results
+
+
+if __name__ == "__main__":
+    import json
+
+    for report in run_benchmark_suite():
+        report.pop("queue_length_series")
+        report.pop("config")
+        print(json.dumps(report))
@@ -0,0 +1,244 @@
+import os
+import json
+import time
+import uuid
+import pstats
+import cProfile
+import functools
+import threading
+import contextvars
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from src.logger import logging, LOG_DIR
+
+
+# ----------------- Config -----------------
+@dataclass
+class TracingConfig:
+    """
+    Opt-in request profiling.
+
+    profile_every: run 1 in N requests under cProfile and keep the dump (0 = off).
+    slow_ms: keep the span breakdown of any request slower than this (0 = off);
+        with profile_slow=True those requests are also profiled, which means
+        every request runs under cProfile and only slow dumps are kept.
+    """
+    profile_every: int = int(os.getenv("TRACE_PROFILE_EVERY", 0))
+    slow_ms: float = float(os.getenv("TRACE_SLOW_MS", 0))
+    profile_slow: bool = os.getenv("TRACE_PROFILE_SLOW", "false").lower() == "true"
+    profile_dir: str = os.getenv("TRACE_PROFILE_DIR", os.path.join(LOG_DIR, "profiles"))
+    max_spans: int = 2000  # per request, guards against runaway loops
+
+
+# ----------------- Spans -----------------
+@dataclass
+class Span:
+    name: str
+    start_ms: float
+    depth: int
+    duration_ms: float = 0.0
+
+
+@dataclass
+class Trace:
+    trace_id: str = field(default_factory=lambda: uuid.uuid4().hex[:16])
+    started: float = field(default_factory=time.perf_counter)
+    spans: List[Span] = field(default_factory=list)
+    depth: int = 0
+    max_spans: int = 2000
+    total_ms: float = 0.0
+    profile_path: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        by_name: Dict[str, Dict[str, float]] = {}
+        for s in self.spans:
+            agg = by_name.setdefault(s.name, {"count": 0, "total_ms": 0.0})
+            agg["count"] += 1
+            agg["total_ms"] += s.duration_ms
+        for agg in by_name.values():
+            agg["total_ms"] = round(agg["total_ms"], 3)
+
+        return {
+            "trace_id": self.trace_id,
+            "total_ms": round(self.total_ms, 3),
+            "by_name": dict(sorted(by_name.items(), key=lambda kv: -kv[1]["total_ms"])),
+            "spans": [
+                {"name": s.name, "start_ms": round(s.start_ms, 3), "duration_ms": round(s.duration_ms, 3), "depth": s.depth}
+                for s in self.spans
+            ],
+            "profile": self.profile_path,
+        }
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+class span:
+    """
+    Time a block as a span of the current trace. Without an active trace
+    this is one ContextVar lookup, so it can stay in hot code.
+
+        with span("tokenize"):
+            ...
+    """
+    __slots__ = ("name", "_trace", "_span", "_start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        trace = _current_trace.get()
+        self._trace = trace
+        if trace is not None and len(trace.spans) < trace.max_spans:
+            self._start = time.perf_counter()
+            self._span = Span(self.name, (self._start - trace.started) * 1000, trace.depth)
+            trace.spans.append(self._span)
+            trace.depth += 1
+        else:
+            self._span = None
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._span is not None:
+            self._span.duration_ms = (time.perf_counter() - self._start) * 1000
+            self._trace.depth -= 1
+        return False
+
+
+def traced(name: str):
+    """Decorator form of span()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ----------------- Request tracing -----------------
+class RequestTracer:
+    """
+    Decides per request whether to trace and profile, and stores dumps.
+
+    Only one request is profiled at a time: cProfile hooks are per thread on
+    older interpreters and global from 3.12, so concurrent profiles either
+    miss work or fail; a request that cannot get the slot is just traced.
+    """
+
+    def __init__(self, config: Optional[TracingConfig] = None):
+        self.config = config or TracingConfig()
+        self._counter = 0
+        self._counter_lock = threading.Lock()
+        self._profile_slot = threading.Lock()
+
+    def _sampled(self) -> bool:
+        if self.config.profile_every <= 0:
+            return False
+        with self._counter_lock:
+            self._counter += 1
+            return self._counter % self.config.profile_every == 0
+
+    @property
+    def always_trace(self) -> bool:
+        return self.config.slow_ms > 0 or self.config.profile_every > 0
+
+    def run(self, fn, *args, debug: bool = False, label: str = "request", **kwargs):
+        """
+        Call fn under a trace when debug is set or profiling is configured.
+        Returns (result, trace or None).
+        """
+        if not (debug or self.always_trace):
+            return fn(*args, **kwargs), None
+
+        trace = Trace(max_spans=self.config.max_spans)
+        token = _current_trace.set(trace)
+
+        sampled = self._sampled()
+        profiler = None
+        if (sampled or (self.config.profile_slow and self.config.slow_ms > 0)) and self._profile_slot.acquire(blocking=False):
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:  # another profiler is active (3.12+)
+                profiler = None
+                self._profile_slot.release()
+
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self._profile_slot.release()
+            trace.total_ms = (time.perf_counter() - trace.started) * 1000
+            _current_trace.reset(token)
+
+        slow = self.config.slow_ms > 0 and trace.total_ms >= self.config.slow_ms
+        if profiler is not None and (sampled or slow):
+            trace.profile_path = self._dump_profile(profiler, trace, label)
+        if slow:
+            self._dump_trace(trace, label)
+            logging.warning(
+                "Slow request traced",
+                extra={"trace_id": trace.trace_id, "label": label, "total_ms": round(trace.total_ms, 1),
+                       "profile": trace.profile_path}
+            )
+        return result, trace
+
+    def _dump_profile(self, profiler: cProfile.Profile, trace: Trace, label: str) -> Optional[str]:
+        try:
+            os.makedirs(self.config.profile_dir, exist_ok=True)
+            path = os.path.join(self.config.profile_dir, f"{label}_{trace.trace_id}.prof")
+            profiler.dump_stats(path)
+            return path
+        except OSError as e:
+            logging.warning(f"Could not write profile: {e}")
+            return None
+
+    def _dump_trace(self, trace: Trace, label: str):
+        try:
+            os.makedirs(self.config.profile_dir, exist_ok=True)
+            with open(os.path.join(self.config.profile_dir, f"{label}_{trace.trace_id}.trace.json"), "w") as f:
+                json.dump(trace.to_dict(), f)
+        except OSError as e:
+            logging.warning(f"Could not write trace: {e}")
+
+
+def summarize_profile(path: str, limit: int = 15) -> str:
+    """Top functions by cumulative time from a stored .prof dump."""
+    import io
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    @traced("outer")
+    def handler(n):
+        with span("build"):
+            data = [str(i) for i in range(n)]
+        with span("join"):
+            return ",".join(data)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tracer = RequestTracer(TracingConfig(profile_every=2, slow_ms=0, profile_dir=tmp))
+        for _ in range(2):
+            _, trace = tracer.run(handler, 200_000, debug=True, label="demo")
+        print(json.dumps(trace.to_dict(), indent=2))
+        if trace.profile_path:
+            print(summarize_profile(trace.profile_path, limit=5))
+
+    # Span overhead without an active trace
+    iterations = 200_000
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with span("noop"):
+            pass
+    print(f"inactive span: {(time.perf_counter() - start) / iterations * 1e9:.0f} ns")